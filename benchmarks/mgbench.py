@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Musical Gestures Toolbox.
+
+Times the core processes on deterministic synthetic inputs generated with the FFmpeg lavfi sources
+(`testsrc2` and `mandelbrot` videos with a `sine` audio track) at several resolutions and durations.
+Everything runs offline on the CPU, the only requirement besides the toolbox is FFmpeg.
+
+    # time all benchmarks on the small inputs and write the results
+    python benchmarks/mgbench.py run --sizes small --output results.json
+
+    # compare against a stored baseline, exits with 1 if something got slower
+    python benchmarks/mgbench.py compare baseline.json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+import matplotlib
+# the processes save their figures, there is nothing to show
+matplotlib.use('Agg')
+import numpy as np
+
+# benchmark the checkout the script is in rather than an installed version
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import musicalgestures
+from musicalgestures._utils import get_length, get_framecount, get_fps, get_widthheight, has_audio
+
+# input sizes: resolution and duration (s)
+SIZES = {
+    'small': dict(width=320, height=240, duration=5),
+    'medium': dict(width=640, height=480, duration=10),
+    'large': dict(width=1280, height=720, duration=20),
+}
+
+# lavfi video sources, testsrc2 moves little (a scrolling pattern and a counter), mandelbrot zooms continuously
+SOURCES = ['testsrc2', 'mandelbrot']
+
+FPS = 25
+SAMPLE_RATE = 44100
+
+
+def make_video(folder, source, width, height, duration, fps=FPS):
+    """
+    Generates a test video (MJPEG in AVI, like the example videos) with a sine audio track, unless it exists already.
+    The bitexact flags keep the output identical across runs and FFmpeg builds of the same version.
+
+    Args:
+        folder (str): The folder to write the video to.
+        source (str): The lavfi video source, e.g. 'testsrc2' or 'mandelbrot'.
+        width (int): The width of the video.
+        height (int): The height of the video.
+        duration (float): The duration of the video (s).
+        fps (int, optional): The frame rate of the video. Defaults to 25.
+
+    Returns:
+        str: The path to the video.
+    """
+    target_name = os.path.join(folder, f'{source}_{width}x{height}_{duration}s.avi')
+    if not os.path.isfile(target_name):
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'lavfi', '-i', f'{source}=size={width}x{height}:rate={fps}',
+               '-f', 'lavfi', '-i', f'sine=frequency=440:beep_factor=4:sample_rate={SAMPLE_RATE}',
+               '-t', str(duration), '-fflags', '+bitexact', '-flags:v', '+bitexact', '-flags:a', '+bitexact',
+               '-c:v', 'mjpeg', '-q:v', '3', '-pix_fmt', 'yuvj420p', '-c:a', 'pcm_s16le', target_name]
+        subprocess.run(cmd, check=True)
+    return target_name
+
+
+def make_audio(folder, duration, sr=SAMPLE_RATE):
+    """
+    Generates a test audio file (WAV) of a beeping sine, unless it exists already.
+
+    Args:
+        folder (str): The folder to write the audio file to.
+        duration (float): The duration of the audio file (s).
+        sr (int, optional): The sample rate of the audio file. Defaults to 44100.
+
+    Returns:
+        str: The path to the audio file.
+    """
+    target_name = os.path.join(folder, f'sine_{duration}s.wav')
+    if not os.path.isfile(target_name):
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+               '-f', 'lavfi', '-i', f'sine=frequency=440:beep_factor=4:sample_rate={sr}',
+               '-t', str(duration), '-fflags', '+bitexact', '-flags:a', '+bitexact', '-c:a', 'pcm_s16le', target_name]
+        subprocess.run(cmd, check=True)
+    return target_name
+
+
+def probe(filename):
+    "Reads the properties every MgVideo needs."
+    return get_length(filename), get_framecount(filename), get_fps(filename), get_widthheight(filename), has_audio(filename)
+
+
+# name: (input kind, setup, benchmarked function). The setup is not timed, its result is passed to the function.
+BENCHMARKS = {
+    'probe': ('video', lambda filename: filename, probe),
+    'mgvideo': ('video', lambda filename: filename, lambda filename: musicalgestures.MgVideo(filename)),
+    'motion': ('video', musicalgestures.MgVideo, lambda mv: mv.motion(overwrite=True)),
+    'motiongrams': ('video', musicalgestures.MgVideo, lambda mv: mv.motiongrams(overwrite=True)),
+    'videograms': ('video', musicalgestures.MgVideo, lambda mv: mv.videograms(overwrite=True)),
+    'flow.dense': ('video', musicalgestures.MgVideo, lambda mv: mv.flow.dense(overwrite=True)),
+    'directograms': ('video', musicalgestures.MgVideo, lambda mv: mv.directograms(overwrite=True)),
+    'impacts': ('video', musicalgestures.MgVideo, lambda mv: mv.impacts(overwrite=True)),
+    'ssm': ('video', musicalgestures.MgVideo, lambda mv: mv.ssm(features='motiongrams', overwrite=True)),
+    'history': ('video', musicalgestures.MgVideo, lambda mv: mv.history(overwrite=True)),
+    'blend': ('video', musicalgestures.MgVideo, lambda mv: mv.blend(overwrite=True)),
+    # a new MgAudio for every repetition, so that nothing is memoized between them
+    'audio.descriptors': ('audio', musicalgestures.MgAudio, lambda ma: ma.descriptors(autoshow=False, overwrite=True)),
+    'audio.spectrogram': ('audio', musicalgestures.MgAudio, lambda ma: ma.spectrogram(autoshow=False, overwrite=True)),
+}
+
+
+def time_benchmark(setup, function, filename, repeat=3, verbose=False):
+    """
+    Times a benchmark, running its setup before each repetition.
+
+    Args:
+        setup (function): Prepares the input of `function` from `filename` (not timed).
+        function (function): The benchmarked function.
+        filename (str): The input file.
+        repeat (int, optional): The number of repetitions. Defaults to 3.
+        verbose (bool, optional): Whether to show the output (progress bars) of the processes. Defaults to False.
+
+    Returns:
+        dict: The times (s) of the repetitions with their minimum, median and mean, and the subprocesses launched by one repetition.
+    """
+    times = []
+    for _ in range(repeat):
+        with contextlib.ExitStack() as stack:
+            if not verbose:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            obj = setup(filename)
+            with musicalgestures.trace() as tracer:
+                start = time.perf_counter()
+                function(obj)
+                times.append(time.perf_counter() - start)
+    return dict(times=times, min=min(times), median=float(np.median(times)), mean=float(np.mean(times)), launches=tracer.launches)
+
+
+def environment():
+    "Describes the machine and software the benchmarks ran with."
+    try:
+        ffmpeg = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg = None
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version(), platform=platform.platform(),
+                processor=platform.processor(), cpu_count=os.cpu_count(), numpy=np.__version__, ffmpeg=ffmpeg, commit=commit)
+
+
+def run(sizes=('small',), sources=SOURCES, benchmarks=None, repeat=3, workdir=None, verbose=False):
+    """
+    Runs the benchmarks on every combination of input size and source.
+
+    Args:
+        sizes (list, optional): The input sizes, keys of `SIZES`. Defaults to ('small',).
+        sources (list, optional): The lavfi video sources. Defaults to `SOURCES`.
+        benchmarks (list, optional): The benchmarks to run, keys of `BENCHMARKS`. Defaults to None (all of them).
+        repeat (int, optional): The number of repetitions of each benchmark. Defaults to 3.
+        workdir (str, optional): The folder for the inputs and outputs, inputs are generated once and reused. Defaults to None (a 'mgbench' folder in the temporary directory).
+        verbose (bool, optional): Whether to show the output of the processes. Defaults to False.
+
+    Returns:
+        dict: The environment and the results, keyed by 'benchmark/source/size' ('benchmark/sine/size' for audio benchmarks).
+    """
+    benchmarks = list(BENCHMARKS) if benchmarks is None else benchmarks
+    unknown = [name for name in benchmarks if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f'Unknown benchmarks: {unknown}. Available benchmarks: {list(BENCHMARKS)}.')
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError('The benchmarks need FFmpeg to generate their inputs.')
+
+    workdir = os.path.join(tempfile.gettempdir(), 'mgbench') if workdir is None else workdir
+    results = {}
+    for size in sizes:
+        spec = SIZES[size]
+        folder = os.path.join(workdir, size)
+        os.makedirs(folder, exist_ok=True)
+        inputs = [(source, 'video', make_video(folder, source, **spec)) for source in sources]
+        inputs.append(('sine', 'audio', make_audio(folder, spec['duration'])))
+        for name in benchmarks:
+            kind, setup, function = BENCHMARKS[name]
+            for source, input_kind, filename in inputs:
+                if input_kind != kind:
+                    continue
+                key = f'{name}/{source}/{size}'
+                result = time_benchmark(setup, function, filename, repeat=repeat, verbose=verbose)
+                results[key] = result
+                print(f"{key:<40} min {result['min']:8.3f} s  median {result['median']:8.3f} s", flush=True)
+    return dict(environment=environment(), results=results)
+
+
+def compare(baseline, current, threshold=0.1, min_delta=0.02, stat='min'):
+    """
+    Compares benchmark results with a baseline.
+
+    Args:
+        baseline (dict): The baseline results, as returned by `run`.
+        current (dict): The results to compare, as returned by `run`.
+        threshold (float, optional): The relative slowdown flagged as a regression (and speedup flagged as an improvement). Defaults to 0.1.
+        min_delta (float, optional): Differences shorter than this (s) are considered noise. Defaults to 0.02.
+        stat (str, optional): The statistic compared, 'min', 'median' or 'mean'. Defaults to 'min'.
+
+    Returns:
+        list: One (key, baseline time, current time, ratio, status) tuple per benchmark, where status is 'regression', 'improvement', 'ok', 'new' or 'missing'.
+    """
+    base_results, current_results = baseline['results'], current['results']
+    rows = []
+    for key in sorted(set(base_results) | set(current_results)):
+        if key not in current_results:
+            rows.append((key, base_results[key][stat], None, None, 'missing'))
+            continue
+        if key not in base_results:
+            rows.append((key, None, current_results[key][stat], None, 'new'))
+            continue
+        before, after = base_results[key][stat], current_results[key][stat]
+        ratio = after / before if before > 0 else float('inf')
+        status = 'ok'
+        if abs(after - before) >= min_delta:
+            if ratio > 1 + threshold:
+                status = 'regression'
+            elif ratio < 1 - threshold:
+                status = 'improvement'
+        rows.append((key, before, after, ratio, status))
+    return rows
+
+
+def format_comparison(rows):
+    "Formats the rows returned by `compare` as a table."
+    width = max([len(row[0]) for row in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'baseline':>10}  {'current':>10}  {'ratio':>7}  status"]
+    for key, before, after, ratio, status in rows:
+        before = '' if before is None else f'{before:.3f}'
+        after = '' if after is None else f'{after:.3f}'
+        ratio = '' if ratio is None else f'{ratio:.2f}'
+        lines.append(f'{key:<{width}}  {before:>10}  {after:>10}  {ratio:>7}  {status}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the Musical Gestures Toolbox on synthetic FFmpeg inputs.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and write the results as JSON.')
+    run_parser.add_argument('--sizes', default='small', help=f"Comma separated input sizes, from {', '.join(SIZES)}. Default: small.")
+    run_parser.add_argument('--sources', default=','.join(SOURCES), help=f"Comma separated lavfi video sources. Default: {','.join(SOURCES)}.")
+    run_parser.add_argument('--benchmarks', default=None, help=f"Comma separated benchmarks, from {', '.join(BENCHMARKS)}. Default: all.")
+    run_parser.add_argument('--repeat', type=int, default=3, help='Repetitions of each benchmark. Default: 3.')
+    run_parser.add_argument('--workdir', default=None, help='Folder for the generated inputs and the outputs. Default: a temporary folder.')
+    run_parser.add_argument('--output', default='mgbench_results.json', help='The JSON file to write. Default: mgbench_results.json.')
+    run_parser.add_argument('--verbose', action='store_true', help='Show the output of the processes.')
+
+    compare_parser = commands.add_parser('compare', help='Compare results with a baseline, exit with 1 on regressions.')
+    compare_parser.add_argument('baseline', help='The baseline JSON file.')
+    compare_parser.add_argument('current', help='The JSON file to compare.')
+    compare_parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown flagged as a regression. Default: 0.1.')
+    compare_parser.add_argument('--min-delta', type=float, default=0.02, help='Differences (s) below this are ignored. Default: 0.02.')
+    compare_parser.add_argument('--stat', choices=['min', 'median', 'mean'], default='min', help='The statistic compared. Default: min.')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(sizes=args.sizes.split(','), sources=args.sources.split(','),
+                      benchmarks=None if args.benchmarks is None else args.benchmarks.split(','),
+                      repeat=args.repeat, workdir=args.workdir, verbose=args.verbose)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}.')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, threshold=args.threshold, min_delta=args.min_delta, stat=args.stat)
+    print(format_comparison(rows))
+    regressions = [row for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f'{len(regressions)} regression(s) above {args.threshold:.0%}.')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,55 @@
 import os
-from musicalgestures._input_test import mg_input_test
-from musicalgestures._videoreader import mg_videoreader
-from musicalgestures._flow import Flow
-from musicalgestures._audio import MgAudio
-from musicalgestures._video import MgVideo
-from musicalgestures._360video import Mg360Video
-from musicalgestures._utils import (
-    MgFigure,
-    MgImage,
-    convert,
-    convert_to_mp4,
-    get_framecount,
-    ffmpeg_cmd,
-    get_length,
-    generate_outfilename,
-)
-from musicalgestures._mglist import MgList
+import importlib
+
+# The public names of the package and the modules defining them. They are imported on first access (see `__getattr__`),
+# so that `import musicalgestures` does not import librosa, matplotlib, pandas, scipy, scikit-image, numba and OpenCV.
+_lazy_imports = {
+    'mg_input_test': 'musicalgestures._input_test',
+    'mg_videoreader': 'musicalgestures._videoreader',
+    'Flow': 'musicalgestures._flow',
+    'MgAudio': 'musicalgestures._audio',
+    'MgVideo': 'musicalgestures._video',
+    'Mg360Video': 'musicalgestures._360video',
+    'MgFigure': 'musicalgestures._utils',
+    'MgImage': 'musicalgestures._utils',
+    'convert': 'musicalgestures._utils',
+    'convert_to_mp4': 'musicalgestures._utils',
+    'get_framecount': 'musicalgestures._utils',
+    'ffmpeg_cmd': 'musicalgestures._utils',
+    'get_length': 'musicalgestures._utils',
+    'generate_outfilename': 'musicalgestures._utils',
+    'MgList': 'musicalgestures._mglist',
+    'preload_model': 'musicalgestures._modelcache',
+    'evict_model': 'musicalgestures._modelcache',
+    'cached_models': 'musicalgestures._modelcache',
+    'MgTrace': 'musicalgestures._trace',
+    'trace': 'musicalgestures._trace',
+}
+
+__all__ = list(_lazy_imports) + ['Examples', 'examples']
+
+
+def __getattr__(name):
+    """
+    Imports the public names of the package (and its submodules, e.g. `musicalgestures._utils`) the first time they are accessed.
+    """
+    if name in _lazy_imports:
+        value = getattr(importlib.import_module(_lazy_imports[name]), name)
+    elif name.startswith('_') and not name.startswith('__'):
+        try:
+            value = importlib.import_module(f'{__name__}.{name}')
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+            raise AttributeError(f"module '{__name__}' has no attribute '{name}'") from None
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_imports))
 
 
 class Examples:
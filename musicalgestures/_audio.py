@@ -1,21 +1,110 @@
 import os
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
-import matplotlib
 import numpy as np
 
-from musicalgestures._utils import MgFigure, get_length, generate_outfilename, has_audio
-from musicalgestures._info import mg_info as info
-from musicalgestures._colored import MgAudioProcessor, MgWaveformImage
+from musicalgestures._utils import MgFigure, get_length, get_samplerate, generate_outfilename, has_audio, read_audio
+from musicalgestures._trace import traced, span
+from musicalgestures._lazy import lazy_method
 
 import warnings
 warnings.filterwarnings("ignore")
 
-# preventing librosa-matplotlib deadlock
-plt.plot()
-plt.close()
+# librosa, matplotlib and pandas are slow to import, they are imported by the methods using them
+_pyplot = None
+
+
+def pyplot():
+    """
+    Imports matplotlib.pyplot the first time it is needed.
+
+    Returns:
+        module: The matplotlib.pyplot module.
+    """
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib.pyplot as plt
+        # preventing librosa-matplotlib deadlock
+        plt.plot()
+        plt.close()
+        _pyplot = plt
+    return _pyplot
+
+
+def spectral_descriptors(S, sr, n_fft, roll_percents=(0.99, 0.01), amin=1e-10):
+    """
+    Computes the spectral centroid, bandwidth, flatness and roll-off frequencies of every frame of a magnitude spectrogram at once.
+    Gives the same results as the corresponding `librosa.feature` functions, without computing an STFT for each of them.
+
+    Args:
+        S (np.array(float)): The magnitude spectrogram of shape (1 + n_fft/2, frames).
+        sr (int): The sampling rate of the signal.
+        n_fft (int): The length of the FFT window.
+        roll_percents (tuple, optional): The roll-off percents, one roll-off frequency is computed for each. Defaults to (0.99, 0.01).
+        amin (float, optional): Minimum power threshold for the spectral flatness. Defaults to 1e-10.
+
+    Returns:
+        dict: The 'centroid', 'bandwidth', 'flatness' and 'rolloff' (one row per roll-off percent) descriptors as arrays with one value per frame.
+    """
+    import librosa
+    S = np.asarray(S)
+    freq = librosa.fft_frequencies(sr=sr, n_fft=n_fft)[:, np.newaxis]
+
+    # normalize each frame to sum to 1, leaving (near) silent frames as they are like librosa.util.normalize does
+    total = S.sum(axis=0, keepdims=True)
+    weights = S / np.where(total < np.finfo(np.result_type(S, np.float32)).tiny, 1, total)
+
+    centroid = np.sum(freq * weights, axis=0)
+    bandwidth = np.sqrt(np.sum(weights * (freq - centroid) ** 2, axis=0))
+
+    power = np.maximum(amin, S ** 2)
+    flatness = np.exp(np.mean(np.log(power), axis=0)) / np.mean(power, axis=0)
+
+    # the first frequency at which the cumulative energy reaches each percentage of the total energy
+    energy = np.cumsum(S, axis=0)
+    rolloff = np.empty((len(roll_percents), S.shape[1]))
+    for i, roll_percent in enumerate(roll_percents):
+        reached = energy >= roll_percent * energy[-1]
+        rolloff[i] = freq[np.argmax(reached, axis=0), 0]
+
+    return dict(centroid=centroid, bandwidth=bandwidth, flatness=flatness, rolloff=rolloff)
+
+
+def save_descriptors(df, of, data_format='csv', target_name=None, overwrite=False):
+    """
+    Exports audio descriptors to file(s).
+
+    Args:
+        df (pd.DataFrame): The descriptors, one column per descriptor and one row per frame.
+        of (str): The input filename without extension, used as base of the output filename.
+        data_format (str or list, optional): Accepted values are 'csv', 'tsv', 'txt' and 'npz'. For multiple output formats, use list, e.g. ['csv', 'npz']. Defaults to 'csv'.
+        target_name (str, optional): The name of the output file(s). Defaults to None (which assumes that the input filename with the suffix "_descriptors" should be used).
+        overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+
+    Returns:
+        list: The paths of the written files.
+    """
+    if type(data_format) == str:
+        data_format = [data_format]
+    if target_name is None:
+        target_name = of + '_descriptors'
+
+    outputs = []
+    for fmt in dict.fromkeys(item.lower() for item in data_format):
+        if fmt not in ['csv', 'tsv', 'txt', 'npz']:
+            print(f"Invalid data format: '{fmt}'.\nFalling back to '.csv'.")
+            fmt = 'csv'
+        target = os.path.splitext(target_name)[0] + '.' + fmt
+        if not overwrite:
+            target = generate_outfilename(target)
+
+        if fmt == 'npz':
+            np.savez(target, **{column: df[column].values for column in df.columns})
+        elif fmt == 'csv':
+            df.to_csv(target, index=None)
+        else:
+            df.to_csv(target, index=None, sep='\t' if fmt == 'tsv' else ' ')
+        outputs.append(target)
+
+    return outputs
 
 
 class MgAudio:
@@ -29,6 +118,7 @@ class MgAudio:
             sr=None,
             n_fft=2048, 
             hop_length=512,
+            memmap=False,
             ):
         """
         Initializes the MgAudio class.
@@ -38,25 +128,109 @@ class MgAudio:
             sr (int, optional): Sampling rate of the audio file. Possible to specify a target sampling rate. Defaults to None (i.e. original sampling rate).
             n_fft (int, optional): Length of the FFT window. Defaults to 2048.
             hop_length (int, optional): Number of samples between successive frames. Defaults to 512.
+            memmap (bool, optional): Whether to keep the decoded signal in a memory-mapped temporary file instead of in memory, for long files. Defaults to False.
         """
         
         self.filename = filename
         self.of, self.fex = os.path.splitext(filename)
         if sr is None:
-            self.sr = librosa.get_samplerate(self.filename)
+            self.sr = get_samplerate(self.filename)
         else:
             self.sr = sr
         self.n_fft = n_fft
         self.hop_length = hop_length
+        self.memmap = memmap
         self.length = get_length(self.filename)
+        # the decoded signal and the spectral features computed from it are memoized, see `signal` and `features`
+        self._y = None
+        self._features = {}
 
-    from musicalgestures._ssm import mg_ssm as ssm
+    info = lazy_method('musicalgestures._info', 'mg_info')
+    ssm = lazy_method('musicalgestures._ssm', 'mg_ssm')
+    stream_features = lazy_method('musicalgestures._audiostream', 'mg_audio_stream')
 
     def numpy(self):
         "Read the original file of the MgAudio object as a numpy array using librosa."
-        self.y, self.sr = librosa.load(self.filename, sr=self.sr)
+        self.y = self.signal()
         return self.y
 
+    def signal(self):
+        """
+        Decodes (and resamples to `self.sr`) the audio of the file with FFmpeg the first time it is needed (see `read_audio`). Subsequent calls return the same signal, so that the file is only decoded once per MgAudio.
+
+        Returns:
+            np.array(float32): The (read-only) mono audio signal.
+        """
+        if getattr(self, '_y', None) is None:
+            with span('audio.decode'):
+                self._y, self.sr = read_audio(self.filename, sr=self.sr, memmap=getattr(self, 'memmap', False))
+        return self._y
+
+    def features(self, n_fft=None, hop_length=None, n_mels=None, fmin=0.0, fmax=None, power=1.0):
+        """
+        Computes the magnitude spectrogram of the signal, or a mel spectrogram derived from it, and memoizes it by its parameters `(n_fft, hop_length, n_mels, fmin, fmax, power)`.
+        The magnitude spectrogram is itself memoized by `(n_fft, hop_length)`, so all mel spectrograms with the same framing share one STFT.
+
+        Args:
+            n_fft (int, optional): Length of the FFT window. Defaults to None (which uses `self.n_fft`).
+            hop_length (int, optional): Number of samples between successive frames. Defaults to None (which uses `self.hop_length`).
+            n_mels (int, optional): Number of mel bands. Defaults to None (which returns the linear-frequency spectrogram).
+            fmin (float, optional): Lowest frequency (in Hz) of the mel bands. Defaults to 0.0.
+            fmax (float, optional): Highest frequency (in Hz) of the mel bands. Defaults to None, use fmax = sr / 2.0.
+            power (float, optional): Exponent applied to the magnitude spectrogram (1 for magnitude, 2 for power). Defaults to 1.0.
+
+        Returns:
+            np.array(float32): The spectrogram of shape (frequency bins, frames).
+        """
+        import librosa
+        n_fft = self.n_fft if n_fft is None else n_fft
+        hop_length = self.hop_length if hop_length is None else hop_length
+        if n_mels is None:
+            # the mel band limits do not apply to the linear spectrogram
+            fmin, fmax = 0.0, None
+        key = (n_fft, hop_length, n_mels, float(fmin), fmax if fmax is None else float(fmax), float(power))
+
+        if getattr(self, '_features', None) is None:
+            self._features = {}
+        if key not in self._features:
+            if n_mels is None and power == 1:
+                y = self.signal()
+                with span('audio.stft', n_fft=n_fft, hop_length=hop_length):
+                    S = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+            elif n_mels is None:
+                S = self.features(n_fft, hop_length) ** power
+            else:
+                S = self.features(n_fft, hop_length, power=power)
+                with span('audio.mel', n_mels=n_mels):
+                    S = librosa.feature.melspectrogram(S=S, sr=self.sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+            self._features[key] = S
+        return self._features[key]
+
+    def onset_strength(self, n_fft=None, hop_length=None, n_mels=128, fmin=0.0, fmax=None):
+        """
+        Computes the onset strength envelope (spectral flux of the log-power mel spectrogram) of the signal, like `librosa.onset.onset_strength`, but from the memoized mel spectrogram.
+        The envelope is memoized as well.
+
+        Args:
+            n_fft (int, optional): Length of the FFT window. Defaults to None (which uses `self.n_fft`).
+            hop_length (int, optional): Number of samples between successive frames. Defaults to None (which uses `self.hop_length`).
+            n_mels (int, optional): Number of mel bands. Defaults to 128.
+            fmin (float, optional): Lowest frequency (in Hz). Defaults to 0.0.
+            fmax (float, optional): Highest frequency (in Hz). Defaults to None, use fmax = sr / 2.0.
+
+        Returns:
+            np.array(float32): The onset strength envelope.
+        """
+        import librosa
+        n_fft = self.n_fft if n_fft is None else n_fft
+        hop_length = self.hop_length if hop_length is None else hop_length
+        key = ('onset', n_fft, hop_length, n_mels, float(fmin), fmax if fmax is None else float(fmax))
+        S = self.features(n_fft, hop_length, n_mels=n_mels, fmin=fmin, fmax=fmax, power=2.0)
+        if key not in self._features:
+            with span('audio.onset'):
+                self._features[key] = librosa.onset.onset_strength(S=librosa.power_to_db(S), sr=self.sr, n_fft=n_fft, hop_length=hop_length)
+        return self._features[key]
+
 
     def format_time(self, ax, original_time=True, original_duration=None):
             """
@@ -67,6 +241,9 @@ class MgAudio:
                 original_time (bool, optional): Whether to get the original time for audio plotting or not. Defaults to True.
                 original_duration (bool, optional): Whether to add the original duration of the file to be formatted manually. Defaults to None.
             """
+            import matplotlib.ticker as ticker
+            from musicalgestures._info import mg_info as info
+
             # Get original duration from video file
             try:
                 if original_duration is not None:
@@ -96,6 +273,7 @@ class MgAudio:
             else:  
                 ax.xaxis.set_major_formatter(ticker.FixedFormatter(list(time)))
 
+    @traced('audio.waveform')
     def waveform(self, dpi=300, autoshow=True, raw=False, colored=False, image_width=2500, image_height=500, fmin=500, fmax=None, cmap='freesound', original_time=True, title=None, target_name=None, overwrite=False):
         """
         Renders a figure showing the waveform of the video/audio file.
@@ -118,6 +296,10 @@ class MgAudio:
         Returns:
             MgFigure: An MgFigure object referring to the internal figure and its data.
         """
+        import librosa.display
+        import matplotlib.ticker as ticker
+        from musicalgestures._colored import MgAudioProcessor, MgWaveformImage
+        plt = pyplot()
 
         if not has_audio(self.filename):
             print('The video has no audio track.')
@@ -132,21 +314,13 @@ class MgAudio:
             target_name = generate_outfilename(target_name)
 
         if colored:
-            # Process audio chunks and compute spectral centroid for creating the colored waveform
+            # Read the audio once and compute the peaks and spectral centroid of every pixel column for creating the colored waveform
             processor = MgAudioProcessor(self.filename, self.n_fft, fmin, fmax)
             y = MgWaveformImage(image_width, image_height, cmap)
-            sr = processor.audio_file.samplerate
-
-            samples_per_pixel = processor.audio_file.frames / float(image_width)
-            
-            for x in range(image_width):
-                seek_point = int(x * samples_per_pixel)
-                next_seek_point = int((x + 1) * samples_per_pixel)
-                spectral_centroid = processor.spectral_centroid(seek_point) 
-                peaks = processor.peaks(seek_point, next_seek_point)        
-                y.draw_peaks(x, peaks, spectral_centroid) 
+            sr = processor.samplerate
+            y.draw_peaks(processor.peaks(image_width), processor.spectral_centroids(image_width))
         else:
-            y, sr = librosa.load(self.filename, sr=self.sr)
+            y, sr = self.signal(), self.sr
 
         fig, ax = plt.subplots(figsize=(12, 4), dpi=dpi)
         fig.patch.set_facecolor('white') # make sure background is white
@@ -161,7 +335,7 @@ class MgAudio:
 
         if colored:
             # Get the original duration of the audio file and format it to HH:MM:SS
-            original_duration = float(processor.audio_file.frames / processor.audio_file.samplerate)
+            original_duration = float(processor.frames / processor.samplerate)
             self.format_time(ax, original_duration=original_duration)
             ax.imshow(y.image.astype('uint8'), interpolation='nearest')
             # Replace yticks with values between -1 and 1 for practicalities
@@ -207,6 +381,7 @@ class MgAudio:
         return mgf
 
 
+    @traced('audio.spectrogram')
     def spectrogram(self, fmin=0.0, fmax=None, n_mels=128, power=2.0, top_db=80.0, dpi=300, autoshow=True, raw=False, original_time=False, title=None, target_name=None, overwrite=False):
         """
         Renders a figure showing the mel-scaled spectrogram of the video/audio file.
@@ -228,6 +403,9 @@ class MgAudio:
         Returns:
             MgFigure: An MgFigure object referring to the internal figure and its data.
         """
+        import librosa.display
+        import matplotlib.ticker
+        plt = pyplot()
 
         if not has_audio(self.filename):
             print('The video has no audio track.')
@@ -241,10 +419,8 @@ class MgAudio:
         if not overwrite:
             target_name = generate_outfilename(target_name)
 
-        y, sr = librosa.load(self.filename, sr=self.sr)
-
-        S = librosa.feature.melspectrogram(
-            y=y, sr=sr, n_mels=n_mels, n_fft=self.n_fft, hop_length=self.hop_length, power=power, fmin=fmin, fmax=fmax)
+        sr = self.sr
+        S = self.features(n_mels=n_mels, fmin=fmin, fmax=fmax, power=power)
 
         fig, ax = plt.subplots(figsize=(12, 4), dpi=dpi)
         # Add title
@@ -318,6 +494,7 @@ class MgAudio:
 
         return mgf
 
+    @traced('audio.tempogram')
     def tempogram(self, dpi=300, autoshow=True, raw=False, original_time=False, title=None, target_name=None, overwrite=False):
         """
         Renders a figure with a plots of onset strength and tempogram of the video/audio file.
@@ -334,6 +511,8 @@ class MgAudio:
         Returns:
             MgFigure: An MgFigure object referring to the internal figure and its data.
         """
+        import librosa.display
+        plt = pyplot()
 
         if not has_audio(self.filename):
             print('The video has no audio track.')
@@ -347,9 +526,8 @@ class MgAudio:
         if not overwrite:
             target_name = generate_outfilename(target_name)
 
-        y, sr = librosa.load(self.filename, sr=self.sr)
-
-        oenv = librosa.onset.onset_strength(y=y, sr=sr, hop_length=self.hop_length)
+        oenv = self.onset_strength()
+        sr = self.sr
 
         tempogram = librosa.feature.tempogram(
             onset_envelope=oenv, sr=sr, hop_length=self.hop_length)
@@ -416,6 +594,7 @@ class MgAudio:
 
         return mgf
     
+    @traced('audio.hpss')
     def hpss(self, dim=2, n_mels=128, fmin=0.0, fmax=None, kernel_size=31, margin=(1.0,5.0), power=2.0, top_db=80.0, mask=False, residual=False, dpi=300, autoshow=True, original_time=False, title=None, target_name=None, overwrite=False):
         """
         Renders a figure with a plots of harmonic and percussive components of the audio file.
@@ -441,6 +620,8 @@ class MgAudio:
         Returns:
             MgFigure: An MgFigure object referring to the internal figure and its data.
         """
+        import librosa.display
+        plt = pyplot()
 
         if not has_audio(self.filename):
             print('The video has no audio track.')
@@ -454,9 +635,9 @@ class MgAudio:
         if not overwrite:
             target_name = generate_outfilename(target_name)
 
-        y, sr = librosa.load(self.filename, sr=self.sr)
+        y, sr = self.signal(), self.sr
         if dim == 2:
-            D = librosa.feature.melspectrogram(y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length, n_mels=n_mels, fmin=fmin, fmax=fmax)
+            D = self.features(n_mels=n_mels, fmin=fmin, fmax=fmax, power=2.0)
             # Separate into harmonic and percussive components
             H, P = librosa.decompose.hpss(D, kernel_size=kernel_size, margin=margin, power=power, mask=mask)
         elif dim == 1:
@@ -566,9 +747,11 @@ class MgAudio:
         return mgf
 
 
-    def descriptors(self, n_mels=128, fmin=0.0, fmax=None, power=2, dpi=300, autoshow=True, original_time=False, title=None, target_name=None, overwrite=False):
+    @traced('audio.descriptors')
+    def descriptors(self, n_mels=128, fmin=0.0, fmax=None, power=2, dpi=300, autoshow=True, original_time=False, title=None, target_name=None, overwrite=False, save_data=False, data_format='csv', target_name_data=None):
         """
         Renders a figure of plots showing spectral/loudness descriptors, including RMS energy, spectral flatness, centroid, bandwidth, rolloff of the video/audio file.
+        All spectral descriptors are derived from a single magnitude spectrogram (see `spectral_descriptors`), and the descriptors are also returned as a pandas DataFrame in the 'dataframe' field of the figure data.
 
         Args:
             n_mels (int, optional): The number of mel filters to use for filtering the frequency domain. Affects the vertical resolution (sharpness) of the spectrogram. NB: Too high values with relatively small window sizes can result in artifacts (typically black lines) in the resulting image. Defaults to 128.
@@ -581,10 +764,17 @@ class MgAudio:
             title (str, optional): Optionally add title to the figure. Possible to set the filename as the title using the string 'filename'. Defaults to None.
             target_name (str, optional): The name of the output image. Defaults to None (which assumes that the input filename with the suffix "_descriptors.png" should be used).
             overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+            save_data (bool, optional): Whether to save the descriptors (one row per frame) to file(s). Defaults to False.
+            data_format (str or list, optional): Specifies format of the descriptors data. Accepted values are 'csv', 'tsv', 'txt' and 'npz'. For multiple output formats, use list, e.g. ['csv', 'npz']. Defaults to 'csv'.
+            target_name_data (str, optional): The name of the output data file(s). Defaults to None (which assumes that the input filename with the suffix "_descriptors" should be used).
 
         Returns:
             MgFigure: An MgFigure object referring to the internal figure and its data.
         """
+        import librosa.display
+        import matplotlib.ticker
+        import pandas as pd
+        plt = pyplot()
         if not has_audio(self.filename):
             print('The video has no audio track.')
             return
@@ -597,24 +787,28 @@ class MgAudio:
         if not overwrite:
             target_name = generate_outfilename(target_name)
 
-        y, sr = librosa.load(self.filename, sr=self.sr)
-
-        cent = librosa.feature.spectral_centroid(
-            y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
-        spec_bw = librosa.feature.spectral_bandwidth(
-            y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
-        flatness = librosa.feature.spectral_flatness(
-            y=y, n_fft=self.n_fft, hop_length=self.hop_length)
-        rolloff = librosa.feature.spectral_rolloff(
-            y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length, roll_percent=0.99)
-        rolloff_min = librosa.feature.spectral_rolloff(
-            y=y, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length, roll_percent=0.01)
+        y, sr = self.signal(), self.sr
+
+        # every spectral descriptor is derived from the same (memoized) magnitude spectrogram
+        spectral = spectral_descriptors(self.features(), sr, self.n_fft)
+        cent = spectral['centroid'][np.newaxis]
+        spec_bw = spectral['bandwidth'][np.newaxis]
+        flatness = spectral['flatness'][np.newaxis]
+        rolloff, rolloff_min = spectral['rolloff'][:1], spectral['rolloff'][1:]
+        # the RMS energy is computed on the (non-windowed) frames of the signal, which needs no STFT
         rms = librosa.feature.rms(
             y=y, frame_length=self.n_fft, hop_length=self.hop_length)
         
-        S = librosa.feature.melspectrogram(
-            y=y, sr=sr, n_mels=n_mels, n_fft=self.n_fft, hop_length=self.hop_length, power=power, fmin=fmin, fmax=fmax)
-        
+        S = self.features(n_mels=n_mels, fmin=fmin, fmax=fmax, power=power)
+
+        times = librosa.times_like(
+            cent, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+        df = pd.DataFrame({'Time': times, 'RMS': rms[0], 'Flatness': flatness[0], 'Centroid': cent[0], 'Bandwidth': spec_bw[0],
+                           'Rolloff99': rolloff[0], 'Rolloff01': rolloff_min[0]})
+        if save_data:
+            save_descriptors(df, self.of, data_format=data_format, target_name=target_name_data, overwrite=overwrite)
+
         fig, ax = plt.subplots(figsize=(12, 8), dpi=dpi, nrows=3, sharex=True)
         # add title
         if title is None:
@@ -651,9 +845,6 @@ class MgAudio:
         ax[2].set(yticks=(freq_ticks))
         ax[2].set(yticklabels=(freq_ticks_labels))
 
-        times = librosa.times_like(
-            cent, sr=sr, n_fft=self.n_fft, hop_length=self.hop_length)
-
         ax[2].fill_between(times, cent[0] - spec_bw[0], cent[0] +
                            spec_bw[0], alpha=0.5, label='Centroid +- bandwidth')
         ax[2].plot(times, cent.T, label='Centroid', color='y')
@@ -694,7 +885,8 @@ class MgAudio:
             "rolloff": rolloff,
             "rolloff_min": rolloff_min,
             "flatness": flatness,
-            "rms": rms
+            "rms": rms,
+            "dataframe": df
         }
 
         mgf = MgFigure(
@@ -0,0 +1,170 @@
+import os
+import json
+import numpy as np
+import librosa
+
+from musicalgestures._utils import MgProgressbar, generate_outfilename, has_audio, audio_pipe
+from musicalgestures._audio import spectral_descriptors
+from musicalgestures._trace import traced
+
+# the features written by `mg_audio_stream`, with the number of values per frame (None for the number of mel bands)
+STREAM_FEATURES = {
+    'mel': None,
+    'onset_env': 1,
+    'rms': 1,
+    'centroid': 1,
+    'bandwidth': 1,
+    'flatness': 1,
+    'rolloff': 2,
+}
+
+
+def audio_blocks(stream, block_length, frame_length, hop_length):
+    """
+    Reads mono float32 samples (f32le) from a binary stream, such as the stdout of `audio_pipe`, block by block. Consecutive blocks overlap by `frame_length - hop_length` samples,
+    so that framing each block (without centering) gives exactly `block_length` consecutive frames of the whole signal, like `librosa.stream` does.
+
+    Args:
+        stream (file object): The binary stream to read from.
+        block_length (int): The number of frames per block.
+        frame_length (int): The number of samples per frame.
+        hop_length (int): The number of samples between successive frames.
+
+    Yields:
+        np.array(float32): The next block of samples. The last block may be shorter.
+    """
+    blocksize = frame_length + (block_length - 1) * hop_length
+    overlap = frame_length - hop_length
+    block = np.zeros(0, dtype=np.float32)
+    while True:
+        # read until the block is full, pipes can return less than asked for
+        missing = (blocksize - len(block)) * 4
+        data = b''
+        while len(data) < missing:
+            chunk = stream.read(missing - len(data))
+            if not chunk:
+                break
+            data += chunk
+        if len(data) < 4:
+            break
+        block = np.concatenate((block, np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)))
+        # blocks shorter than a frame hold no new frame
+        if len(block) >= frame_length:
+            yield block
+        if len(block) < blocksize:
+            break
+        block = block[len(block) - overlap:]
+
+
+def load_stream_features(folder):
+    """
+    Opens the features written by `mg_audio_stream` as read-only disk-backed arrays.
+
+    Args:
+        folder (str): Path to the output folder of `mg_audio_stream`.
+
+    Returns:
+        dict: The features, each of shape (values, frames) like their librosa counterparts, along with 'sr', 'hop_size', 'n_fft' and 'times'.
+    """
+    with open(os.path.join(folder, 'features.json')) as f:
+        header = json.load(f)
+
+    features = {key: header[key] for key in ['sr', 'hop_size', 'n_fft']}
+    for feature, size in header['features'].items():
+        path = os.path.join(folder, feature + '.f32')
+        if header['frames'] == 0:
+            features[feature] = np.zeros((size, 0), dtype=np.float32)
+            continue
+        # frames are appended one after another, so the time axis comes first on disk
+        features[feature] = np.memmap(path, dtype=np.float32, mode='r', shape=(header['frames'], size)).T
+    features['times'] = librosa.frames_to_time(np.arange(header['frames']), sr=header['sr'], hop_length=header['hop_size'], n_fft=header['n_fft'])
+    return features
+
+
+@traced('audio.stream')
+def mg_audio_stream(self, block_length=256, n_mels=128, fmin=0.0, fmax=None, target_name=None, overwrite=False):
+    """
+    Computes the mel spectrogram, onset strength envelope, RMS energy and spectral descriptors (centroid, bandwidth, flatness and the 0.99 and 0.01 roll-off frequencies)
+    of the audio file block by block, so that memory use is bounded by the block size whatever the length of the file. The features of each block are appended to
+    raw float32 files in an output folder (described by a 'features.json' header), which can be opened as disk-backed arrays with `load_stream_features`.
+
+    The audio is decoded (and resampled to `self.sr`) by an FFmpeg pipe, so video files are streamed as well.
+    Frames are not centered, and the onset strength is the spectral flux of the mel spectrogram in dB relative to 1 (instead of the peak of the file), so that it does not depend on the blocks.
+
+    Args:
+        block_length (int, optional): The number of frames processed at once. Defaults to 256.
+        n_mels (int, optional): Number of mel bands. Defaults to 128.
+        fmin (float, optional): Lowest frequency (in Hz) of the mel bands. Defaults to 0.0.
+        fmax (float, optional): Highest frequency (in Hz) of the mel bands. Defaults to None, use fmax = sr / 2.0.
+        target_name (str, optional): The name of the output folder. Defaults to None (which assumes that the input filename with the suffix "_stream" should be used).
+        overwrite (bool, optional): Whether to allow overwriting the files of an existing output folder or to automatically increment the target name to avoid overwriting. Defaults to False.
+
+    Returns:
+        dict: The features as returned by `load_stream_features`.
+
+    Raises:
+        FileExistsError: If the target folder exists, is not empty and is not an output folder of `mg_audio_stream` (it has no 'features.json').
+    """
+    if not has_audio(self.filename):
+        print('The video has no audio track.')
+        return
+
+    sr, n_fft, hop_length = self.sr, self.n_fft, self.hop_length
+
+    if target_name is None:
+        target_name = self.of + '_stream'
+    if not overwrite:
+        target_name = generate_outfilename(target_name)
+    if os.path.isdir(target_name):
+        # only replace the files of a previous output, never the contents of another folder
+        if len(os.listdir(target_name)) > 0 and not os.path.isfile(os.path.join(target_name, 'features.json')):
+            raise FileExistsError(f'"{target_name}" is not empty and is not an output folder of stream_features.')
+        # the header goes first, so that an interrupted run does not leave a header describing other features
+        if os.path.isfile(os.path.join(target_name, 'features.json')):
+            os.remove(os.path.join(target_name, 'features.json'))
+    else:
+        os.makedirs(target_name)
+
+    sizes = {feature: n_mels if size is None else size for feature, size in STREAM_FEATURES.items()}
+    outputs = {feature: open(os.path.join(target_name, feature + '.f32'), 'wb') for feature in sizes}
+
+    total = int(np.ceil(self.length * sr / (block_length * hop_length)))
+    pb = MgProgressbar(total=max(1, total), prefix='Streaming audio features:')
+
+    frames = 0
+    previous = None
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax)
+    process = audio_pipe(self.filename, sr)
+    try:
+        for i, block in enumerate(audio_blocks(process.stdout, block_length, n_fft, hop_length)):
+            S = np.abs(librosa.stft(block, n_fft=n_fft, hop_length=hop_length, center=False))
+            mel = mel_basis.dot(S ** 2)
+            log_mel = librosa.power_to_db(mel, top_db=None)
+
+            # the spectral flux needs the last frame of the previous block, the first frame of the file has no onset
+            flux = np.diff(log_mel, axis=1, prepend=log_mel[:, :1] if previous is None else previous)
+            onset_env = np.maximum(0, flux).mean(axis=0)
+            previous = log_mel[:, -1:]
+
+            rms = np.sqrt(np.mean(librosa.util.frame(block, frame_length=n_fft, hop_length=hop_length) ** 2, axis=0))
+            spectral = spectral_descriptors(S, sr, n_fft)
+
+            block_features = dict(mel=mel.T, onset_env=onset_env, rms=rms, centroid=spectral['centroid'], bandwidth=spectral['bandwidth'],
+                                  flatness=spectral['flatness'], rolloff=spectral['rolloff'].T)
+            for feature, values in block_features.items():
+                outputs[feature].write(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+
+            frames += S.shape[1]
+            pb.progress(min(i + 1, total))
+    finally:
+        process.stdout.close()
+        process.terminate()
+        process.wait()
+        for output in outputs.values():
+            output.close()
+    pb.progress(max(1, total))
+
+    with open(os.path.join(target_name, 'features.json'), 'w') as f:
+        json.dump(dict(sr=sr, hop_size=hop_length, n_fft=n_fft, frames=frames, features=sizes), f)
+
+    return load_stream_features(target_name)
@@ -1,20 +1,134 @@
 import numpy as np
 import os, subprocess
+import cv2
+import multiprocessing.pool
 
-from musicalgestures._utils import MgImage, generate_outfilename, get_framecount, get_length, ffmpeg_cmd
+from musicalgestures._utils import MgImage, MgProgressbar, generate_outfilename, get_framecount, get_length, get_widthheight, get_fps, ffmpeg_cmd
+from musicalgestures._checkpoint import frame_ranges
 
+# component modes which reduce to a running statistic of the frames
+BLEND_REDUCTIONS = ['average', 'lighten', 'darken']
 
-def mg_blend_image(self, filename=None, mode='all_mode', component_mode='average', target_name=None, overwrite=False):
+
+def frame_stats_range(filename, width, height, fps, start_frame=0, num_frames=None, color=True, blur=False):
+    """
+    Accumulates the sum, minimum and maximum images of a consecutive range of frames of a video.
+
+    Args:
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        start_frame (int, optional): The first frame of the range. Defaults to 0.
+        num_frames (int, optional): The number of frames in the range. Defaults to None (which reads until the end of the video).
+        color (bool, optional): If False, the frames are converted to grayscale. Defaults to True.
+        blur (bool, optional): Whether to apply a 10px * 10px average blurring filter on the frames. Defaults to False.
+
+    Returns:
+        dict: The number of frames ('count'), the float64 sum image ('sum') and the uint8 minimum and maximum images ('min', 'max').
+    """
+    cmd = ['ffmpeg', '-y']
+    if start_frame > 0:
+        # seek half a frame early to make sure the first frame of the range is not skipped due to rounding
+        cmd += ['-ss', '{:.6f}'.format((start_frame - 0.5) / fps)]
+    cmd += ['-i', filename]
+    if num_frames is not None:
+        cmd += ['-frames:v', str(num_frames)]
+    if blur:
+        cmd += ['-vf', 'avgblur=sizeX=10:sizeY=10']
+    process = ffmpeg_cmd(cmd, total_time=num_frames / fps if num_frames is not None else 0, pipe='read')
+
+    shape = (height, width, 3) if color else (height, width)
+    stats = dict(count=0, sum=np.zeros(shape, dtype=np.float64),
+                 min=np.full(shape, 255, dtype=np.uint8), max=np.zeros(shape, dtype=np.uint8))
+
+    while True:
+        out = process.stdout.read(width*height*3)
+        if out == b'':
+            break
+
+        frame = np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3])
+        if not color:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        stats['count'] += 1
+        np.add(stats['sum'], frame, out=stats['sum'])
+        np.minimum(stats['min'], frame, out=stats['min'])
+        np.maximum(stats['max'], frame, out=stats['max'])
+
+    process.terminate()
+
+    return stats
+
+
+def merge_frame_stats(stats, other):
     """
-    Finds and saves a blended image of an input video file using FFmpeg. 
-    The FFmpeg tblend (time blend) filter takes two consecutive frames from one single stream, and outputs the result obtained by blending the new frame on top of the old frame.
+    Merges the statistics of two frame ranges (in place). The order of merging does not matter.
+
+    Args:
+        stats (dict): The statistics to merge into, as returned by `frame_stats_range`.
+        other (dict): The statistics to merge.
+
+    Returns:
+        dict: The merged statistics.
+    """
+    stats['count'] += other['count']
+    np.add(stats['sum'], other['sum'], out=stats['sum'])
+    np.minimum(stats['min'], other['min'], out=stats['min'])
+    np.maximum(stats['max'], other['max'], out=stats['max'])
+    return stats
+
+
+def frame_stats(filename, width, height, fps, length, color=True, blur=False, num_workers=1, pb_prefix='Accumulating frames:'):
+    """
+    Accumulates the sum, minimum and maximum images of all frames of a video. With several workers, the video is split into
+    one range of frames per worker, decoded in parallel, and the statistics of the ranges are merged.
+
+    Args:
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        length (int): The number of frames in the input video.
+        color (bool, optional): If False, the frames are converted to grayscale. Defaults to True.
+        blur (bool, optional): Whether to apply a 10px * 10px average blurring filter on the frames. Defaults to False.
+        num_workers (int, optional): The number of ranges decoded in parallel. Defaults to 1.
+        pb_prefix (str, optional): The prefix of the progress bar. Defaults to 'Accumulating frames:'.
+
+    Returns:
+        dict: The number of frames ('count'), the float64 sum image ('sum') and the uint8 minimum and maximum images ('min', 'max').
+    """
+    num_workers = max(1, min(num_workers, length))
+    ranges = frame_ranges(length, -(-length // num_workers))
+
+    pb = MgProgressbar(total=len(ranges), prefix=pb_prefix)
+
+    def accumulate(frame_range):
+        return frame_stats_range(filename, width, height, fps, frame_range[0], frame_range[1], color=color, blur=blur)
+
+    stats = None
+    # decoding happens in the ffmpeg processes and numpy releases the GIL, so threads are enough
+    with multiprocessing.pool.ThreadPool(len(ranges)) as pool:
+        for i, range_stats in enumerate(pool.imap_unordered(accumulate, ranges)):
+            stats = range_stats if stats is None else merge_frame_stats(stats, range_stats)
+            pb.progress(i + 1)
+
+    return stats
+
+
+def mg_blend_image(self, filename=None, mode='all_mode', component_mode='average', target_name=None, overwrite=False, num_workers=1):
+    """
+    Finds and saves a blended image of an input video file.
+    The 'average', 'lighten' and 'darken' component modes are computed exactly, as the mean, maximum and minimum of all frames, by accumulating the frames piped from FFmpeg (see `frame_stats`).
+    Other modes use the FFmpeg tblend (time blend) filter, which takes two consecutive frames from one single stream, and outputs the result obtained by blending the new frame on top of the old frame.
 
     Args:
         filename (str, optional): Path to the input video file. If None, the video file of the MgObject is used. Defaults to None.
-        mode (str, optional): Set blend mode for specific pixel component or all pixel components. Accepted options are 'c0_mode', 'c1_mode', c2_mode', 'c3_mode' and 'all_mode'. Defaults to 'all_mode'. 
+        mode (str, optional): Set blend mode for specific pixel component or all pixel components. Accepted options are 'c0_mode', 'c1_mode', c2_mode', 'c3_mode' and 'all_mode'. Defaults to 'all_mode'.
         component_mode (str, optional): Component mode of the FFmpeg tblend. Available values for component modes can be accessed here: https://ffmpeg.org/ffmpeg-filters.html#blend-1. Defaults to 'average'.
         target_name (str, optional): The name of the output video. Defaults to None (which assumes that the input filename with the component mode suffix should be used).
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+        num_workers (int, optional): The number of video segments accumulated in parallel for the 'average', 'lighten' and 'darken' modes. If less than 1, the number of CPUs is used. Defaults to 1.
 
     Returns:
         MgImage: A new MgImage pointing to the output image file.
@@ -30,34 +144,55 @@ def mg_blend_image(self, filename=None, mode='all_mode', component_mode='average
     if not overwrite:
         target_name = generate_outfilename(target_name)
 
-    # Get the number of frames
-    frames = get_framecount(filename)
-    # Get the number of times all frames can be divided
-    divider = int(np.ceil(np.log(frames / 2) / np.log(2)))
+    if mode == 'all_mode' and component_mode in BLEND_REDUCTIONS:
+        if filename == self.filename:
+            width, height, fps, length = self.width, self.height, self.fps, self.length
+        else:
+            (width, height), fps, length = get_widthheight(filename), get_fps(filename), get_framecount(filename)
+        if num_workers is None or num_workers < 1:
+            num_workers = multiprocessing.cpu_count()
 
-    # Set average blur
-    if self.blur.lower() == 'average':
-        cmd_filter += 'avgblur=sizeX=10:sizeY=10,'
+        stats = frame_stats(filename, width, height, fps, length, color=self.color,
+                            blur=self.blur.lower() == 'average', num_workers=num_workers,
+                            pb_prefix='Rendering blended image:')
 
-    # Define ffmpeg command
-    cmd = ['ffmpeg', '-y', '-i', self.filename]
+        if component_mode == 'average':
+            image = np.round(stats['sum'] / max(1, stats['count'])).astype(np.uint8)
+        elif component_mode == 'lighten':
+            image = stats['max']
+        else:
+            image = stats['min']
+        cv2.imwrite(target_name, image)
 
-    cmd_filter = ''
-    # set color mode
-    if self.color == True:
-        pixformat = 'gbrp'
     else:
-        pixformat = 'gray'
-    cmd_filter += f'format={pixformat},'
+        # Get the number of frames
+        frames = get_framecount(filename)
+        # Get the number of times all frames can be divided
+        divider = int(np.ceil(np.log(frames / 2) / np.log(2)))
+
+        # Define ffmpeg command
+        cmd = ['ffmpeg', '-y', '-i', filename]
+
+        cmd_filter = ''
+        # Set average blur
+        if self.blur.lower() == 'average':
+            cmd_filter += 'avgblur=sizeX=10:sizeY=10,'
+
+        # set color mode
+        if self.color == True:
+            pixformat = 'gbrp'
+        else:
+            pixformat = 'gray'
+        cmd_filter += f'format={pixformat},'
+
+        # Set frame blend every two frames
+        cmd_filter += f'tblend={mode}={component_mode},framestep=2,' * divider + 'setpts=1*PTS'
+        cmd_end = ['-frames:v', '1', target_name]
+        cmd += ['-vf', cmd_filter] + cmd_end
 
-    # Set frame blend every two frames
-    cmd_filter += f'tblend={mode}={component_mode},framestep=2,' * divider + 'setpts=1*PTS'
-    cmd_end = ['-frames:v', '1', target_name]
-    cmd += ['-vf', cmd_filter] + cmd_end
+        # Run the command using ffmpeg and wait for it to finish
+        ffmpeg_cmd(cmd, get_length(filename), pb_prefix='Rendering blended image:')
 
-    # Run the command using ffmpeg and wait for it to finish
-    ffmpeg_cmd(cmd, get_length(self.filename), pb_prefix='Rendering blended image:')
- 
     # Save result as the blended image for parent MgObject
     self.blend_image = MgImage(target_name)
 
@@ -1,9 +1,13 @@
 import os
 import cv2
+import functools
 import numpy as np
 import skimage.draw
 import pandas as pd
+import shutil
 import subprocess
+from scipy.spatial import cKDTree
+from scipy.ndimage import gaussian_filter
 
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib.pyplot as plt
@@ -13,7 +17,10 @@ import matplotlib as mpl
 import musicalgestures
 from musicalgestures._centerface import CenterFace
 from musicalgestures._filter import filter_frame_ffmpeg
-from musicalgestures._utils import MgProgressbar, MgImage, embed_audio_in_video, extract_wav, generate_outfilename, frame2ms, ffmpeg_cmd
+from musicalgestures._checkpoint import MgCheckpoint, frame_ranges
+from musicalgestures._pose import frame_motion
+from musicalgestures._utils import MgProgressbar, MgImage, generate_outfilename, frame2ms, ffmpeg_cmd, merge_videos
+from musicalgestures._trace import traced, span, accumulate
 
 def scaling_mask(x1, y1, x2, y2, mask_scale=1.0):
     """
@@ -38,14 +45,10 @@ def scaling_mask(x1, y1, x2, y2, mask_scale=1.0):
     return np.round([x1, y1, x2, y2]).astype(int)
 
 def centroid_mask(data):
-    centroid = np.zeros((data.shape[0], 2))
-    for i, coordinates in enumerate(data):
-        # Compute the centroid of the mask using the mask's coordinates (x1,y1,x2,y2)
-        centroid[i][0] = (coordinates[1] + coordinates[3]) / 2 
-        centroid[i][1] = (coordinates[2] + coordinates[4]) / 2
-
-    center_x = centroid[:,0] 
-    center_y = centroid[:,1]        
+    # Compute the centroid of the masks using their coordinates (x1,y1,x2,y2)
+    data = np.asarray(data, dtype=float).reshape(-1, 5)
+    center_x = (data[:, 1] + data[:, 3]) / 2
+    center_y = (data[:, 2] + data[:, 4]) / 2
     return center_x, center_y
     
 def heatmap_data(data, resolution, data_min, data_max):
@@ -54,20 +57,383 @@ def heatmap_data(data, resolution, data_min, data_max):
     return heatmap_data
 
 def nearest_neighbours(x, y, width, height, resolution, n_neighbours):
-    image = np.zeros([resolution, resolution])
+    """
+    Computes a heatmap where each pixel is the inverse of the summed distance to its `n_neighbours` nearest points, using a k-d tree.
+
+    Args:
+        x (np.array): The x coordinates of the points.
+        y (np.array): The y coordinates of the points.
+        width (int): The width of the frame.
+        height (int): The height of the frame.
+        resolution (int): The number of pixels in each dimension of the heatmap.
+        n_neighbours (int): The number of nearest points to take into account.
 
+    Returns:
+        np.array: The heatmap of shape (resolution, resolution).
+        list: The extent of the heatmap in frame coordinates.
+    """
     extent = [0, width, 0, height]
     heatmap_x = heatmap_data(x, resolution, extent[0], extent[1])
-    heatmap_y = heatmap_data(y, resolution, extent[2], extent[3]) 
-    
-    for x in range(resolution):
-        for y in range(resolution):
-            xp = (heatmap_x - x)
-            yp = (heatmap_y - y)
-            d = np.sqrt(xp**2 + yp**2)
-            image[y][x] = 1 / np.sum(d[np.argpartition(d.ravel(), n_neighbours)[:n_neighbours]])
+    heatmap_y = heatmap_data(y, resolution, extent[2], extent[3])
+
+    tree = cKDTree(np.column_stack([heatmap_x, heatmap_y]))
+    grid_y, grid_x = np.mgrid[0:resolution, 0:resolution]
+    n_neighbours = max(1, min(n_neighbours, len(heatmap_x)))
+    distances, _ = tree.query(np.column_stack([grid_x.ravel(), grid_y.ravel()]), k=n_neighbours)
+
+    with np.errstate(divide='ignore'):
+        image = 1 / distances.reshape(resolution * resolution, -1).sum(axis=1)
+    return image.reshape(resolution, resolution), extent
+
+def histogram_heatmap(x, y, width, height, resolution, sigma):
+    """
+    Computes a heatmap as a 2D histogram of the points smoothed with a gaussian filter. Scales linearly with the number of points.
+
+    Args:
+        x (np.array): The x coordinates of the points.
+        y (np.array): The y coordinates of the points.
+        width (int): The width of the frame.
+        height (int): The height of the frame.
+        resolution (int): The number of pixels in each dimension of the heatmap.
+        sigma (float): The standard deviation of the gaussian filter in heatmap pixels.
+
+    Returns:
+        np.array: The heatmap of shape (resolution, resolution).
+        list: The extent of the heatmap in frame coordinates.
+    """
+    extent = [0, width, 0, height]
+    heatmap_x = heatmap_data(x, resolution, extent[0], extent[1])
+    heatmap_y = heatmap_data(y, resolution, extent[2], extent[3])
+
+    image, _, _ = np.histogram2d(heatmap_y, heatmap_x, bins=resolution, range=[[0, resolution], [0, resolution]])
+    if sigma > 0:
+        image = gaussian_filter(image, sigma)
     return image, extent
 
+def mask_key(mask_image):
+    """
+    Identifies a version of an anonymization image for the mask caches, so that an image edited or replaced on disk is read again.
+
+    Args:
+        mask_image (str): Path to the image.
+
+    Returns:
+        str: The absolute path to the image.
+        int: The modification time of the image in nanoseconds.
+    """
+    try:
+        return os.path.abspath(mask_image), os.stat(mask_image).st_mtime_ns
+    except OSError:
+        raise FileNotFoundError(f'Could not read the mask image "{mask_image}".') from None
+
+@functools.lru_cache(maxsize=8)
+def read_mask(mask_image, mtime=None):
+    """
+    Reads an anonymization image (once per path and modification time), converting grayscale images to BGR.
+
+    Args:
+        mask_image (str): Path to the image.
+        mtime (int, optional): The modification time of the image (see `mask_key`), only used as part of the cache key. Defaults to None.
+
+    Returns:
+        np.array(uint8): The image with 3 (BGR) or 4 (BGRA) channels.
+    """
+    image = cv2.imread(mask_image, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise FileNotFoundError(f'Could not read the mask image "{mask_image}".')
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image
+
+@functools.lru_cache(maxsize=256)
+def resized_mask(mask_image, width, height, mtime=None):
+    """
+    Resizes an anonymization image to the size of a face mask. Results are kept in an LRU cache, since faces tend to keep their size over many frames.
+
+    Args:
+        mask_image (str): Path to the image.
+        width (int): The width of the face mask.
+        height (int): The height of the face mask.
+        mtime (int, optional): The modification time of the image (see `mask_key`), only used as part of the cache key. Defaults to None.
+
+    Returns:
+        np.array: The resized image (premultiplied with alpha for BGRA images).
+        np.array: The alpha channel in the range of 0 to 1 with shape (height, width, 1), or None for BGR images.
+    """
+    resized = cv2.resize(read_mask(mask_image, mtime), (width, height))
+    if resized.shape[2] == 4:
+        alpha = resized[:, :, 3:] / 255
+        resized, alpha = resized[:, :, :3] * alpha, alpha
+        alpha.flags.writeable = False
+    else:
+        alpha = None
+    resized.flags.writeable = False
+    return resized, alpha
+
+def mask_faces(frame, dets, mask='blur', mask_image=None, mask_scale=1.0, ellipse=True, draw_scores=False, color=(0, 0, 0)):
+    """
+    Applies the anonymization filter on the detected face regions of a frame (in place).
+
+    Args:
+        frame (np.array): The frame to mask.
+        dets (np.array): The face detections of the frame, as returned by CenterFace.
+        mask (str, optional): Mask filter mode for face regions ('blur', 'rectangle', 'image' or 'none'). Defaults to 'blur'.
+        mask_image (str, optional): Anonymization image path, used when `mask` is 'image'. Defaults to None.
+        mask_scale (float, optional): Scale factor for face masks. Defaults to 1.0.
+        ellipse (bool, optional): Mask faces with blurred ellipses. Defaults to True.
+        draw_scores (bool, optional): Draw detection faceness scores onto the frame. Defaults to False.
+        color (tuple, optional): Color of the rectangle boxes. Defaults to black (0, 0, 0).
+
+    Returns:
+        list: The scaled and clipped coordinates [x1, y1, x2, y2] of each face mask.
+    """
+    boxes = []
+    if mask == 'image' and len(dets) > 0:
+        # the cached images are keyed by path and modification time
+        mask_image, mtime = mask_key(mask_image)
+
+    for det in dets:
+        box, score = det[:4], det[4]
+        x1, y1, x2, y2 = box.astype(int)
+        x1, y1, x2, y2 = scaling_mask(x1, y1, x2, y2, mask_scale)
+        # Clip bounding boxes coordinates to valid frame region
+        y1, y2 = max(0, y1), min(frame.shape[0] - 1, y2)
+        x1, x2 = max(0, x1), min(frame.shape[1] - 1, x2)
+
+        # Mask faces with rectangles
+        if mask == 'rectangle':
+            # Color is set to black by default but can be changed using the color parameter.
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+
+        # Mask faces with blurred rectangles
+        elif mask == 'blur':
+            bf = 2  # blur factor (number of pixels in each dimension that the face will be reduced to)
+            blurred_box = cv2.blur(frame[y1:y2, x1:x2], (abs(x2 - x1) // bf, abs(y2 - y1) // bf))
+            # Mask faces with blurred ellipses
+            if ellipse:
+                roibox = frame[y1:y2, x1:x2]
+                # Get y and x coordinate lists of the bounding ellipse
+                ey, ex = skimage.draw.ellipse((y2 - y1) // 2, (x2 - x1) // 2, (y2 - y1) // 2, (x2 - x1) // 2)
+                roibox[ey, ex] = blurred_box[ey, ex]
+                frame[y1:y2, x1:x2] = roibox
+            else:
+                frame[y1:y2, x1:x2] = blurred_box
+
+        # Mask faces with an image
+        elif mask == 'image':
+            if x2 > x1 and y2 > y1:
+                # Decoded and resized images are cached across faces and frames
+                resized_mask_image, alpha = resized_mask(mask_image, x2 - x1, y2 - y1, mtime)
+                if alpha is None:  # RGB
+                    frame[y1:y2, x1:x2] = resized_mask_image
+                else:  # RGBA, premultiplied with alpha
+                    frame[y1:y2, x1:x2] = frame[y1:y2, x1:x2] * (1 - alpha) + resized_mask_image
+
+        # Mask nothing
+        elif mask == 'none':
+            pass
+        
+        boxes.append([x1, y1, x2, y2])
+
+        # Draw the faceness score (between 0 and 1) that roughly corresponds to the detector's confidence that something is a face.
+        if draw_scores:
+            cv2.putText(frame, f'{score:.2f}', (x1 + 0, y1 - 20), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 0))
+
+    return boxes
+
+
+def track_boxes(dets, previous, current, scale, width, height, max_error=1.0):
+    """
+    Propagates face detections from one frame to the next by shifting each box with the median optical flow of a grid of points inside it.
+    The points are tracked forwards and backwards, and only those coming back to where they started are trusted. A box with no trusted point is lost.
+
+    Args:
+        dets (np.array): The face detections of the previous frame, as returned by CenterFace.
+        previous (np.array(uint8)): The previous (downscaled, grayscale) frame.
+        current (np.array(uint8)): The current (downscaled, grayscale) frame.
+        scale (float): The ratio of the downscaled frames to the original frame size.
+        width (int): The width of the original frame.
+        height (int): The height of the original frame.
+        max_error (float, optional): The largest forward-backward error (in downscaled pixels) of a trusted point. Defaults to 1.0.
+
+    Returns:
+        np.array: The shifted detections. Boxes leaving the frame and lost boxes are dropped.
+        bool: Whether a box was lost, in which case the frame should be run through the detector again.
+    """
+    if len(dets) == 0:
+        return dets, False
+
+    # a 4x4 grid of points inside each box
+    grid_x, grid_y = np.meshgrid(np.linspace(0.2, 0.8, 4), np.linspace(0.2, 0.8, 4))
+    x1, y1, x2, y2 = dets[:, 0:1], dets[:, 1:2], dets[:, 2:3], dets[:, 3:4]
+    points_x = x1 + (x2 - x1) * grid_x.ravel()
+    points_y = y1 + (y2 - y1) * grid_y.ravel()
+    points = (np.stack([points_x, points_y], axis=-1) * scale).reshape(-1, 1, 2).astype(np.float32)
+
+    moved, status, _ = cv2.calcOpticalFlowPyrLK(previous, current, points, None, winSize=(15, 15), maxLevel=2)
+    back, back_status, _ = cv2.calcOpticalFlowPyrLK(current, previous, moved, None, winSize=(15, 15), maxLevel=2)
+    shifts = ((moved - points) / scale).reshape(len(dets), -1, 2)
+    error = np.linalg.norm(back - points, axis=-1).reshape(len(dets), -1)
+    valid = (status.ravel() & back_status.ravel()).reshape(len(dets), -1).astype(bool) & (error < max_error)
+
+    tracked = dets.copy()
+    found = valid.any(axis=1)
+    for i in np.flatnonzero(found):
+        dx, dy = np.median(shifts[i][valid[i]], axis=0)
+        tracked[i, 0:4:2] += dx
+        tracked[i, 1:4:2] += dy
+
+    tracked[:, 0:4:2] = np.clip(tracked[:, 0:4:2], 0, width)
+    tracked[:, 1:4:2] = np.clip(tracked[:, 1:4:2], 0, height)
+    inside = (tracked[:, 2] - tracked[:, 0] >= 2) & (tracked[:, 3] - tracked[:, 1] >= 2)
+    return tracked[inside & found], not found.all()
+
+
+def blurfaces_frame_range(
+        filename,
+        width,
+        height,
+        fps,
+        target_name,
+        start_frame=0,
+        num_frames=None,
+        pb=None,
+        detect_every=1,
+        motion_threshold=None,
+        detector_size=None,
+        batch_size=8,
+        codec='libx264',
+        audio=False,
+        **mask_args):
+    """
+    Detects and masks the faces on a consecutive range of frames of a video, rendering the masked video of the range.
+    The detector can be run on every n-th frame only, in which case the boxes are tracked with optical flow in between, and the frames on which a face is lost are run through the detector again.
+
+    Args:
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        target_name (str): Target output name for the masked video.
+        start_frame (int, optional): The first frame of the range. Defaults to 0.
+        num_frames (int, optional): The number of frames in the range. Defaults to None (which reads until the end of the video).
+        pb (MgProgressbar, optional): A progress bar to update after each frame. Defaults to None.
+        detect_every (int, optional): Runs the face detector on every n-th frame only. Defaults to 1 (every frame).
+        motion_threshold (float, optional): If set, the detector also runs on frames whose quantity of motion (0 to 1) since the last detection exceeds this threshold (eg. on scene changes). Defaults to None.
+        detector_size (int or tuple, optional): The input size of the face detector, either the length of the longest side or a (width, height) tuple. Defaults to None (which uses the frame size).
+        batch_size (int, optional): The number of frames read before running the detector on them in a single batch. Defaults to 8.
+        codec (str, optional): The FFmpeg video codec of the output. Defaults to 'libx264'.
+        audio (bool, optional): Whether to copy the audio of the range from the input video into the output. Defaults to False.
+        **mask_args: The masking parameters passed to `mask_faces`.
+
+    Returns:
+        np.array: An array of shape (faces, 5) with the time (ms) and the coordinates (x1, y1, x2, y2) of each face mask.
+    """
+    # Create an instance of the CenterFace class
+    centerface = CenterFace(input_size=detector_size)
+    # Create an empty list to append the mask coordinates
+    data = []
+
+    # Define ffmpeg command start and end
+    cmd = ['ffmpeg', '-y']
+    if start_frame > 0:
+        # seek half a frame early to make sure the first frame of the range is not skipped due to rounding
+        cmd += ['-ss', '{:.6f}'.format((start_frame - 0.5) / fps)]
+    cmd += ['-i', filename]
+    if num_frames is not None:
+        cmd += ['-frames:v', str(num_frames)]
+    total_time = num_frames / fps if num_frames is not None else 0
+    process = ffmpeg_cmd(cmd, total_time=total_time, pipe='read')
+
+    # Pipe the masked frames to FFmpeg, muxing the audio of the same range in the same pass
+    cmd = ['ffmpeg', '-y', '-s', '{}x{}'.format(width, height), '-r', str(fps),
+           '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-vcodec', 'rawvideo', '-i', '-']
+    if audio:
+        if start_frame > 0:
+            cmd += ['-ss', '{:.6f}'.format(start_frame / fps)]
+        if num_frames is not None:
+            cmd += ['-t', '{:.6f}'.format(num_frames / fps)]
+        cmd += ['-i', filename, '-map', '0:v:0', '-map', '1:a:0?', '-shortest']
+    cmd += ['-vcodec', codec, '-pix_fmt', 'yuv420p', target_name]
+    video_out = ffmpeg_cmd(cmd, total_time=total_time, pipe='write')
+
+    detect_every = max(1, int(detect_every))
+    tracking = detect_every > 1 or motion_threshold is not None
+    # tracking and motion detection run on downscaled grayscale frames
+    track_scale = min(1, 320 / max(width, height))
+    track_size = (max(1, round(width * track_scale)), max(1, round(height * track_scale)))
+    small, previous_small, detection_small = None, None, None
+    batch_size = max(1, int(batch_size))
+    dets = None
+
+    i = start_frame
+    end_of_video = False
+
+    while not end_of_video:
+        # Read a batch of frames, deciding which ones to run the detector on
+        frames, smalls, is_detection = [], [], []
+        while len(frames) < batch_size:
+            with accumulate('blur_faces.decode'):
+                out = process.stdout.read(width*height*3)
+            if out == b'':
+                end_of_video = True
+                break
+
+            # Transform the bytes read into a numpy array
+            frame = np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3]) # height, width, channels
+            frame = frame.copy() # copy frame for writing it
+
+            detect = (i + len(frames) - start_frame) % detect_every == 0
+            if tracking:
+                small = cv2.cvtColor(cv2.resize(frame, track_size), cv2.COLOR_BGR2GRAY)
+                if not detect and motion_threshold is not None:
+                    detect = frame_motion(small, detection_small) > motion_threshold
+                if detect:
+                    detection_small = small
+                smalls.append(small)
+
+            frames.append(frame)
+            is_detection.append(detect)
+
+        # Run the detector on all the selected frames of the batch at once
+        with accumulate('blur_faces.detect'):
+            detections = iter(centerface.detect_batch(
+                [frame for frame, detect in zip(frames, is_detection) if detect], height, width, threshold=0.2))
+
+        for j, frame in enumerate(frames):
+            if is_detection[j]:
+                dets, lms = next(detections)
+            else:
+                with accumulate('blur_faces.track'):
+                    dets, lost = track_boxes(dets, previous_small, smalls[j], track_scale, width, height)
+                if lost:
+                    # a face could not be followed, detect the faces of this frame again
+                    with accumulate('blur_faces.detect'):
+                        dets, lms = centerface.detect_batch([frame], height, width, threshold=0.2)[0]
+                    detection_small = smalls[j]
+            if tracking:
+                previous_small = smalls[j]
+
+            time = frame2ms(i, fps)
+            for box in mask_faces(frame, dets, **mask_args):
+                data.append([time] + box)
+
+            with accumulate('blur_faces.encode'):
+                video_out.stdin.write(frame.tobytes())
+
+            if pb is not None:
+                pb.progress(i)
+            i += 1
+
+    # Terminate the processes
+    video_out.stdin.close()
+    video_out.wait()
+    process.terminate()
+
+    return np.array(data, dtype=np.int64).reshape(-1, 5)
+
+
+@traced('blur_faces')
 def mg_blurfaces(self, 
                  mask='blur', 
                  mask_image=None, 
@@ -81,7 +447,16 @@ def mg_blurfaces(self,
                  data_format='csv', 
                  color=(0, 0, 0), 
                  target_name=None, 
-                 overwrite=False):
+                 overwrite=False,
+                 checkpoint=False,
+                 checkpoint_interval=1000,
+                 detect_every=1,
+                 motion_threshold=None,
+                 detector_size=None,
+                 batch_size=8,
+                 codec='libx264',
+                 heatmap_mode='neighbours',
+                 smoothing=3.0):
     """
     Automatic anonymization of faces in videos. 
     This function works by first detecting all human faces in each video frame and then applying an anonymization filter 
@@ -103,6 +478,15 @@ def mg_blurfaces(self,
         color (tuple, optional): Customized color of the rectangle boxes. Defaults to black (0, 0, 0).
         target_name (str, optional): Target output name. Defaults to None (which assumes that the input filename with the suffix "_blurred" should be used).
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+        checkpoint (bool, optional): Whether to save the detections and video segments of each completed range of `checkpoint_interval` frames in a sidecar folder (with the suffix "_blurfaces_checkpoint"). If a run is interrupted, rerunning it with the same parameters resumes from the last completed range. The folder is removed when the run finishes. Defaults to False.
+        checkpoint_interval (int, optional): The number of frames between checkpoints. Defaults to 1000.
+        detect_every (int, optional): Runs the face detector on every n-th frame only, and tracks the detected faces with optical flow in the frames in between. This divides the cost of detection by roughly n. Defaults to 1 (every frame).
+        motion_threshold (float, optional): If set, the face detector also runs on frames whose quantity of motion (0 to 1) since the last detection exceeds this threshold, so that scene changes and fast movements are detected anew. Defaults to None.
+        detector_size (int or tuple, optional): The input size of the face detector, either the length of the longest side or a (width, height) tuple (rounded up to a multiple of 32). Smaller sizes are faster but may miss small faces. Defaults to None (which uses the frame size).
+        batch_size (int, optional): The number of frames passed through the face detector at once. Defaults to 8.
+        codec (str, optional): The FFmpeg video codec of the output video. Defaults to 'libx264'.
+        heatmap_mode (str, optional): How to compute the heatmap. 'neighbours' uses the summed distance to the `neighbours` nearest face centroids, 'histogram' counts the centroids on the heatmap grid and smooths them with a gaussian filter (faster for very long recordings). Defaults to 'neighbours'.
+        smoothing (float, optional): The standard deviation (in heatmap pixels) of the gaussian filter used when `heatmap_mode` is 'histogram'. Defaults to 3.0.
 
     Returns:
         MgVideo: A MgVideo as blur_faces for parent MgVideo
@@ -120,105 +504,43 @@ def mg_blurfaces(self,
     if os.path.isfile(target_name):
         os.remove(target_name)       
 
-    pb = MgProgressbar(total=self.length, prefix='Blurring faces:')
-
-    # Create an instance of the CenterFace class
-    centerface = CenterFace()
-    output_stream = cv2.VideoWriter(target_name, cv2.VideoWriter_fourcc('M','J','P','G'), self.fps, (self.width, self.height))
-    # Create an empty list to append the mask coordinates
-    data = []
+    range_args = dict(mask=mask, mask_image=mask_image, mask_scale=mask_scale, ellipse=ellipse,
+                      draw_scores=draw_scores, color=color, detect_every=detect_every,
+                      motion_threshold=motion_threshold, detector_size=detector_size, batch_size=batch_size,
+                      codec=codec, audio=bool(self.has_audio))
 
-    # Define ffmpeg command start and end
-    cmd = ['ffmpeg', '-y', '-i', self.filename]
-    process = ffmpeg_cmd(cmd, total_time=self.length, pipe='read')
-
-    i = 0
+    pb = MgProgressbar(total=self.length, prefix='Blurring faces:')
 
-    while True:
-        # Read frame-by-frame
-        if self.color:
-            out = process.stdout.read(self.width*self.height*3)
+    if checkpoint:
+        params = dict(
+            filename=os.path.abspath(self.filename), size=os.path.getsize(self.filename), length=self.length,
+            checkpoint_interval=checkpoint_interval,
+            **{key: value for key, value in range_args.items() if key != 'batch_size'})
+        mg_checkpoint = MgCheckpoint(of + '_blurfaces_checkpoint', params)
+        ranges = frame_ranges(self.length, checkpoint_interval)
+
+        segments = []
+        for start_frame, num_frames in ranges:
+            segment = mg_checkpoint.segment(start_frame, '.avi')
+            segments.append(segment)
+            if mg_checkpoint.done(start_frame):
+                continue
+            detections = blurfaces_frame_range(
+                self.filename, self.width, self.height, self.fps, segment,
+                start_frame=start_frame, num_frames=num_frames, pb=pb, **range_args)
+            mg_checkpoint.save(start_frame, detections=detections)
+
+        data = np.concatenate([mg_checkpoint.load(start_frame)['detections'] for start_frame, _ in ranges])
+        if len(segments) == 1:
+            shutil.copyfile(segments[0], target_name)
         else:
-            out = process.stdout.read(self.width*self.height)
-        if out == b'':
-            pb.progress(self.length)
-            break
-
-        # Transform the bytes read into a numpy array
-        frame = np.frombuffer(out, dtype=np.uint8).reshape([self.height, self.width, 3]) # height, width, channels
-        frame = frame.copy() # copy frame for writing it
-        
-        h, w = frame.shape[:2]
-        dets, lms = centerface(frame, h, w, threshold=0.2)
-
-        for x, det in enumerate(dets):
-            boxes, score = det[:4], det[4]
-            x1, y1, x2, y2 = boxes.astype(int)
-            x1, y1, x2, y2 = scaling_mask(x1, y1, x2, y2, mask_scale)
-            # Clip bounding boxes coordinates to valid frame region
-            y1, y2 = max(0, y1), min(frame.shape[0] - 1, y2)
-            x1, x2 = max(0, x1), min(frame.shape[1] - 1, x2)
-
-            # Mask faces with rectangles
-            if mask == 'rectangle':
-                # Color is set to black by default but can be changed using the color parameter.
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
-
-            # Mask faces with blurred rectangles
-            elif mask == 'blur':
-                bf = 2  # blur factor (number of pixels in each dimension that the face will be reduced to)
-                blurred_box = cv2.blur(frame[y1:y2, x1:x2], (abs(x2 - x1) // bf, abs(y2 - y1) // bf))
-                # Mask faces with blurred ellipses
-                if ellipse:
-                    roibox = frame[y1:y2, x1:x2]
-                    # Get y and x coordinate lists of the bounding ellipse
-                    ey, ex = skimage.draw.ellipse((y2 - y1) // 2, (x2 - x1) // 2, (y2 - y1) // 2, (x2 - x1) // 2)
-                    roibox[ey, ex] = blurred_box[ey, ex]
-                    frame[y1:y2, x1:x2] = roibox
-                else:
-                    frame[y1:y2, x1:x2] = blurred_box
-
-            # Mask faces with an image
-            elif mask == 'image':
-                target_size = (x2 - x1, y2 - y1)
-                # Reading image with opencv
-                mask_image = cv2.imread(mask_image, cv2.IMREAD_UNCHANGED)
-                # Resizing with the target size
-                resized_mask_image = cv2.resize(mask_image, target_size)
-                if mask_image.shape[2] == 3:  # RGB
-                    frame[y1:y2, x1:x2] = resized_mask_image
-                elif mask_image.shape[2] == 4:  # RGBA
-                    frame[y1:y2, x1:x2] = frame[y1:y2, x1:x2] * (1 - resized_mask_image[:, :, 3:] / 255) + resized_mask_image[:, :, :3] * (resized_mask_image[:, :, 3:] / 255)  
-
-            # Mask nothing
-            elif mask == 'none':
-                pass
-            
-            # Draw heatmap of the detected faces using the centroid of the face mask.
-            if draw_heatmap or save_data:
-                time = frame2ms(i, self.fps)
-                data.append([time, x1, y1, x2, y2])
-
-            # Draw the faceness score (between 0 and 1) that roughly corresponds to the detector's confidence that something is a face.
-            if draw_scores:
-                cv2.putText(frame, f'{score:.2f}', (x1 + 0, y1 - 20), cv2.FONT_HERSHEY_DUPLEX, 0.5, (0, 255, 0))
-
-        output_stream.write(frame)
-    
-        # Flush the buffer
-        process.stdout.flush()
-        pb.progress(i)
-        i += 1
-
-    # Terminate the process
-    process.terminate()
-    output_stream.release()
+            with span('blur_faces.merge'):
+                merge_videos(segments, target_name=target_name, overwrite=True)
+        mg_checkpoint.remove()
+    else:
+        data = blurfaces_frame_range(self.filename, self.width, self.height, self.fps, target_name, pb=pb, **range_args)
 
-    if self.has_audio:
-        # Embed audio in the video file
-        source_audio = extract_wav(of + fex)
-        embed_audio_in_video(source_audio, target_name)
-        os.remove(source_audio)
+    pb.progress(self.length)
 
     # Save warped video as blur_faces for parent MgVideo
     # we have to do this here since we are not using mg_blurfaces (that would normally save the result itself)
@@ -301,7 +623,8 @@ def mg_blurfaces(self,
                 save_single_file(of, data, "csv", target_name=target_name, overwrite=overwrite)
 
     if save_data:  
-        save_txt(of, data, data_format, target_name=target_name, overwrite=overwrite)  
+        with span('blur_faces.save_data'):
+            save_txt(of, data, data_format, target_name=target_name, overwrite=overwrite)
         return self.blur_faces
 
     if draw_heatmap:
@@ -317,10 +640,15 @@ def mg_blurfaces(self,
         fig.patch.set_alpha(1)  
 
         center_x, center_y = centroid_mask(np.asarray(data))
-        im, extent = nearest_neighbours(center_x, center_y, self.width, self.height, resolution, neighbours)
+        if heatmap_mode.lower() == 'histogram':
+            im, extent = histogram_heatmap(center_x, center_y, self.width, self.height, resolution, smoothing)
+            title = f"Heatmap of face detection (smoothing={smoothing})"
+        else:
+            im, extent = nearest_neighbours(center_x, center_y, self.width, self.height, resolution, neighbours)
+            title = f"Heatmap of face detection (neighbours={neighbours})"
 
         ax.imshow(im, extent=extent, cmap=cm.jet)
-        ax.set_title(f"Heatmap of face detection (neighbours={neighbours})")
+        ax.set_title(title)
         ax.set_xlabel("Video width (pixels)")
         ax.set_ylabel("Video height (pixels)")
         ax.set_xlim(extent[0], extent[1])
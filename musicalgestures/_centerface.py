@@ -1,42 +1,83 @@
-import os
 import cv2
 import numpy as np
 
-import musicalgestures
+from musicalgestures._modelcache import get_model
 
 class CenterFace(object):
     
-    def __init__(self, landmarks=True):
+    def __init__(self, landmarks=True, device='cpu', input_size=None):
 
-        module_path = os.path.abspath(os.path.dirname(musicalgestures.__file__))
-        
         self.landmarks = landmarks
-        self.net = cv2.dnn.readNetFromONNX(module_path + '/models/centerface.onnx')
+        self.device = device
+        # None uses the frame size, an int the length of the longest side, or a (width, height) tuple
+        self.input_size = input_size
+        self.batching = True
+        self.net = None
         self.img_h_new, self.img_w_new, self.scale_h, self.scale_w = 0, 0, 0, 0
 
     def __call__(self, img, height, width, threshold=0.5):
+        return self.detect_batch([img], height, width, threshold)[0]
+
+    def detect_batch(self, imgs, height, width, threshold=0.5):
+        """
+        Detects the faces on a batch of images of the same size with a single forward pass of the network.
+
+        Args:
+            imgs (list): The images (np.array(uint8) in BGR).
+            height (int): The height of the images.
+            width (int): The width of the images.
+            threshold (float, optional): The detection threshold. Defaults to 0.5.
+
+        Returns:
+            list: The detections (and landmarks if enabled) of each image, as returned by `__call__`.
+        """
+        if len(imgs) == 0:
+            return []
         self.img_h_new, self.img_w_new, self.scale_h, self.scale_w = self.transform(height, width)
-        return self.inference_opencv(img, threshold)
+        # the network is shared through the model cache, it reshapes itself to the input size
+        self.net = get_model('centerface', self.device)
+        return self.inference_opencv(imgs, threshold)
 
-    def inference_opencv(self, img, threshold):
-        blob = cv2.dnn.blobFromImage(img, scalefactor=1.0, size=(self.img_w_new, self.img_h_new), mean=(0, 0, 0), swapRB=True, crop=False)
+    def inference_opencv(self, imgs, threshold):
+        if self.batching and len(imgs) > 1:
+            try:
+                outputs = self.forward(imgs)
+                if len(outputs[0]) == len(imgs):
+                    return [self.postprocess(*outputs, threshold, index=i) for i in range(len(imgs))]
+            except cv2.error:
+                pass
+            # the network does not accept batched input, run it image by image from now on
+            self.batching = False
+        return [self.postprocess(*self.forward([img]), threshold) for img in imgs]
+
+    def forward(self, imgs):
+        blob = cv2.dnn.blobFromImages(imgs, scalefactor=1.0, size=(self.img_w_new, self.img_h_new), mean=(0, 0, 0), swapRB=True, crop=False)
         self.net.setInput(blob)
         if self.landmarks:
             heatmap, scale, offset, lms = self.net.forward(["537", "538", "539", '540'])
         else:
             heatmap, scale, offset = self.net.forward(["535", "536", "537"])
-        return self.postprocess(heatmap, lms, offset, scale, threshold)
+            lms = None
+        return heatmap, lms, offset, scale
 
     def transform(self, h, w):
-        img_h_new, img_w_new = int(np.ceil(h / 32) * 32), int(np.ceil(w / 32) * 32)
+        if self.input_size is None:
+            target_h, target_w = h, w
+        elif np.isscalar(self.input_size):
+            ratio = self.input_size / max(h, w)
+            target_h, target_w = h * ratio, w * ratio
+        else:
+            target_w, target_h = self.input_size
+        # the network input has to be a multiple of 32
+        img_h_new, img_w_new = int(np.ceil(target_h / 32) * 32), int(np.ceil(target_w / 32) * 32)
         scale_h, scale_w = img_h_new / h, img_w_new / w
         return img_h_new, img_w_new, scale_h, scale_w
 
-    def postprocess(self, heatmap, lms, offset, scale, threshold):
+    def postprocess(self, heatmap, lms, offset, scale, threshold, index=0):
         if self.landmarks:
-            dets, lms = self.decode(heatmap, scale, offset, lms, (self.img_h_new, self.img_w_new), threshold=threshold)
+            dets, lms = self.decode(heatmap, scale, offset, lms, (self.img_h_new, self.img_w_new), threshold=threshold, index=index)
         else:
-            dets = self.decode(heatmap, scale, offset, None, (self.img_h_new, self.img_w_new), threshold=threshold)
+            dets = self.decode(heatmap, scale, offset, None, (self.img_h_new, self.img_w_new), threshold=threshold, index=index)
         if len(dets) > 0:
             dets[:, 0:4:2], dets[:, 1:4:2] = dets[:, 0:4:2] / self.scale_w, dets[:, 1:4:2] / self.scale_h
             if self.landmarks:
@@ -50,39 +91,30 @@ class CenterFace(object):
         else:
             return dets
 
-    def decode(self, heatmap, scale, offset, landmark, size, threshold=0.1):
-        heatmap = np.squeeze(heatmap)
-        scale0, scale1 = scale[0, 0, :, :], scale[0, 1, :, :]
-        offset0, offset1 = offset[0, 0, :, :], offset[0, 1, :, :]
+    def decode(self, heatmap, scale, offset, landmark, size, threshold=0.1, index=0):
+        heatmap = heatmap[index, 0]
         c0, c1 = np.where(heatmap > threshold)
-        if self.landmarks:
-            boxes, lms = [], []
-        else:
-            boxes = []
-        if len(c0) > 0:
-            for i in range(len(c0)):
-                s0, s1 = np.exp(scale0[c0[i], c1[i]]) * 4, np.exp(scale1[c0[i], c1[i]]) * 4
-                o0, o1 = offset0[c0[i], c1[i]], offset1[c0[i], c1[i]]
-                s = heatmap[c0[i], c1[i]]
-                x1, y1 = max(0, (c1[i] + o1 + 0.5) * 4 - s1 / 2), max(0, (c0[i] + o0 + 0.5) * 4 - s0 / 2)
-                x1, y1 = min(x1, size[1]), min(y1, size[0])
-                boxes.append([x1, y1, min(x1 + s1, size[1]), min(y1 + s0, size[0]), s])
-                if self.landmarks:
-                    lm = []
-                    for j in range(5):
-                        lm.append(landmark[0, j * 2 + 1, c0[i], c1[i]] * s1 + x1)
-                        lm.append(landmark[0, j * 2, c0[i], c1[i]] * s0 + y1)
-                    lms.append(lm)
-            boxes = np.asarray(boxes, dtype=np.float32)
-            keep = self.nms(boxes[:, :4], boxes[:, 4], 0.3)
-            boxes = boxes[keep, :]
+        if len(c0) == 0:
             if self.landmarks:
-                lms = np.asarray(lms, dtype=np.float32)
-                lms = lms[keep, :]
+                return [], []
+            return []
+
+        s0, s1 = np.exp(scale[index, 0, c0, c1]) * 4, np.exp(scale[index, 1, c0, c1]) * 4
+        o0, o1 = offset[index, 0, c0, c1], offset[index, 1, c0, c1]
+        x1 = np.minimum(np.maximum(0, (c1 + o1 + 0.5) * 4 - s1 / 2), size[1])
+        y1 = np.minimum(np.maximum(0, (c0 + o0 + 0.5) * 4 - s0 / 2), size[0])
+        boxes = np.stack([x1, y1, np.minimum(x1 + s1, size[1]), np.minimum(y1 + s0, size[0]), heatmap[c0, c1]], axis=1).astype(np.float32)
+        keep = self.nms(boxes[:, :4], boxes[:, 4], 0.3)
+        boxes = boxes[keep, :]
+
         if self.landmarks:
+            # landmarks are stored as (y, x) pairs relative to the box size
+            lm = landmark[index][:, c0[keep], c1[keep]]
+            lms = np.empty((len(keep), 10), dtype=np.float32)
+            lms[:, 0::2] = (lm[1::2] * s1[keep] + x1[keep]).T
+            lms[:, 1::2] = (lm[0::2] * s0[keep] + y1[keep]).T
             return boxes, lms
-        else:
-            return boxes
+        return boxes
 
     def nms(self, boxes, scores, nms_thresh):
         x1 = boxes[:, 0]
@@ -91,37 +123,18 @@ class CenterFace(object):
         y2 = boxes[:, 3]
         areas = (x2 - x1 + 1) * (y2 - y1 + 1)
         order = np.argsort(scores)[::-1]
-        num_detections = boxes.shape[0]
-        suppressed = np.zeros((num_detections,), dtype=bool)
 
         keep = []
-        for _i in range(num_detections):
-            i = order[_i]
-            if suppressed[i]:
-                continue
+        while len(order) > 0:
+            i = order[0]
             keep.append(i)
+            rest = order[1:]
+
+            # overlap of the best remaining box with all the others at once
+            w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+            h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+            inter = w * h
+            ovr = inter / (areas[i] + areas[rest] - inter)
+            order = rest[ovr < nms_thresh]
 
-            ix1 = x1[i]
-            iy1 = y1[i]
-            ix2 = x2[i]
-            iy2 = y2[i]
-            iarea = areas[i]
-
-            for _j in range(_i + 1, num_detections):
-                j = order[_j]
-                if suppressed[j]:
-                    continue
-
-                xx1 = max(ix1, x1[j])
-                yy1 = max(iy1, y1[j])
-                xx2 = min(ix2, x2[j])
-                yy2 = min(iy2, y2[j])
-                w = max(0, xx2 - xx1 + 1)
-                h = max(0, yy2 - yy1 + 1)
-
-                inter = w * h
-                ovr = inter / (iarea + areas[j] - inter)
-                if ovr >= nms_thresh:
-                    suppressed[j] = True
-
-        return keep
+        return np.asarray(keep, dtype=int)
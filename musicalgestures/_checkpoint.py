@@ -0,0 +1,132 @@
+import os
+import json
+import shutil
+import numpy as np
+
+
+def frame_ranges(length, range_length):
+    """
+    Splits a video into consecutive frame ranges.
+
+    Args:
+        length (int): The number of frames in the video.
+        range_length (int): The number of frames in each range.
+
+    Returns:
+        list: A list of [start frame, number of frames] pairs. The number of frames of the last range is None, which means it reads until the end of the video (in case the frame count is not exact).
+    """
+    range_length = max(1, int(range_length))
+    starts = list(range(0, max(1, length), range_length))
+    ranges = [[start, range_length] for start in starts]
+    ranges[-1][1] = None
+    return ranges
+
+
+class MgCheckpoint():
+    """
+    Keeps the results of a long-running process in a sidecar folder, one file per completed frame range, so that an
+    interrupted run can be resumed from the last completed range. A rerun with different parameters starts over.
+    """
+
+    def __init__(self, folder, params):
+        """
+        Initializes the MgCheckpoint object, creating the folder if necessary.
+
+        Args:
+            folder (str): Path to the sidecar folder.
+            params (dict): The (JSON serializable) parameters of the run. Existing checkpoints are only reused if these match.
+        """
+        self.folder = folder
+        self.params = json.loads(json.dumps(params))
+        params_file = os.path.join(self.folder, 'params.json')
+
+        if os.path.isdir(self.folder):
+            previous = None
+            try:
+                with open(params_file) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError):
+                pass
+            if previous != self.params:
+                # parameters changed, the previous checkpoints cannot be reused
+                shutil.rmtree(self.folder)
+            elif len(self.completed()) > 0:
+                print(f'Resuming from {len(self.completed())} completed frame range(s) in {self.folder}.')
+
+        os.makedirs(self.folder, exist_ok=True)
+        with open(params_file, 'w') as f:
+            json.dump(self.params, f)
+
+    def _data_path(self, start_frame):
+        return os.path.join(self.folder, f'range_{start_frame:09d}.npz')
+
+    def segment(self, start_frame, fex):
+        """
+        Gets the path of the video segment of a frame range.
+
+        Args:
+            start_frame (int): The first frame of the range.
+            fex (str): The file extension of the segment, including the dot.
+
+        Returns:
+            str: Path to the video segment.
+        """
+        return os.path.join(self.folder, f'segment_{start_frame:09d}{fex}')
+
+    def done(self, start_frame):
+        """
+        Checks if a frame range has been completed.
+
+        Args:
+            start_frame (int): The first frame of the range.
+
+        Returns:
+            bool: True if the results of the range are saved.
+        """
+        return os.path.isfile(self._data_path(start_frame))
+
+    def completed(self):
+        """
+        Lists the completed frame ranges.
+
+        Returns:
+            list: The start frames of the completed ranges.
+        """
+        return sorted(int(file[len('range_'):-len('.npz')]) for file in os.listdir(self.folder)
+                      if file.startswith('range_') and file.endswith('.npz'))
+
+    def save(self, start_frame, **arrays):
+        """
+        Saves the results of a frame range, marking it as completed. The video segment of the range (if any) should be finished before this is called.
+
+        Args:
+            start_frame (int): The first frame of the range.
+            **arrays: The NumPy arrays to save.
+        """
+        target = self._data_path(start_frame)
+        # write to a temporary file first, so that an interrupted save never looks completed
+        with open(target + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(target + '.tmp', target)
+
+    def load(self, start_frame):
+        """
+        Loads the results of a completed frame range.
+
+        Args:
+            start_frame (int): The first frame of the range.
+
+        Returns:
+            dict: The saved NumPy arrays.
+        """
+        with np.load(self._data_path(start_frame)) as data:
+            return {key: data[key] for key in data.files}
+
+    def remove(self):
+        """
+        Deletes the sidecar folder.
+        """
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def __repr__(self):
+        return f"MgCheckpoint('{self.folder}')"
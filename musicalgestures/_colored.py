@@ -2,26 +2,9 @@ import math
 import numpy as np
 import matplotlib.pyplot as plt
 
-import cv2
-import librosa
-import soundfile as sf
-from musicalgestures._utils import convert
+from musicalgestures._utils import read_audio
 
 
-def min_max_level(filename):
-    audio_file = sf.SoundFile(filename, 'r')
-    samples = audio_file.read()
-
-    # Convert to mono by selecting left channel only
-    if audio_file.channels > 1:
-        samples = samples[:,0] 
-
-    min_level = min(samples)       
-    max_level = max(samples)
-
-    audio_file.close()
-    return min_level, max_level
-
 class MgAudioProcessor(object):
     def __init__(
             self, 
@@ -33,8 +16,8 @@ class MgAudioProcessor(object):
             ): 
 
         """
-        The MgAudioProcessor class inherits from the MgAudio class for processing chunks of audio and calculating the spectral centroid 
-        and the peak samples in each chunk of audio.
+        The MgAudioProcessor class reads an audio file once and computes, for each pixel column of a waveform image, the peak samples
+        and the spectral centroid of the audio around it.
 
         Adapted from https://github.com/endolith/freesound-thumbnailer/blob/master/processing.py
 
@@ -45,125 +28,64 @@ class MgAudioProcessor(object):
             fmax (int): Maximum frequency for computing spectral centroid. Defaults to None.
             window_function (int, optional): Type of window to apply on chunks of audio. Defaults to np.hanning.
         """
-        try: # check if it is an audio file or convert it to .wav format
-            self.audio_file = sf.SoundFile(filename, 'r')
-        except RuntimeError:
-            filename = convert(filename, filename + '.wav')
-            self.audio_file = sf.SoundFile(filename, 'r')
+        # decode the first (left) channel at the original sampling rate, from audio or video files alike
+        self.samples, self.samplerate = read_audio(filename, channel=0)
+        self.frames = len(self.samples)
 
         self.n_fft = n_fft
         
         self.fmin = fmin
         if fmax == None:
-            self.fmax = self.audio_file.samplerate // 2
+            self.fmax = self.samplerate // 2
         else:
-            fmax = self.fmax
+            self.fmax = fmax
         
         self.fmin_log = math.log10(self.fmin)
         self.fmax_log = math.log10(self.fmax)
-        self.clip = lambda val, low, high: min(high, max(low, val))
         
         self.window = window_function(self.n_fft)
         # Get the minimum and maximum audio levels
-        self.min_level, self.max_level = min_max_level(filename)
+        self.min_level = float(self.samples.min()) if self.frames > 0 else 0.0
+        self.max_level = float(self.samples.max()) if self.frames > 0 else 0.0
 
-    def read_samples(self, start, size, resize_if_less=False):
-        """ 
-        Read size samples starting at start, if resize_if_less is True and less than size
-        samples are read, resize the array to size and fill with zeros 
+    def seek_points(self, image_width):
         """
-        
-        # Number of zeros to add to start and end of the buffer
-        add_to_start = 0
-        add_to_end = 0
-        
-        if start < 0:
-            # First FFT window starts centered around zero
-            if size + start <= 0:
-                return np.zeros(size) if resize_if_less else np.array([])
-            else:
-                self.audio_file.seek(0)
-                add_to_start = -start # remember: start is negative!
-                to_read = size + start
-
-                if to_read > self.audio_file.frames:
-                    add_to_end = to_read - self.audio_file.frames
-                    to_read = self.audio_file.frames
-        else:            
-            self.audio_file.seek(int(start))
-        
-            to_read = size
-            if start + to_read >= self.audio_file.frames:
-                to_read = self.audio_file.frames - start
-                add_to_end = size - to_read
-        
-        try:            
-            samples = self.audio_file.read(int(to_read))
-        except RuntimeError: # this can happen for wave files with broken headers
-            return np.zeros(size) if resize_if_less else np.zeros(2)
-
-        # Convert to mono by selecting left channel only
-        if self.audio_file.channels > 1:
-            samples = samples[:,0]
-
-        if resize_if_less and (add_to_start > 0 or add_to_end > 0):
-            if add_to_start > 0:   
-                samples = np.concatenate((np.zeros(int(add_to_start)), samples))
-            if add_to_end > 0:
-                samples = np.resize(samples, size)
-                samples[int(size - add_to_end):] = 0
-                
-        return samples
-    
-    def spectral_centroid(self, seek_point):
+        The first sample of each pixel column of an image of the given width.
+        """
+        return (np.arange(image_width) * (self.frames / float(image_width))).astype(np.int64)
+
+    def spectral_centroids(self, image_width):
         """ 
-        Starting at seek_point to read n_fft samples and calculate the spectral centroid 
+        Computes the spectral centroid of the n_fft samples centered on the first sample of each pixel column, with one batched FFT,
+        and scales them logarithmically from 0 (fmin) to 1 (fmax).
         """
-        
-        samples = self.read_samples(seek_point - self.n_fft // 2, self.n_fft, True) * self.window
-        # Compute spectral centroid
-        spectral_centroid = librosa.feature.spectral_centroid(y=samples, sr=self.audio_file.samplerate, n_fft=self.n_fft)[0].sum()
-        # Clip spectral centroid to desired frequency range
-        clip_centroid = math.log10(self.clip(spectral_centroid, self.fmin, self.fmax))
-        # Scale desired frequency range from 0 to 1
-        spectral_centroid = (clip_centroid - self.fmin_log) / (self.fmax_log - self.fmin_log)
-        
-        return (spectral_centroid)
+        seek_points = self.seek_points(image_width)
+        # the windows at the edges of the file are zero padded
+        padded = np.concatenate((np.zeros(self.n_fft // 2, dtype=np.float32), self.samples, np.zeros(self.n_fft, dtype=np.float32)))
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft)[seek_points] * self.window
+
+        magnitudes = np.abs(np.fft.rfft(windows, axis=1))
+        freqs = np.fft.rfftfreq(self.n_fft, d=1.0 / self.samplerate)
+        total = magnitudes.sum(axis=1)
+        centroids = magnitudes.dot(freqs) / np.where(total > 0, total, 1)
 
+        # Clip spectral centroids to desired frequency range and scale it from 0 to 1
+        clip_centroids = np.log10(np.clip(centroids, self.fmin, self.fmax))
+        return (clip_centroids - self.fmin_log) / (self.fmax_log - self.fmin_log)
 
-    def peaks(self, start_seek, end_seek, block_size=1024):
+    def peaks(self, image_width):
         """ 
-        Read all samples between start_seek and end_seek, then find the minimum and maximum peak
-        in that range. Returns that pair in the order they were found. So if min was found first,
-        it returns (min, max) else the other way around. 
+        Finds the minimum and maximum sample of each pixel column.
+
+        Returns:
+            np.array(float32): The (min, max) pairs of shape (image_width, 2).
         """
-        
-        min_index, max_index, min_value, max_value = -1, -1, 1, -1 
-    
-        if end_seek > self.audio_file.frames:
-            end_seek = self.audio_file.frames
-    
-        if block_size > end_seek - start_seek:
-            block_size = end_seek - start_seek
-        
-        for i in range(start_seek, end_seek, block_size):
-            samples = self.read_samples(i, block_size)
-    
-            local_max_index = np.argmax(samples)
-            local_max_value = samples[local_max_index]
-    
-            if local_max_value > max_value:
-                max_value = local_max_value
-                max_index = local_max_index
-    
-            local_min_index = np.argmin(samples)
-            local_min_value = samples[local_min_index]
-            
-            if local_min_value < min_value:
-                min_value = local_min_value
-                min_index = local_min_index
-    
-        return (min_value, max_value) if min_index < max_index else (max_value, min_value)
+        seek_points = self.seek_points(image_width)
+        if self.frames == 0:
+            return np.zeros((image_width, 2), dtype=np.float32)
+        # columns narrower than one sample reuse the sample they start at
+        seek_points = np.minimum(seek_points, self.frames - 1)
+        return np.stack((np.minimum.reduceat(self.samples, seek_points), np.maximum.reduceat(self.samples, seek_points)), axis=1)
 
 class MgWaveformImage(object):
     def __init__(self, image_width=2500, image_height=500, cmap='freesound'):
@@ -191,16 +113,18 @@ class MgWaveformImage(object):
         self.image_width = image_width
         self.image_height = image_height
         
-    def draw_peaks(self, x, peaks, spectral_centroid):
+    def draw_peaks(self, peaks, spectral_centroids):
         """ 
-        Draw 2 peaks at x using the spectral_centroid for color 
+        Draws a vertical line between the 2 peaks of every column, using the spectral centroid of the column for color 
         """
 
-        y1 = int(self.image_height * 0.5 - peaks[0] * (self.image_height) * 0.5)
-        y2 = int(self.image_height * 0.5 - peaks[1] * (self.image_height) * 0.5)
-        
-        line_color = self.color_lookup[int(spectral_centroid * 255)] 
-        cv2.line(self.image, (x, y1), (x, y2), line_color)
+        rows = (self.image_height * 0.5 - np.asarray(peaks) * self.image_height * 0.5).astype(np.int64)
+        top, bottom = rows.min(axis=1), rows.max(axis=1)
+
+        line_colors = np.asarray(self.color_lookup, dtype=np.float64)[(np.asarray(spectral_centroids) * 255).astype(np.int64)]
+        y = np.arange(self.image_height)[:, np.newaxis]
+        lines = (y >= top) & (y <= bottom)
+        self.image = np.where(lines[..., np.newaxis], line_colors[np.newaxis], 0.0)
         
     def interpolate_colors(self, colors, flat=False, num_colors=256):
         """ 
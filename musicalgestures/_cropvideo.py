@@ -1,10 +1,8 @@
-import cv2
 import os
 import numpy as np
 import time
 import asyncio
 from musicalgestures._utils import MgProgressbar, get_length, get_widthheight, get_first_frame_as_image, get_box_video_ratio, roundup, crop_ffmpeg, wrap_str, unwrap_str, in_colab
-from musicalgestures._filter import filter_frame
 
 def find_motion_box_ffmpeg(filename, motion_box_thresh=0.1, motion_box_margin=12):
     """
@@ -98,6 +96,7 @@ drawing = False # True if mouse is pressed
 xi, yi = -1, -1
 
 def cropping_window(filename):
+    import cv2
 
     def draw_rectangle(event, x, y, flags, param):
         # grab references to the global variables
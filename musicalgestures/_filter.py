@@ -1,7 +1,4 @@
-from scipy.signal import medfilt2d
-import cv2
 import numpy as np
-import matplotlib
 from musicalgestures._utils import get_widthheight
 
 
@@ -18,6 +15,8 @@ def filter_frame(motion_frame, filtertype, thresh, kernel_size):
     Returns:
         np.array(uint8): The filtered frame.
     """
+    from scipy.signal import medfilt2d
+    import cv2
 
     if filtertype.lower() == 'regular':
         motion_frame = (motion_frame > thresh*255)*motion_frame
@@ -30,6 +29,7 @@ def filter_frame(motion_frame, filtertype, thresh, kernel_size):
     return motion_frame
 
 def filter_frame_ffmpeg(filename, cmd, color, blur, filtertype, threshold, kernel_size, use_median, invert=False):
+    import matplotlib
 
     cmd_filter = ''
 
@@ -1,13 +1,11 @@
 import os
-import cv2
 import numpy as np
 import math
 import weakref
-import matplotlib.pyplot as plt
-from scipy.stats import entropy
 
 import musicalgestures
 from musicalgestures._utils import MgFigure, extract_wav, embed_audio_in_video, MgProgressbar, convert_to_avi, generate_outfilename
+from musicalgestures._trace import traced, span, accumulate
 
 
 class Flow:
@@ -30,6 +28,7 @@ class Flow:
         self.color = color
         self.has_audio = has_audio
     
+    @traced('flow.dense')
     def dense(
             self,
             filename=None,
@@ -74,6 +73,9 @@ class Flow:
         Returns:
             MgVideo: A new MgVideo pointing to the output video file.
         """
+        import cv2
+        import matplotlib.pyplot as plt
+        from scipy.stats import entropy
 
         if filename == None:
             filename = self.filename
@@ -126,13 +128,15 @@ class Flow:
         xvel, yvel = [], []
 
         while(vidcap.isOpened()):
-            ret, frame2 = vidcap.read()
+            with accumulate('flow.dense.decode'):
+                ret, frame2 = vidcap.read()
             xsum, ysum = 0, 0
             
             if ret == True:
                 next_frame = cv2.cvtColor(cv2.resize(frame2, size), cv2.COLOR_BGR2GRAY)
 
-                flow = cv2.calcOpticalFlowFarneback(prev_frame, next_frame, None, pyr_scale, levels, winsize, iterations, poly_n, poly_sigma, flags)
+                with accumulate('flow.dense.flow'):
+                    flow = cv2.calcOpticalFlowFarneback(prev_frame, next_frame, None, pyr_scale, levels, winsize, iterations, poly_n, poly_sigma, flags)
 
                 if velocity:
                     # Cumulative sum of optical flow vectors        
@@ -179,40 +183,40 @@ class Flow:
             ii += 1
 
         if velocity:
+            with span('flow.dense.plot'):
+                fig, ax = plt.subplots(figsize=(12, 4), dpi=300)
 
-            fig, ax = plt.subplots(figsize=(12, 4), dpi=300)
+                # make sure background is white
+                fig.patch.set_facecolor('white')
+                fig.patch.set_alpha(1)
 
-            # make sure background is white
-            fig.patch.set_facecolor('white')
-            fig.patch.set_alpha(1)
+                # add title
+                title = 'Dense optical flow velocity: ' + os.path.basename(of + fex)
+                fig.suptitle(title, fontsize=16)
 
-            # add title
-            title = 'Dense optical flow velocity: ' + os.path.basename(of + fex)
-            fig.suptitle(title, fontsize=16)
+                time = np.linspace(0, len(xvel)/fps, len(xvel))
+                acceleration = self.get_acceleration(xvel, fps)
+                acceleration_entropy = entropy(acceleration)
 
-            time = np.linspace(0, len(xvel)/fps, len(xvel))
-            acceleration = self.get_acceleration(xvel, fps)
-            acceleration_entropy = entropy(acceleration)
+                ax.plot(time, xvel, label=f'Average acceleration: {round(np.mean(acceleration),3)} m/s\nEntropy of acceleration: {round(acceleration_entropy,3)}')
+                ax.set_xlabel('Time [Seconds]')
+                ax.set_ylabel('Velocity [Meters]')
+                ax.margins(x=0)
+                ax.legend(handlelength=0, handletextpad=0, fancybox=True)
 
-            ax.plot(time, xvel, label=f'Average acceleration: {round(np.mean(acceleration),3)} m/s\nEntropy of acceleration: {round(acceleration_entropy,3)}')
-            ax.set_xlabel('Time [Seconds]')
-            ax.set_ylabel('Velocity [Meters]')
-            ax.margins(x=0)
-            ax.legend(handlelength=0, handletextpad=0, fancybox=True)
+                fig.tight_layout()
 
-            fig.tight_layout()
+                if target_name == None:
+                    target_name = of + '_velocity.png'
 
-            if target_name == None:
-                target_name = of + '_velocity.png'
-
-            else:
-                # enforce png
-                target_name = os.path.splitext(target_name)[0] + '.png'
-            if not overwrite:
-                target_name = generate_outfilename(target_name)
+                else:
+                    # enforce png
+                    target_name = os.path.splitext(target_name)[0] + '.png'
+                if not overwrite:
+                    target_name = generate_outfilename(target_name)
 
-            plt.savefig(target_name, format='png', transparent=False)
-            plt.close()
+                plt.savefig(target_name, format='png', transparent=False)
+                plt.close()
 
             # create MgFigure
             data = {
@@ -236,9 +240,10 @@ class Flow:
             destination_video = target_name
 
             if self.has_audio:
-                source_audio = extract_wav(of + fex)
-                embed_audio_in_video(source_audio, destination_video)
-                os.remove(source_audio)
+                with span('flow.dense.audio_mux'):
+                    source_audio = extract_wav(of + fex)
+                    embed_audio_in_video(source_audio, destination_video)
+                    os.remove(source_audio)
 
             # save result at flow_dense_video at parent MgVideo
             self.parent().flow_dense_video = musicalgestures.MgVideo(
@@ -280,8 +285,7 @@ class Flow:
             corner_block_size=7,
             of_win_size=(15, 15),
             of_max_level=2,
-            of_criteria=(cv2.TERM_CRITERIA_EPS |
-                         cv2.TERM_CRITERIA_COUNT, 10, 0.03),
+            of_criteria=None,
             target_name=None,
             overwrite=False):
         """
@@ -295,13 +299,17 @@ class Flow:
             corner_block_size (int, optional): Size of an average block for computing a derivative covariation matrix over each pixel neighborhood. See cornerEigenValsAndVecs in cv2 docs. Defaults to 7.
             of_win_size (tuple, optional): Size of the search window at each pyramid level. Defaults to (15, 15).
             of_max_level (int, optional): 0-based maximal pyramid level number. If set to 0, pyramids are not used (single level), if set to 1, two levels are used, and so on. If pyramids are passed to input then the algorithm will use as many levels as pyramids have but no more than `maxLevel`. Defaults to 2.
-            of_criteria (tuple, optional): Specifies the termination criteria of the iterative search algorithm (after the specified maximum number of iterations criteria.maxCount or when the search window moves by less than criteria.epsilon). Defaults to (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03).
+            of_criteria (tuple, optional): Specifies the termination criteria of the iterative search algorithm (after the specified maximum number of iterations criteria.maxCount or when the search window moves by less than criteria.epsilon). Defaults to None (which uses (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)).
             target_name (str, optional): Target output name for the video. Defaults to None (which assumes that the input filename with the suffix "_flow_sparse" should be used).
             overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
 
         Returns:
             MgVideo: A new MgVideo pointing to the output video file.
         """
+        import cv2
+
+        if of_criteria is None:
+            of_criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
 
         if filename == None:
             filename = self.filename
@@ -1,10 +1,92 @@
 import numpy as np
 import os
 import cv2
-from musicalgestures._utils import MgImage, generate_outfilename, get_framecount, get_length, ffmpeg_cmd, get_widthheight
+import multiprocessing.pool
+from musicalgestures._utils import MgImage, MgProgressbar, generate_outfilename, ffmpeg_cmd, FFmpegError
+from musicalgestures._checkpoint import frame_ranges
 
 
-def mg_pixelarray(self, width=640, target_name=None, overwrite=False):
+def frame_pixels_range(filename, fps, start_frame=0, num_frames=None):
+    """
+    Reduces each frame of a consecutive range of frames to its average color, by letting FFmpeg area-scale the frames to a single pixel.
+
+    Args:
+        filename (str): Path to the input video file.
+        fps (float): The FPS of the input video.
+        start_frame (int, optional): The first frame of the range. Defaults to 0.
+        num_frames (int, optional): The number of frames in the range. Defaults to None (which reads until the end of the video).
+
+    Returns:
+        np.array(uint8): An array of shape (frames, 3) with the average color (BGR) of each frame.
+    """
+    cmd = ['ffmpeg', '-y']
+    if start_frame > 0:
+        # seek half a frame early to make sure the first frame of the range is not skipped due to rounding
+        cmd += ['-ss', '{:.6f}'.format((start_frame - 0.5) / fps)]
+    cmd += ['-i', filename]
+    if num_frames is not None:
+        cmd += ['-frames:v', str(num_frames)]
+    cmd += ['-vf', 'scale=1:1:flags=area']
+    process = ffmpeg_cmd(cmd, total_time=0, pipe='load')
+
+    pixels = np.frombuffer(process.stdout, dtype=np.uint8)
+    return pixels[:len(pixels) // 3 * 3].reshape(-1, 3)
+
+
+def frame_pixels(filename, fps, length, num_workers=1):
+    """
+    Reduces each frame of a video to its average color. With several workers, the video is split into one range of frames per worker, and the ranges are decoded in parallel.
+
+    Args:
+        filename (str): Path to the input video file.
+        fps (float): The FPS of the input video.
+        length (int): The number of frames in the input video.
+        num_workers (int, optional): The number of ranges decoded in parallel. If less than 1, the number of CPUs is used. Defaults to 1.
+
+    Returns:
+        np.array(uint8): An array of shape (frames, 3) with the average color (BGR) of each frame.
+    """
+    if num_workers is None or num_workers < 1:
+        num_workers = os.cpu_count() or 1
+    num_workers = max(1, min(num_workers, length))
+    ranges = frame_ranges(length, -(-length // num_workers))
+
+    pb = MgProgressbar(total=len(ranges), prefix='Creating frame-averaged pixel array:')
+    results = [None] * len(ranges)
+
+    def read_range(i):
+        results[i] = frame_pixels_range(filename, fps, *ranges[i])
+
+    with multiprocessing.pool.ThreadPool(len(ranges)) as pool:
+        for i, _ in enumerate(pool.imap_unordered(read_range, range(len(ranges)))):
+            pb.progress(i + 1)
+
+    return np.concatenate(results)
+
+
+def pixelarray_image(pixels, width):
+    """
+    Arranges the average colors of the frames in rows of `width` pixels. The last row is padded with black.
+
+    Args:
+        pixels (np.array(uint8)): An array of shape (frames, 3) with the average color (BGR) of each frame.
+        width (int): The width of the image.
+
+    Returns:
+        np.array(uint8): The pixel array image.
+
+    Raises:
+        ValueError: If there are no frames.
+    """
+    if len(pixels) == 0:
+        raise ValueError("The pixel array needs at least one frame.")
+    height = int(np.ceil(len(pixels) / width))
+    image = np.zeros((height * width, 3), dtype=np.uint8)
+    image[:len(pixels)] = pixels
+    return image.reshape(height, width, 3)
+
+
+def mg_pixelarray(self, width=640, target_name=None, overwrite=False, num_workers=1):
     """
     Creates a 'Frame-Averaged Pixel Array' of a video by reducing each frame to a single pixel
     and arranging all frames into a single image. This is equivalent to the bash script that
@@ -14,6 +96,8 @@ def mg_pixelarray(self, width=640, target_name=None, overwrite=False):
     - Each frame is reduced to a single pixel (average color of the frame)
     - All pixel values are arranged in a grid with specified width
     - Height is calculated automatically based on total frames and width
+
+    FFmpeg area-scales each frame to 1x1, so that only 3 bytes per frame are piped, and the grid is assembled with numpy.
     
     Args:
         width (int, optional): Width of the output image in pixels (number of frame-pixels per row). 
@@ -22,41 +106,52 @@ def mg_pixelarray(self, width=640, target_name=None, overwrite=False):
                                    with '_framearray_<width>' suffix. Defaults to None.
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically 
                                   increment target filenames to avoid overwriting. Defaults to False.
+        num_workers (int, optional): The number of video segments decoded in parallel. If less than 1, the number of CPUs is used. Defaults to 1.
     
     Returns:
         MgImage: A new MgImage pointing to the output frame-averaged pixel array image file.
     """
-    
+    return render_pixelarray(self, width=width, target_name=target_name, overwrite=overwrite, num_workers=num_workers)[0]
+
+
+def render_pixelarray(self, width=640, target_name=None, overwrite=False, num_workers=1):
+    """
+    Renders the frame-averaged pixel array of `mg_pixelarray`, also returning the average colors of the frames.
+
+    Args:
+        width (int, optional): Width of the output image in pixels. Defaults to 640.
+        target_name (str, optional): The name of the output image file. Defaults to None.
+        overwrite (bool, optional): Whether to allow overwriting existing files. Defaults to False.
+        num_workers (int, optional): The number of video segments decoded in parallel. Defaults to 1.
+
+    Returns:
+        MgImage: A new MgImage pointing to the output frame-averaged pixel array image file.
+        np.array(uint8): An array of shape (frames, 3) with the average color (BGR) of each frame.
+
+    Raises:
+        FFmpegError: If no frame could be decoded from the video.
+    """
     if target_name is None:
         target_name = f"{self.of}_pixelarray_{width}.png"
     if not overwrite:
         target_name = generate_outfilename(target_name)
-    
-    # Get video properties
-    frames = get_framecount(self.filename)
-    height = int(np.ceil(frames / width))
-    video_length = get_length(self.filename)
-    
+
     print(f"Processing {self.filename}")
-    print(f"Total frames: {frames}")
-    print(f"Output dimensions: {width}x{height}")
-    print(f"Filter: scale=1:1,tile={width}x{height}")
-    
-    # Method 1: Using FFmpeg (similar to the bash script)
-    # This directly replicates the bash script functionality
-    cmd = [
-        'ffmpeg', '-y', '-i', self.filename,
-        '-vf', f'scale=1:1,tile={width}x{height}',
-        '-frames:v', '1',
-        target_name
-    ]
-    
-    ffmpeg_cmd(cmd, video_length, pb_prefix='Creating frame-averaged pixel array:')
-    
+
+    pixels = frame_pixels(self.filename, self.fps, self.length, num_workers=num_workers)
+    if len(pixels) == 0:
+        raise FFmpegError(f"Could not decode any frame of {self.filename}.")
+    image = pixelarray_image(pixels, width)
+
+    print(f"Total frames: {len(pixels)}")
+    print(f"Output dimensions: {image.shape[1]}x{image.shape[0]}")
+
+    cv2.imwrite(target_name, image)
+
     # Save result as the pixelarray for parent MgVideo
     self.pixelarray = MgImage(target_name)
-    
-    return self.pixelarray
+
+    return self.pixelarray, pixels
 
 
 def mg_pixelarray_cv2(self, width=640, target_name=None, overwrite=False):
@@ -107,10 +202,10 @@ def mg_pixelarray_cv2(self, width=640, target_name=None, overwrite=False):
             # Convert to grayscale if needed
             if not self.color:
                 frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                average_color = np.mean(frame)
+                average_color = np.array(cv2.mean(frame)[0])
             else:
                 # Calculate average color for each channel
-                average_color = np.mean(frame, axis=(0, 1))
+                average_color = np.array(cv2.mean(frame)[:3])
             
             # Calculate position in output grid
             row = frame_count // width
@@ -141,7 +236,7 @@ def mg_pixelarray_cv2(self, width=640, target_name=None, overwrite=False):
     return self.pixelarray_cv2
 
 
-def mg_pixelarray_stats(self, width=640, include_stats=True):
+def mg_pixelarray_stats(self, width=640, include_stats=True, num_workers=1):
     """
     Creates a frame-averaged pixel array and optionally returns statistics about the video.
     This function provides additional information similar to the bash script's output.
@@ -149,24 +244,20 @@ def mg_pixelarray_stats(self, width=640, include_stats=True):
     Args:
         width (int, optional): Width of the output image in pixels. Defaults to 640.
         include_stats (bool, optional): Whether to return detailed statistics. Defaults to True.
+        num_workers (int, optional): The number of video segments decoded in parallel. If less than 1, the number of CPUs is used. Defaults to 1.
     
     Returns:
         dict: Dictionary containing the generated MgImage and optional statistics.
     """
     
-    # Get video properties for statistics (similar to bash script)
-    cap = cv2.VideoCapture(self.filename)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
+    # Create the frame-averaged pixel array, the statistics come from the same pass
+    result_image, pixels = render_pixelarray(self, width=width, num_workers=num_workers)
+
+    fps = self.fps
+    total_frames = len(pixels)
     duration_seconds = total_frames / fps if fps > 0 else 0
-    cap.release()
-    
-    # Calculate dimensions
     height = int(np.ceil(total_frames / width))
-    
-    # Create the frame-averaged pixel array
-    result_image = mg_pixelarray(self, width=width)
-    
+
     result = {
         'image': result_image,
         'filename': os.path.abspath(self.filename)
@@ -186,7 +277,8 @@ def mg_pixelarray_stats(self, width=640, include_stats=True):
             'total_frames': total_frames,
             'output_width': width,
             'output_height': height,
-            'filter_description': f"scale=1:1,tile={width}x{height}"
+            'filter_description': f"scale=1:1,tile={width}x{height}",
+            'mean_color': pixels.mean(axis=0)[::-1].tolist() if len(pixels) > 0 else None
         })
         
         # Print statistics (similar to bash script output)
@@ -1,11 +1,40 @@
-import os, subprocess
+import os
 import cv2
 import numpy as np
-from musicalgestures._utils import MgImage, generate_outfilename, ffmpeg_cmd, get_length
+import multiprocessing.pool
+from musicalgestures._utils import MgImage, MgProgressbar, generate_outfilename, seek_frame
+
+
+def compose_grid(tiles, rows, cols, tile_width, tile_height, padding=0, margin=0):
+    """
+    Composes tiles into a grid image, row by row, like the FFmpeg tile filter. Missing tiles (None) are left black.
+
+    Args:
+        tiles (list): The tiles (np.array(uint8) of shape (tile_height, tile_width, 3)).
+        rows (int): Number of rows of the grid.
+        cols (int): Number of columns of the grid.
+        tile_width (int): The width of a tile.
+        tile_height (int): The height of a tile.
+        padding (int, optional): Padding size between the tiles. Defaults to 0.
+        margin (int, optional): Margin size around the grid. Defaults to 0.
+
+    Returns:
+        np.array(uint8): The grid image.
+    """
+    grid = np.zeros((2 * margin + rows * tile_height + (rows - 1) * padding,
+                     2 * margin + cols * tile_width + (cols - 1) * padding, 3), dtype=np.uint8)
+    for i, tile in enumerate(tiles[:rows*cols]):
+        if tile is None:
+            continue
+        y = margin + (i // cols) * (tile_height + padding)
+        x = margin + (i % cols) * (tile_width + padding)
+        grid[y:y+tile_height, x:x+tile_width] = tile
+    return grid
+
 
 def mg_grid(self, height=300, rows=3, cols=3, padding=0, margin=0, target_name=None, overwrite=False, return_array=False):
     """
-    Generates frame strip video preview using ffmpeg.
+    Generates frame strip video preview using ffmpeg. Each tile is read by seeking directly to its frame (in parallel threads), so only rows*cols frames are decoded.
 
     Args:
         height (int, optional): Frame height, width is adjusted automatically to keep the correct aspect ratio. Defaults to 300.
@@ -26,32 +55,33 @@ def mg_grid(self, height=300, rows=3, cols=3, padding=0, margin=0, target_name=N
         target_name = of + '_grid.png'
     else:
         # Enforce png
-        target_name = of + '_grid.png'
+        target_name = os.path.splitext(target_name)[0] + '.png'
     if not overwrite:
         target_name = generate_outfilename(target_name)
 
-    # Get the number of frames
-    cap = cv2.VideoCapture(self.filename)
-    nb_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    nth_frame = int(nb_frames / (rows*cols))
+    # Take every nth frame of the video
+    nth_frame = max(1, int(self.length / (rows*cols)))
+    # seek half a frame early to make sure the target frame is not skipped due to rounding
+    times = [max(0, (i * nth_frame - 0.5) / self.fps) for i in range(rows*cols) if i * nth_frame < self.length]
 
     # Define the grid specifications
     width = int((float(self.width) / self.height) * height)
-    grid = f"select=not(mod(n\,{nth_frame})),scale={width}:{height},tile={cols}x{rows}:padding={padding}:margin={margin}"
 
-    # Declare the ffmpeg commands
-    if return_array:
-        cmd = ['ffmpeg', '-y', '-i', self.filename, '-frames', '1', '-q:v', '0', '-vf', grid]
-        process = ffmpeg_cmd(cmd, get_length(self.filename), pb_prefix='Rendering video frame grid:', pipe='load')
+    pb = MgProgressbar(total=len(times), prefix='Rendering video frame grid:')
+    tiles = []
+    with multiprocessing.pool.ThreadPool(max(1, min(len(times), os.cpu_count() or 1))) as pool:
+        for i, tile in enumerate(pool.imap(lambda time: seek_frame(self.filename, time, self.width, self.height, scale=(width, height)), times)):
+            tiles.append(tile)
+            pb.progress(i + 1)
 
-        # Convert bytes to array and convert from BGR to RGB
-        array = np.frombuffer(process.stdout, dtype=np.uint8).reshape([height*rows, int(width*cols), 3])[...,::-1] 
+    grid = compose_grid(tiles, rows, cols, width, height, padding=padding, margin=margin)
 
-        return array
+    if return_array:
+        # Convert from BGR to RGB
+        return grid[..., ::-1]
     else:
-        cmd = ['ffmpeg', '-i', self.filename, '-y', '-frames', '1', '-q:v', '0', '-vf', grid, target_name]
-        ffmpeg_cmd(cmd, get_length(self.filename), pb_prefix='Rendering video frame grid:')
+        cv2.imwrite(target_name, grid)
         # Initialize the MgImage object
         img = MgImage(target_name)
 
-        return img
\ No newline at end of file
+        return img
@@ -1,7 +1,7 @@
 import cv2
 import os
 import numpy as np
-from musicalgestures._utils import extract_wav, embed_audio_in_video, MgProgressbar, ffmpeg_cmd, get_length, generate_outfilename, convert_to_avi
+from musicalgestures._utils import MgProgressbar, ffmpeg_cmd, get_length, get_widthheight, get_fps, get_framecount, generate_outfilename
 import musicalgestures
 
 
@@ -107,14 +107,102 @@ def history_ffmpeg(self, filename=None, history_length=10, weights=1, normalize=
     return self.history_video
 
 
-def history_cv2(self, filename=None, history_length=10, weights=1, target_name=None, overwrite=False):
+class MgHistoryBuffer():
+    """
+    Incrementally computes the history of a stream of frames: the weighted sum of the current frame and the `history_length` previous frames.
+    The frames are kept in a preallocated ring buffer with a running (exact, integer) sum, so the cost per frame does not depend on `history_length`.
+    Only the frames with a weight other than 1 are added separately. With `decay`, an exponential history is used instead, which needs a single buffer.
+    """
+
+    def __init__(self, history_length=10, weights=1, decay=None):
+        """
+        Initializes the history buffer.
+
+        Args:
+            history_length (int, optional): Number of previous frames in the history tail. Defaults to 10.
+            weights (int/float/list, optional): The weight or weights applied to the frames. If given as list the first element in the list will correspond to the weight of the current frame, the second to the previous frame, and so on. Frames without a given weight have a weight of 1. Defaults to 1.
+            decay (float, optional): If set, the history decays exponentially, each frame being added with the weight `1 - decay` to the history multiplied by `decay` (between 0 and 1). `history_length` and `weights` are ignored. Defaults to None.
+        """
+        self.history_length = int(history_length)
+        self.decay = decay
+        if decay is not None and not 0 <= decay < 1:
+            raise ParameterError('decay must be between 0 (included) and 1 (excluded).')
+
+        weights_map = np.ones(self.history_length + 1)
+        if type(weights) in [int, float]:
+            weights_map[0] = weights
+        elif type(weights) == list:
+            if False in [type(item) in [int, float] for item in weights]:
+                raise ParameterError('Found wrong type(s) in the list of weights. Use ints and floats.')
+            weights = weights[:self.history_length + 1]
+            weights_map[:len(weights)] = weights
+        else:
+            raise ParameterError('Wrong type used for weights. Use int, float or list.')
+
+        # weight vector, cached for the whole stream: index k is the frame k steps back
+        self.weights_map = weights_map
+        self.denominator = weights_map.sum()
+        # frames not covered by the uniform running sum alone
+        self.corrections = [(k, weight - 1) for k, weight in enumerate(weights_map) if weight != 1]
+
+        self.ring = None
+        self.sum = None
+        self.count = 0
+
+    def push(self, frame):
+        """
+        Adds a frame to the history.
+
+        Args:
+            frame (np.array(uint8)): The current frame.
+
+        Returns:
+            np.array(float32): The history image of the current frame.
+        """
+        if self.ring is None:
+            if self.decay is not None:
+                self.ring = frame.astype(np.float32)
+            else:
+                self.ring = np.zeros((self.history_length + 1,) + frame.shape, dtype=np.uint8)
+                self.sum = np.zeros(frame.shape, dtype=np.uint32)
+
+        if self.decay is not None:
+            if self.count > 0:
+                cv2.accumulateWeighted(frame, self.ring, 1 - self.decay)
+            self.count += 1
+            return self.ring
+
+        size = len(self.ring)
+        slot = self.count % size
+        if self.count >= size:
+            # drop the frame leaving the tail from the running sum
+            np.subtract(self.sum, self.ring[slot], out=self.sum)
+        self.ring[slot] = frame
+        np.add(self.sum, frame, out=self.sum)
+        self.count += 1
+
+        if self.count == 1:
+            # there is no history yet, show the frame as it is
+            return frame.astype(np.float32)
+
+        total = self.sum.astype(np.float32)
+        for k, weight in self.corrections:
+            if k < self.count:
+                total += weight * self.ring[(self.count - 1 - k) % size]
+        total /= self.denominator
+        return total
+
+
+def history_cv2(self, filename=None, history_length=10, weights=1, decay=None, target_name=None, overwrite=False):
     """
     This function  creates a video where each frame is the average of the N previous frames, where n is determined by `history_length`. The history frames are summed up and normalized, and added to the current frame to show the history. Uses cv2.
+    The frames are piped from FFmpeg and the history is kept as a running sum (see MgHistoryBuffer), so long history tails cost the same as short ones.
 
     Args:
         filename (str, optional): Path to the input video file. If None, the video file of the MgVideo is used. Defaults to None.
         history_length (int, optional): Number of frames to be saved in the history tail. Defaults to 10.
         weights (int/float/list, optional): Defines the weight or weights applied to the frames in the history tail. If given as list the first element in the list will correspond to the weight of the newest frame in the tail. Defaults to 1.
+        decay (float, optional): If set, uses an exponentially decaying history instead, where each frame is added with the weight `1 - decay` to the history multiplied by `decay` (between 0 and 1). `history_length` and `weights` are ignored. Defaults to None.
         target_name (str, optional): Target output name for the video. Defaults to None (which assumes that the input filename with the suffix "_history" should be used).
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
 
@@ -127,24 +215,13 @@ def history_cv2(self, filename=None, history_length=10, weights=1, target_name=N
 
     of, fex = os.path.splitext(filename)
 
-    if fex != '.avi':
-        # first check if there already is a converted version, if not create one and register it to the parent self
-        if "as_avi" not in self.__dict__.keys():
-            file_as_avi = convert_to_avi(of + fex, overwrite=overwrite)
-            # register it as the avi version for the file
-            self.as_avi = musicalgestures.MgVideo(file_as_avi)
-        # point of and fex to the avi version
-        of, fex = self.as_avi.of, self.as_avi.fex
-        filename = of + fex
-
-    video = cv2.VideoCapture(filename)
-    ret, frame = video.read()
-    fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-
-    fps = int(video.get(cv2.CAP_PROP_FPS))
-    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    length = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    if filename == self.filename:
+        width, height, fps, length = self.width, self.height, self.fps, self.length
+    else:
+        width, height = get_widthheight(filename)
+        fps, length = get_fps(filename), get_framecount(filename)
+
+    history = MgHistoryBuffer(history_length, weights, decay)
 
     pb = MgProgressbar(total=length, prefix='Rendering history video:')
 
@@ -153,74 +230,43 @@ def history_cv2(self, filename=None, history_length=10, weights=1, target_name=N
     if not overwrite:
         target_name = generate_outfilename(target_name)
 
-    out = cv2.VideoWriter(target_name, fourcc, fps, (width, height))
+    # Pipe video with FFmpeg for reading frame by frame
+    process = ffmpeg_cmd(['ffmpeg', '-y', '-i', filename], total_time=length, pipe='read')
 
-    ii = 0
-    history = []
-    weights_map = [1 for weight in range(history_length+1)]
+    # Pipe the history frames back to FFmpeg, muxing the audio of the input in the same pass
+    cmd = ['ffmpeg', '-y', '-s', '{}x{}'.format(width, height), '-r', str(fps),
+           '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-vcodec', 'rawvideo', '-i', '-']
+    if self.has_audio:
+        cmd += ['-i', filename, '-map', '0:v:0', '-map', '1:a:0?', '-shortest']
+    cmd += ['-vcodec', 'libx264', '-pix_fmt', 'yuv420p', target_name]
+    video_out = ffmpeg_cmd(cmd, total_time=length, pipe='write')
 
-    if type(weights) in [int, float]:
-        offset = weights - 1
-        weights_map[0] = weights
-    elif type(weights) == list:
-        offset = sum([weight - 1 for weight in weights])
-        for ind, weight in enumerate(weights):
-            if ind > history_length:
-                break
-            weights_map[ind] = weight
-
-    denominator = history_length + 1 + offset
-
-    while(video.isOpened()):
-        ret, frame = video.read()
-        if ret == True:
-            if self.color == False:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            frame = (np.array(frame)).astype(np.float32)
-
-            if len(history) > 0:
-                #history_total = frame/(len(history)+1)
-                history_total = frame * weights_map[0] / denominator
-                # history_total = frame
-            else:
-                history_total = frame
-
-            for ind, newframe in enumerate(history):
-                #history_total += newframe/(len(history)+1)
-                history_total += newframe * weights_map[ind+1] / denominator
-            # or however long history you would like
-            if len(history) >= history_length:
-                history.pop(0)  # pop first frame
-            history.append(frame)
-            # 0.5 to not overload it poor thing
-            total = history_total.astype(np.uint64)
-
-            if self.color == False:
-                total = cv2.cvtColor(total.astype(
-                    np.uint8), cv2.COLOR_GRAY2BGR)
-                out.write(total)
-            else:
-                out.write(total.astype(np.uint8))
+    ii = 0
 
-        else:
+    while True:
+        out = process.stdout.read(width*height*3)
+        if out == b'':
             pb.progress(length)
             break
 
-        pb.progress(ii)
-        ii += 1
+        frame = np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3])
+        if self.color == False:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-    out.release()
+        total = history.push(frame).astype(np.uint8)
 
-    destination_video = target_name
+        if self.color == False:
+            total = cv2.cvtColor(total, cv2.COLOR_GRAY2BGR)
+        video_out.stdin.write(total.tobytes())
 
-    if self.has_audio:
-        source_audio = extract_wav(self.of + self.fex)
-        embed_audio_in_video(source_audio, destination_video)
-        os.remove(source_audio)
+        pb.progress(ii)
+        ii += 1
+
+    video_out.stdin.close()
+    video_out.wait()
+    process.terminate()
 
     self.history_video = musicalgestures.MgVideo(
-        destination_video, color=self.color, returned_by_process=True)
+        target_name, color=self.color, returned_by_process=True)
 
-    # return musicalgestures.MgVideo(destination_video, color=self.color, returned_by_process=True)
     return self.history_video
@@ -0,0 +1,38 @@
+import importlib
+
+
+class lazy_method():
+    """
+    A method bound in a class body which is only imported from its module when it is first accessed, so that importing the class
+    does not import the (heavy) dependencies of all its methods. On first access it replaces itself with the imported function,
+    which then behaves exactly like a method bound with `from module import function as method`.
+
+        class MgVideo(MgAudio):
+            motion = lazy_method('musicalgestures._motionvideo', 'mg_motion')
+    """
+
+    def __init__(self, module, function):
+        """
+        Initializes the lazy method.
+
+        Args:
+            module (str): The name of the module defining the function, e.g. 'musicalgestures._motionvideo'.
+            function (str): The name of the function in the module, e.g. 'mg_motion'.
+        """
+        self.module = module
+        self.function = function
+        self.owner = None
+        self.name = function
+
+    def __set_name__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        function = getattr(importlib.import_module(self.module), self.function)
+        if self.owner is not None:
+            setattr(self.owner, self.name, function)
+        return function if obj is None else function.__get__(obj, objtype)
+
+    def __repr__(self):
+        return f"lazy_method('{self.module}', '{self.function}')"
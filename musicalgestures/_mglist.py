@@ -1,5 +1,6 @@
 import musicalgestures
 from musicalgestures._utils import MgFigure, MgImage
+from musicalgestures._lazy import lazy_method
 
 
 class MgList():
@@ -41,7 +42,7 @@ class MgList():
 
         self.objectlist = crawler(objectlist)
 
-    from musicalgestures._show import mg_show
+    mg_show = lazy_method('musicalgestures._show', 'mg_show')
     from musicalgestures._utils import MgFigure, MgImage
 
     def show(self, filename=None, key=None, mode='windowed', window_width=640, window_height=480, window_title=None):
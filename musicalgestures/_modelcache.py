@@ -0,0 +1,130 @@
+import os
+import threading
+import collections
+import cv2
+import musicalgestures
+
+# process-wide cache of loaded networks, keyed by (model, device), from the least to the most recently used
+_models = collections.OrderedDict()
+_lock = threading.RLock()
+
+# the number of networks kept in the cache, the least recently used one is evicted beyond it
+MAX_CACHED_MODELS = 4
+
+POSE_MODEL_TYPES = ['body_25', 'mpi', 'coco']
+MODEL_TYPES = POSE_MODEL_TYPES + ['centerface']
+
+
+def model_key(model, device='cpu'):
+    """
+    Builds the key used to store a network in the model cache.
+
+    Args:
+        model (str): The model type. Accepted values are 'body_25', 'mpi', 'coco' and 'centerface'.
+        device (str, optional): The backend of the network ('cpu' or 'gpu'). Defaults to 'cpu'.
+
+    Returns:
+        tuple: The cache key.
+    """
+    model = model.lower()
+    if model not in MODEL_TYPES:
+        raise ValueError(f'Unrecognized model "{model}". Accepted values are {MODEL_TYPES}.')
+    return model, device.lower()
+
+
+def load_model(model, device='cpu'):
+    """
+    Reads a network from disk, bypassing the model cache.
+
+    Args:
+        model (str): The model type. Accepted values are 'body_25', 'mpi', 'coco' and 'centerface'.
+        device (str, optional): The backend of the network ('cpu' or 'gpu'). Defaults to 'cpu'.
+
+    Returns:
+        cv2.dnn.Net: The loaded network.
+    """
+    model, device = model_key(model, device)
+
+    if model in POSE_MODEL_TYPES:
+        from musicalgestures._pose import pose_model_files, load_pose_net
+        protoFile, weightsFile = pose_model_files(model)
+        return load_pose_net(protoFile, weightsFile, device)
+
+    module_path = os.path.abspath(os.path.dirname(musicalgestures.__file__))
+    net = cv2.dnn.readNetFromONNX(module_path + '/models/centerface.onnx')
+    if device == 'gpu':
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+    return net
+
+
+def get_model(model, device='cpu'):
+    """
+    Returns a network from the model cache, loading it on first use. Networks are shared across calls and
+    MgVideo instances within the process, so the same network should not be used from several threads at once.
+    The input size is not part of the key: a network reshapes itself to the size of the blob it is given.
+    At most `MAX_CACHED_MODELS` networks are kept, the least recently used one is evicted first.
+
+    Args:
+        model (str): The model type. Accepted values are 'body_25', 'mpi', 'coco' and 'centerface'.
+        device (str, optional): The backend of the network ('cpu' or 'gpu'). Defaults to 'cpu'.
+
+    Returns:
+        cv2.dnn.Net: The cached network.
+    """
+    key = model_key(model, device)
+    with _lock:
+        net = _models.get(key)
+        if net is None:
+            net = load_model(*key)
+            _models[key] = net
+            while len(_models) > max(1, MAX_CACHED_MODELS):
+                _models.popitem(last=False)
+        else:
+            _models.move_to_end(key)
+    return net
+
+
+def preload_model(model, device='cpu'):
+    """
+    Loads a network into the model cache ahead of time. Can be used as the initializer of a multiprocessing pool
+    (eg. `multiprocessing.Pool(4, initializer=preload_model, initargs=('body_25', 'cpu'))`) so that each worker
+    reads the weights only once.
+
+    Args:
+        model (str): The model type. Accepted values are 'body_25', 'mpi', 'coco' and 'centerface'.
+        device (str, optional): The backend of the network ('cpu' or 'gpu'). Defaults to 'cpu'.
+    """
+    get_model(model, device)
+
+
+def evict_model(model=None, device=None):
+    """
+    Removes networks from the model cache. Arguments left as None match any value, so `evict_model()` empties the whole cache.
+
+    Args:
+        model (str, optional): The model type to evict. Defaults to None.
+        device (str, optional): The backend to evict. Defaults to None.
+
+    Returns:
+        int: The number of evicted networks.
+    """
+    with _lock:
+        evicted = [
+            key for key in _models
+            if (model is None or key[0] == model.lower())
+            and (device is None or key[1] == device.lower())]
+        for key in evicted:
+            del _models[key]
+    return len(evicted)
+
+
+def cached_models():
+    """
+    Lists the keys of the networks currently in the model cache.
+
+    Returns:
+        list: The (model, device) keys, from the least to the most recently used.
+    """
+    with _lock:
+        return list(_models.keys())
@@ -12,9 +12,11 @@ from musicalgestures._motionanalysis import centroid, area
 from musicalgestures._utils import extract_wav, embed_audio_in_video, frame2ms, ffmpeg_cmd, MgProgressbar, MgFigure, MgImage, motionvideo_ffmpeg, generate_outfilename
 from musicalgestures._filter import filter_frame_ffmpeg
 from musicalgestures._mglist import MgList
+from musicalgestures._trace import traced, span, accumulate
 
 
 
+@traced('motion')
 def mg_motion(
         self,
         filtertype='Regular',
@@ -125,7 +127,8 @@ def mg_motion(
         i = 0
         while True:
             # Read frame-by-frame
-            out = process.stdout.read(self.width*self.height*3)
+            with accumulate('motion.decode'):
+                out = process.stdout.read(self.width*self.height*3)
 
             if out == b'':
                 pb.progress(self.length)
@@ -134,51 +137,52 @@ def mg_motion(
             # Transform the bytes read into a numpy array
             motion_frame = np.frombuffer(out, dtype=np.uint8).reshape([self.height, self.width, 3]) # height, width, channels
 
-            if save_data | save_plot:
-                if motion_analysis.lower() == 'aom':
-                    # Area of Motion (AoM)
-                    aombite = area(motion_frame, self.height, self.width)
-                    if i == 0:
-                        time = frame2ms(i, self.fps)
-                        aom = np.array(aombite).reshape(1, 4)
-                    else:
-                        time = np.append(time, frame2ms(i, self.fps))
-                        aom = np.append(aom, np.array(aombite).reshape(1, 4), axis=0)
-
-                if motion_analysis.lower() == 'com' or motion_analysis.lower() == 'qom':
-                    # Centroid of Motion (CoM) and Quantity of Motion (QoM)
-                    combite, qombite = centroid(motion_frame, self.width, self.height)
-                    if i == 0:
-                        time = frame2ms(i, self.fps)
-                        com = combite.reshape(1, 2)
-                        qom = qombite
-                    else:
-                        time = np.append(time, frame2ms(i, self.fps))
-                        com = np.append(com, combite.reshape(1, 2), axis=0)
-                        qom = np.append(qom, qombite)
-
-                if motion_analysis.lower() == 'all':
-                    # Area of Motion (AoM)
-                    aombite = area(motion_frame, self.height, self.width)                    
-                    # Centroid of Motion (CoM) and Quantity of Motion (QoM)
-                    combite, qombite = centroid(motion_frame, self.width, self.height)
-                    if i == 0:
-                        time = frame2ms(i, self.fps)
-                        com = combite.reshape(1, 2)
-                        qom = qombite
-                        aom = np.array(aombite).reshape(1, 4)
-                    else:
-                        time = np.append(time, frame2ms(i, self.fps))
-                        com = np.append(com, combite.reshape(1, 2), axis=0)
-                        qom = np.append(qom, qombite)
-                        aom = np.append(aom, np.array(aombite).reshape(1, 4), axis=0)
-
-            if save_motiongrams:
-                movement_y = np.mean(motion_frame, axis=1).reshape(self.height, 1, 3).astype(np.uint8)
-                movement_x = np.mean(motion_frame, axis=0).reshape(1, self.width, 3).astype(np.uint8)
-
-                gramy = np.append(gramy, movement_y, axis=1).astype(np.uint8)
-                gramx = np.append(gramx, movement_x, axis=0).astype(np.uint8)
+            with accumulate('motion.analysis'):
+                if save_data | save_plot:
+                    if motion_analysis.lower() == 'aom':
+                        # Area of Motion (AoM)
+                        aombite = area(motion_frame, self.height, self.width)
+                        if i == 0:
+                            time = frame2ms(i, self.fps)
+                            aom = np.array(aombite).reshape(1, 4)
+                        else:
+                            time = np.append(time, frame2ms(i, self.fps))
+                            aom = np.append(aom, np.array(aombite).reshape(1, 4), axis=0)
+
+                    if motion_analysis.lower() == 'com' or motion_analysis.lower() == 'qom':
+                        # Centroid of Motion (CoM) and Quantity of Motion (QoM)
+                        combite, qombite = centroid(motion_frame, self.width, self.height)
+                        if i == 0:
+                            time = frame2ms(i, self.fps)
+                            com = combite.reshape(1, 2)
+                            qom = qombite
+                        else:
+                            time = np.append(time, frame2ms(i, self.fps))
+                            com = np.append(com, combite.reshape(1, 2), axis=0)
+                            qom = np.append(qom, qombite)
+
+                    if motion_analysis.lower() == 'all':
+                        # Area of Motion (AoM)
+                        aombite = area(motion_frame, self.height, self.width)                    
+                        # Centroid of Motion (CoM) and Quantity of Motion (QoM)
+                        combite, qombite = centroid(motion_frame, self.width, self.height)
+                        if i == 0:
+                            time = frame2ms(i, self.fps)
+                            com = combite.reshape(1, 2)
+                            qom = qombite
+                            aom = np.array(aombite).reshape(1, 4)
+                        else:
+                            time = np.append(time, frame2ms(i, self.fps))
+                            com = np.append(com, combite.reshape(1, 2), axis=0)
+                            qom = np.append(qom, qombite)
+                            aom = np.append(aom, np.array(aombite).reshape(1, 4), axis=0)
+
+                if save_motiongrams:
+                    movement_y = np.mean(motion_frame, axis=1).reshape(self.height, 1, 3).astype(np.uint8)
+                    movement_x = np.mean(motion_frame, axis=0).reshape(1, self.width, 3).astype(np.uint8)
+
+                    gramy = np.append(gramy, movement_y, axis=1).astype(np.uint8)
+                    gramx = np.append(gramx, movement_x, axis=0).astype(np.uint8)
 
             if save_video:
                 if video_out is None:
@@ -187,10 +191,11 @@ def mg_motion(
                         '-i', '-', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', target_name_video]
                     video_out = ffmpeg_cmd(cmd, total_time=self.length, pipe='write')
 
-                if inverted_motionvideo:
-                    video_out.stdin.write(cv2.bitwise_not(motion_frame.astype(np.uint8)))
-                else:
-                    video_out.stdin.write(motion_frame.astype(np.uint8))
+                with accumulate('motion.encode'):
+                    if inverted_motionvideo:
+                        video_out.stdin.write(cv2.bitwise_not(motion_frame.astype(np.uint8)))
+                    else:
+                        video_out.stdin.write(motion_frame.astype(np.uint8))
             
             # Flush the buffer
             process.stdout.flush()
@@ -199,8 +204,9 @@ def mg_motion(
 
         # Terminate the processes
         if save_video:
-            video_out.stdin.close()
-            video_out.wait()
+            with span('motion.encode_finish'):
+                video_out.stdin.close()
+                video_out.wait()
         process.terminate()
 
         if save_motiongrams:
@@ -245,15 +251,17 @@ def mg_motion(
             audio_descriptors = self
             
         if save_data:
-            save_txt(of, time, aom, com, qom, motion_analysis, self.width, self.height, 
-            data_format=data_format, target_name_data=target_name_data, overwrite=overwrite)
+            with span('motion.save_data'):
+                save_txt(of, time, aom, com, qom, motion_analysis, self.width, self.height, 
+                data_format=data_format, target_name_data=target_name_data, overwrite=overwrite)
 
         if save_plot:
             if plot_title == None:
                 plot_title = os.path.basename(of + fex)
             # save plot as an MgImage at motion_plot for parent MgVideo
-            self.motion_plot = MgImage(save_analysis(of, self.fps, aom, com, qom, motion_analysis, audio_descriptors, self.width,
-                                        self.height, unit, plot_title, target_name_plot=target_name_plot, overwrite=overwrite))
+            with span('motion.plot'):
+                self.motion_plot = MgImage(save_analysis(of, self.fps, aom, com, qom, motion_analysis, audio_descriptors, self.width,
+                                            self.height, unit, plot_title, target_name_plot=target_name_plot, overwrite=overwrite))
                 
         # Resetting numpy warnings for dividing by 0
         np.seterr(divide='warn', invalid='warn')
@@ -261,9 +269,10 @@ def mg_motion(
         if save_video:
             # Check if the original video fil has audio
             if self.has_audio:
-                source_audio = extract_wav(of + fex)
-                embed_audio_in_video(source_audio, target_name_video)
-                os.remove(source_audio)
+                with span('motion.audio_mux'):
+                    source_audio = extract_wav(of + fex)
+                    embed_audio_in_video(source_audio, target_name_video)
+                    os.remove(source_audio)
                 
             # Save generated musicalgestures video as the video of the parent MgVideo
             self.motion_video = musicalgestures.MgVideo(filename=target_name_video, returned_by_process=True)
@@ -3,13 +3,19 @@ import cv2
 import os
 import numpy as np
 import pandas as pd
-from musicalgestures._utils import MgProgressbar, convert_to_avi, extract_wav, embed_audio_in_video, roundup, frame2ms, generate_outfilename, in_colab, ffmpeg_cmd
+from musicalgestures._utils import MgProgressbar, convert_to_avi, extract_wav, embed_audio_in_video, roundup, generate_outfilename, in_colab, ffmpeg_cmd, merge_videos
+from musicalgestures._modelcache import get_model
+from musicalgestures._checkpoint import MgCheckpoint, frame_ranges
+from musicalgestures._trace import traced, span, accumulate
 import musicalgestures
-import itertools
+import multiprocessing
+import tempfile
+import shutil
 
 # implementation mainly inspired by: https://github.com/spmallick/learnopencv/blob/master/OpenPose/OpenPoseVideo.py
 
 
+@traced('pose')
 def pose(
         self,
         model='body_25',
@@ -21,7 +27,13 @@ def pose(
         save_video=True,
         target_name_video=None,
         target_name_data=None,
-        overwrite=False):
+        overwrite=False,
+        num_workers=1,
+        keyframe_interval=1,
+        motion_threshold=None,
+        confidence_decay=0.9,
+        checkpoint=False,
+        checkpoint_interval=1000):
     """
     Renders a video with the pose estimation (aka. "keypoint detection" or "skeleton tracking") overlaid on it. 
     Outputs the predictions in a text file containing the normalized x and y coordinates of each keypoints 
@@ -38,39 +50,40 @@ def pose(
         target_name_video (str, optional): Target output name for the video. Defaults to None (which assumes that the input filename with the suffix "_pose" should be used).
         target_name_data (str, optional): Target output name for the data. Defaults to None (which assumes that the input filename with the suffix "_pose" should be used).
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+        num_workers (int, optional): Number of worker processes to split the video between. Each worker loads its own copy of the network and processes a consecutive range of frames. Values below 1 use all available CPU cores. Defaults to 1 (no multiprocessing).
+        keyframe_interval (int, optional): Runs the network on every n-th frame only, and interpolates the keypoints of the frames in between. When interpolation is used the output data gets an additional 'Inferred' column, which is 1 for the frames the network was run on and 0 for the interpolated ones. Defaults to 1 (every frame).
+        motion_threshold (float, optional): If set, the network also runs on frames whose quantity of motion (the normalized mean absolute frame difference, from 0 to 1) since the last inferred frame exceeds this threshold. Combined with a large `keyframe_interval` this infers adaptively, only when the performers move. Defaults to None.
+        confidence_decay (float, optional): The factor applied to the confidence of interpolated keypoints for each frame of distance to the nearest inferred frame. Interpolated points decaying below `threshold` are discarded. Defaults to 0.9.
+        checkpoint (bool, optional): Whether to save the keypoints and video segments of each completed range of `checkpoint_interval` frames in a sidecar folder (with the suffix "_pose_checkpoint"). If a run is interrupted, rerunning it with the same parameters resumes from the last completed range. The folder is removed when the run finishes. Defaults to False.
+        checkpoint_interval (int, optional): The number of frames between checkpoints. Defaults to 1000.
 
     Returns:
         MgVideo: An MgVideo pointing to the output video.
     """
 
-    module_path = os.path.abspath(os.path.dirname(musicalgestures.__file__))
-
     if model.lower() == 'mpi':
-        protoFile = module_path + '/pose/mpi/pose_deploy_linevec_faster_4_stages.prototxt'
-        weightsFile = module_path + '/pose/mpi/pose_iter_160000.caffemodel'
         model = 'mpi'
         nPoints = 15
         POSE_PAIRS = [[0, 1], [1, 2], [2, 3], [3, 4], [1, 5], [5, 6], [6, 7], [
             1, 14], [14, 8], [8, 9], [9, 10], [14, 11], [11, 12], [12, 13]]
     elif model.lower() == 'coco':
-        protoFile = module_path + '/pose/coco/pose_deploy_linevec.prototxt'
-        weightsFile = module_path + '/pose/coco/pose_iter_440000.caffemodel'
         model = 'coco'
         nPoints = 18
         POSE_PAIRS = [[1, 0], [1, 2], [1, 5], [2, 3], [3, 4], [5, 6], [6, 7], [1, 8], [
             8, 9], [9, 10], [1, 11], [11, 12], [12, 13], [0, 14], [0, 15], [14, 16], [15, 17]]
     elif model.lower() == 'body_25':
-        protoFile = module_path + '/pose/body_25/pose_deploy.prototxt'
-        weightsFile = module_path + '/pose/body_25/pose_iter_584000.caffemodel'
         model = 'body_25'
         nPoints = 25
         POSE_PAIRS = [[1, 8], [1, 2], [1, 5], [2, 3], [3, 4], [5, 6], [6, 7], [8, 9], [9, 10], [10, 11], [8, 12], [12, 13], [
             13, 14], [1, 0], [0, 15], [15, 17], [0, 16], [16, 18], [14, 19], [19, 20], [14, 21], [11, 22], [22, 23], [11, 24]]
     else:
         print(f'Unrecognized model "{model}", switching to default (mpi).')
-        protoFile = module_path + '/pose/mpi/pose_deploy_linevec_faster_4_stages.prototxt'
-        weightsFile = module_path + '/pose/mpi/pose_iter_160000.caffemodel'
         model = 'mpi'
+        nPoints = 15
+        POSE_PAIRS = [[0, 1], [1, 2], [2, 3], [3, 4], [1, 5], [5, 6], [6, 7], [
+            1, 14], [14, 8], [8, 9], [9, 10], [14, 11], [11, 12], [12, 13]]
+
+    protoFile, weightsFile = pose_model_files(model)
 
     # Check if .caffemodel file exists, download if necessary
     if not os.path.exists(weightsFile):
@@ -85,22 +98,14 @@ def pose(
             print(f'Unrecognized answer "{answer}". Exiting...')
             return musicalgestures.MgVideo(self.filename, color=self.color, returned_by_process=True)
 
-    # Read the network into Memory
-    net = cv2.dnn.readNetFromCaffe(protoFile, weightsFile)
     device = device.lower()
     # enforce CPU device in Colab
     if in_colab() and device == 'gpu':
         print('Sorry, OpenCV GPU acceleration is not supported in Colab. Switching to CPU.')
         device = 'cpu'
-
-    if device == "cpu":
-        net.setPreferableBackend(cv2.dnn.DNN_TARGET_CPU)
-    elif device == "gpu":
-        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
-        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
-    else:
+    if device not in ['cpu', 'gpu']:
         print(f'Unrecognized device "{device}", switching to default (cpu).')
-        net.setPreferableBackend(cv2.dnn.DNN_TARGET_CPU)
+        device = 'cpu'
 
     of, fex = os.path.splitext(self.filename)
 
@@ -119,108 +124,60 @@ def pose(
     inWidth = int(roundup(self.width/downsampling_factor, 2))
     inHeight = int(roundup(self.height/downsampling_factor, 2))
 
-    pb = MgProgressbar(total=self.length, prefix='Rendering pose estimation video:')
-
     if save_video:
         if target_name_video == None:
             target_name_video = of + '_pose' + fex
         # if a target name was given we still enforce the .avi container anyway
         else:
-            target_name_video = os.path.splitext(target_name_video) + fex
+            target_name_video = os.path.splitext(target_name_video)[0] + fex
         if not overwrite:
             target_name_video = generate_outfilename(target_name_video)
-            
-    # Pipe video with FFmpeg for reading frame by frame
-    cmd = ['ffmpeg', '-y', '-i', filename] # define ffmpeg command        
-    process = ffmpeg_cmd(cmd, total_time=self.length, pipe='read')
-    video_out = None
-
-    ii = 0
-    data = []
-
-    while True:
-        # Read frame-by-frame
-        out = process.stdout.read(self.width*self.height*3)
-
-        if out == b'':
-            pb.progress(self.length)
-            break
-
-        # Transform the bytes read into a numpy array
-        frame = np.frombuffer(out, dtype=np.uint8).reshape([self.height, self.width, 3]) # height, width, channels
-
-        inpBlob = cv2.dnn.blobFromImage(frame, 1.0 / 255, (inWidth, inHeight), (0, 0, 0), swapRB=False, crop=False)
-        net.setInput(inpBlob)
-        output = net.forward()
-
-        H = output.shape[2]
-        W = output.shape[3]
-        points = []
-
-        for i in range(nPoints):
-
-            # confidence map of corresponding body's part.
-            probMap = output[0, i, :, :]
 
-            # Find global maxima of the probMap.
-            minVal, prob, minLoc, point = cv2.minMaxLoc(probMap)
-
-            # Scale the point to fit on the original image
-            x = (self.width * point[0]) / W
-            y = (self.height * point[1]) / H
-
-            if prob > threshold:
-                points.append((int(x), int(y)))
-
-            else:
-                points.append(None)
-
-        if save_data:
-            time = frame2ms(ii, self.fps)
-            points_list = [[list(point)[0]/self.width, list(point)[1]/self.height, ] if point != None else [
-                0, 0] for point in points]
-            points_list_flat = itertools.chain.from_iterable(points_list)
-            datapoint = [time]
-            datapoint += points_list_flat
-            data.append(datapoint)
-
-        for pair in POSE_PAIRS:
-            partA = pair[0]
-            partB = pair[1]
-
-            if points[partA] and points[partB]:
-                cv2.line(frame, points[partA], points[partB],
-                            (0, 255, 255), 2, lineType=cv2.LINE_AA)
-                cv2.circle(
-                    frame, points[partA], 4, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
-                cv2.circle(
-                    frame, points[partB], 4, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
-
-        if save_video:
-            if video_out is None:
-                cmd =['ffmpeg', '-y', '-s', '{}x{}'.format(frame.shape[1], frame.shape[0]), 
-                    '-r', str(self.fps), '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-vcodec', 'rawvideo', 
-                    '-i', '-', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', target_name_video]
-                video_out = ffmpeg_cmd(cmd, total_time=self.length, pipe='write')
-
-            video_out.stdin.write(frame.astype(np.uint8))
-            
-        # Flush the buffer
-        process.stdout.flush()
-        pb.progress(ii)
-        ii += 1
-
-    # Terminate the processes
-    if save_video:
-        video_out.stdin.close()
-        video_out.wait()
-        # Check if the original video fil has audio
-        if self.has_audio:
+    if num_workers is None or num_workers == 1:
+        num_workers = 1
+    elif num_workers < 1:
+        num_workers = multiprocessing.cpu_count()
+    # make sure every worker gets at least one frame
+    num_workers = max(1, min(num_workers, self.length))
+
+    mg_checkpoint, ranges = None, None
+    if checkpoint:
+        params = dict(
+            filename=os.path.abspath(filename), size=os.path.getsize(filename), length=self.length, model=model,
+            device=device, threshold=threshold, downsampling_factor=downsampling_factor, save_video=save_video,
+            keyframe_interval=keyframe_interval, motion_threshold=motion_threshold,
+            confidence_decay=confidence_decay, checkpoint_interval=checkpoint_interval)
+        mg_checkpoint = MgCheckpoint(of + '_pose_checkpoint', params)
+        ranges = frame_ranges(self.length, checkpoint_interval)
+
+    if num_workers == 1 and mg_checkpoint is None:
+        pb = MgProgressbar(total=self.length, prefix='Rendering pose estimation video:')
+        # Get the network from the model cache (reads it into memory on first use)
+        net = get_model(model, device)
+        keypoints, inferred = pose_frame_range(
+            net, filename, self.width, self.height, self.fps, inWidth, inHeight, nPoints, POSE_PAIRS, threshold,
+            target_name_video=target_name_video if save_video else None, pb=pb, length=self.length,
+            keyframe_interval=keyframe_interval, motion_threshold=motion_threshold, confidence_decay=confidence_decay)
+    else:
+        keypoints, inferred = pose_mp(
+            filename, self.width, self.height, self.fps, self.length, model, device, inWidth, inHeight,
+            nPoints, POSE_PAIRS, threshold, num_workers, target_name_video=target_name_video if save_video else None,
+            keyframe_interval=keyframe_interval, motion_threshold=motion_threshold, confidence_decay=confidence_decay,
+            ranges=ranges, checkpoint=mg_checkpoint)
+
+    # flag inferred and interpolated frames in the output data only if we interpolated
+    keyframe_mode = keyframe_interval > 1 or motion_threshold is not None
+
+    # Check if the original video file has audio
+    if save_video and self.has_audio:
+        with span('pose.audio_mux'):
             source_audio = extract_wav(of + fex)
             embed_audio_in_video(source_audio, target_name_video)
             os.remove(source_audio)
 
-    process.terminate()
+    if save_data:
+        data = keypoints_to_data(keypoints, self.width, self.height, self.fps, threshold,
+                                 inferred=inferred if keyframe_mode else None)
 
     def save_txt(of, width, height, model, data, data_format, target_name_data, overwrite):
         """
@@ -253,9 +210,18 @@ def pose(
                 headers.append(header_x)
                 headers.append(header_y)
 
+            int_columns = {'Time': int}
+            fmt_list = ['%d']
+            fmt_list += ['%.15f' for item in range(len(table_to_use)*2)]
+            # flag whether each frame was inferred or interpolated
+            if keyframe_mode:
+                headers.append('Inferred')
+                int_columns['Inferred'] = int
+                fmt_list.append('%d')
+
             data_format = data_format.lower()
 
-            df = pd.DataFrame(data=data, columns=headers)
+            df = pd.DataFrame(data=data, columns=headers).astype(int_columns)
 
             if data_format == "tsv":
 
@@ -274,9 +240,6 @@ def pose(
                         head_str += head + '\t'
                     head_str += '\n'
                     f.write(head_str.encode())
-                    fmt_list = ['%d']
-                    fmt_list += ['%.15f' for item in range(
-                        len(table_to_use)*2)]
                     np.savetxt(f, df.values, delimiter='\t', fmt=fmt_list)
 
             elif data_format == "csv":
@@ -309,9 +272,6 @@ def pose(
                         head_str += head + ' '
                     head_str += '\n'
                     f.write(head_str.encode())
-                    fmt_list = ['%d']
-                    fmt_list += ['%.15f' for item in range(
-                        len(table_to_use)*2)]
                     np.savetxt(f, df.values, delimiter=' ', fmt=fmt_list)
             elif data_format not in ["tsv", "csv", "txt"]:
                 print(
@@ -335,8 +295,13 @@ def pose(
                                  target_name_data=target_name_data, overwrite=overwrite)
 
     if save_data:
-        save_txt(of, self.width, self.height, model, data, data_format,
-                 target_name_data=target_name_data, overwrite=overwrite)
+        with span('pose.save_data'):
+            save_txt(of, self.width, self.height, model, data, data_format,
+                     target_name_data=target_name_data, overwrite=overwrite)
+
+    # the run is complete, the checkpoints are not needed anymore
+    if mg_checkpoint is not None:
+        mg_checkpoint.remove()
 
     if save_video:
         # save result as pose_video for parent MgVideo
@@ -347,6 +312,513 @@ def pose(
         return self
 
 
+def pose_model_files(model):
+    """
+    Gets the paths to the network description and weights of an OpenPose model.
+
+    Args:
+        model (str): 'body_25', 'mpi' or 'coco'.
+
+    Returns:
+        str: Path to the .prototxt file describing the network.
+        str: Path to the .caffemodel file containing the weights.
+    """
+    module_path = os.path.abspath(os.path.dirname(musicalgestures.__file__))
+
+    if model.lower() == 'mpi':
+        protoFile = module_path + '/pose/mpi/pose_deploy_linevec_faster_4_stages.prototxt'
+        weightsFile = module_path + '/pose/mpi/pose_iter_160000.caffemodel'
+    elif model.lower() == 'coco':
+        protoFile = module_path + '/pose/coco/pose_deploy_linevec.prototxt'
+        weightsFile = module_path + '/pose/coco/pose_iter_440000.caffemodel'
+    elif model.lower() == 'body_25':
+        protoFile = module_path + '/pose/body_25/pose_deploy.prototxt'
+        weightsFile = module_path + '/pose/body_25/pose_iter_584000.caffemodel'
+    else:
+        raise ValueError(f'Unrecognized model "{model}".')
+
+    return protoFile, weightsFile
+
+
+def load_pose_net(protoFile, weightsFile, device='cpu'):
+    """
+    Reads an OpenPose Caffe network into memory and sets its preferable backend.
+
+    Args:
+        protoFile (str): Path to the .prototxt file describing the network.
+        weightsFile (str): Path to the .caffemodel file containing the weights.
+        device (str, optional): Sets the backend to use for the neural network ('cpu' or 'gpu'). Defaults to 'cpu'.
+
+    Returns:
+        cv2.dnn.Net: The loaded network.
+    """
+    net = cv2.dnn.readNetFromCaffe(protoFile, weightsFile)
+    if device == "gpu":
+        net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA)
+        net.setPreferableTarget(cv2.dnn.DNN_TARGET_CUDA)
+    else:
+        net.setPreferableBackend(cv2.dnn.DNN_TARGET_CPU)
+    return net
+
+
+def decode_keypoints(output, nPoints, width, height, out=None):
+    """
+    Decodes the keypoints from the output tensor of the network. Finds the global maximum of all confidence maps
+    at once with a single reshape and argmax, and rescales the peaks to the resolution of the input frame.
+
+    Args:
+        output (np.array(float)): The output of the network, of shape (1, channels, H, W) or (channels, H, W). The first `nPoints` channels are the confidence maps of the keypoints.
+        nPoints (int): The number of keypoints the model outputs.
+        width (int): The width of the input frame.
+        height (int): The height of the input frame.
+        out (np.array(float), optional): An array of shape (nPoints, 3) to write the result into. Defaults to None (which allocates a new array).
+
+    Returns:
+        np.array(float): An array of shape (nPoints, 3) containing the x and y pixel coordinates and the confidence of each keypoint.
+    """
+    if output.ndim == 4:
+        output = output[0]
+    H, W = output.shape[1], output.shape[2]
+    probMaps = output[:nPoints].reshape(nPoints, H * W)
+
+    peaks = np.argmax(probMaps, axis=1)
+    py, px = np.divmod(peaks, W)
+
+    if out is None:
+        out = np.empty((nPoints, 3))
+    # Scale the points to fit on the original image
+    out[:, 0] = (width * px) / W
+    out[:, 1] = (height * py) / H
+    out[:, 2] = probMaps[np.arange(nPoints), peaks]
+    return out
+
+
+def estimate_pose(net, frame, width, height, inWidth, inHeight, nPoints, out=None):
+    """
+    Runs the network on a single frame and finds the most likely position of each keypoint.
+
+    Args:
+        net (cv2.dnn.Net): The loaded OpenPose network.
+        frame (np.array(uint8)): The input frame (height, width, channels).
+        width (int): The width of the input frame.
+        height (int): The height of the input frame.
+        inWidth (int): The width of the network input.
+        inHeight (int): The height of the network input.
+        nPoints (int): The number of keypoints the model outputs.
+        out (np.array(float), optional): An array of shape (nPoints, 3) to write the result into. Defaults to None (which allocates a new array).
+
+    Returns:
+        np.array(float): An array of shape (nPoints, 3) containing the x and y pixel coordinates and the confidence of each keypoint.
+    """
+    inpBlob = cv2.dnn.blobFromImage(frame, 1.0 / 255, (inWidth, inHeight), (0, 0, 0), swapRB=False, crop=False)
+    net.setInput(inpBlob)
+    output = net.forward()
+    return decode_keypoints(output, nPoints, width, height, out=out)
+
+
+def keypoints_to_data(keypoints, width, height, fps, threshold, inferred=None):
+    """
+    Converts an array of keypoints to the rows of the exported pose data: the time in milliseconds followed by the
+    normalized x and y coordinates of each keypoint. Points below `threshold` are substituted with (0, 0).
+
+    Args:
+        keypoints (np.array(float)): An array of shape (frames, nPoints, 3) with the x, y pixel coordinates and the confidence of each keypoint.
+        width (int): The width of the video.
+        height (int): The height of the video.
+        fps (float): The FPS of the video.
+        threshold (float): The confidence threshold that decides whether we keep or discard a predicted point.
+        inferred (np.array(bool), optional): An array of shape (frames,) flagging the frames the network was run on. If given, it is appended as the last column. Defaults to None.
+
+    Returns:
+        np.array(float): An array of shape (frames, 1 + nPoints*2), or (frames, 2 + nPoints*2) if `inferred` is given.
+    """
+    frames, nPoints = keypoints.shape[0], keypoints.shape[1]
+    found = keypoints[:, :, 2] > threshold
+    points = np.zeros((frames, nPoints, 2))
+    points[:, :, 0] = np.where(found, np.trunc(keypoints[:, :, 0]) / width, 0)
+    points[:, :, 1] = np.where(found, np.trunc(keypoints[:, :, 1]) / height, 0)
+    time = np.round(np.arange(frames) / fps * 1000)
+    columns = [time, points.reshape(frames, nPoints * 2)]
+    if inferred is not None:
+        columns.append(inferred)
+    return np.column_stack(columns)
+
+
+def draw_pose(frame, keypoints, POSE_PAIRS, threshold):
+    """
+    Draws the skeleton described by `keypoints` on a frame (in place).
+
+    Args:
+        frame (np.array(uint8)): The frame to draw on.
+        keypoints (np.array(float)): An array of shape (nPoints, 3) with the x, y coordinates and the confidence of each keypoint.
+        POSE_PAIRS (list): The pairs of keypoint indices to connect with lines.
+        threshold (float): The confidence threshold below which keypoints are not drawn.
+    """
+    points = [(int(x), int(y)) if prob > threshold else None for x, y, prob in keypoints]
+
+    for pair in POSE_PAIRS:
+        partA = pair[0]
+        partB = pair[1]
+
+        if points[partA] and points[partB]:
+            cv2.line(frame, points[partA], points[partB],
+                     (0, 255, 255), 2, lineType=cv2.LINE_AA)
+            cv2.circle(
+                frame, points[partA], 4, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
+            cv2.circle(
+                frame, points[partB], 4, (0, 0, 255), thickness=-1, lineType=cv2.FILLED)
+
+
+def interpolate_keypoints(keypoints, start, end, threshold, confidence_decay=0.9):
+    """
+    Fills the keypoints of the frames between two inferred frames (in place). Points found in both inferred frames are
+    linearly interpolated, points found in only one of them are held at that position. The interpolated confidences
+    are multiplied by `confidence_decay` for each frame of distance to the nearest inferred frame.
+
+    Args:
+        keypoints (np.array(float)): An array of shape (frames, nPoints, 3) with the x, y pixel coordinates and the confidence of each keypoint.
+        start (int): The index of the first inferred frame.
+        end (int): The index of the second inferred frame.
+        threshold (float): The confidence threshold that decides whether a point was found.
+        confidence_decay (float, optional): The factor applied to the confidence for each frame of distance to the nearest inferred frame. Defaults to 0.9.
+    """
+    gap = end - start
+    if gap < 2:
+        return
+
+    key_a, key_b = keypoints[start], keypoints[end]
+    steps = np.arange(1, gap)
+    t = (steps / gap)[:, None]
+
+    xy = key_a[:, :2] + t[:, :, None] * (key_b[:, :2] - key_a[:, :2])
+    conf = key_a[:, 2] + t * (key_b[:, 2] - key_a[:, 2])
+
+    found_a, found_b = key_a[:, 2] > threshold, key_b[:, 2] > threshold
+    only_a, only_b = found_a & ~found_b, found_b & ~found_a
+    xy[:, only_a], conf[:, only_a] = key_a[only_a, :2], key_a[only_a, 2]
+    xy[:, only_b], conf[:, only_b] = key_b[only_b, :2], key_b[only_b, 2]
+
+    decay = confidence_decay ** np.minimum(steps, gap - steps)
+    keypoints[start + 1:end, :, :2] = xy
+    keypoints[start + 1:end, :, 2] = conf * decay[:, None]
+
+
+def frame_motion(frame, reference):
+    """
+    Measures the quantity of motion between two (grayscale) frames as their normalized mean absolute difference.
+
+    Args:
+        frame (np.array(uint8)): The current frame.
+        reference (np.array(uint8)): The frame to compare with.
+
+    Returns:
+        float: The quantity of motion in the range of 0 to 1.
+    """
+    return cv2.absdiff(frame, reference).mean() / 255
+
+
+def pose_frame_range(
+        net,
+        filename,
+        width,
+        height,
+        fps,
+        inWidth,
+        inHeight,
+        nPoints,
+        POSE_PAIRS,
+        threshold,
+        start_frame=0,
+        num_frames=None,
+        target_name_video=None,
+        pb=None,
+        length=None,
+        keyframe_interval=1,
+        motion_threshold=None,
+        confidence_decay=0.9):
+    """
+    Estimates the pose on a consecutive range of frames of a video, optionally rendering the overlay video of the range.
+    The network can be run on keyframes only, in which case the keypoints of the frames in between are interpolated.
+
+    Args:
+        net (cv2.dnn.Net): The loaded OpenPose network.
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        inWidth (int): The width of the network input.
+        inHeight (int): The height of the network input.
+        nPoints (int): The number of keypoints the model outputs.
+        POSE_PAIRS (list): The pairs of keypoint indices to connect with lines in the overlay video.
+        threshold (float): The confidence threshold below which keypoints are not drawn.
+        start_frame (int, optional): The first frame of the range. Defaults to 0.
+        num_frames (int, optional): The number of frames in the range. Defaults to None (which reads until the end of the video).
+        target_name_video (str, optional): Target output name for the overlay video. Defaults to None (which means no video is rendered).
+        pb (MgProgressbar, optional): A progress bar to update after each frame. Defaults to None.
+        length (int, optional): The expected number of frames to read when `num_frames` is None, used to preallocate the keypoint array. Defaults to None.
+        keyframe_interval (int, optional): Runs the network on every n-th frame only. Defaults to 1 (every frame).
+        motion_threshold (float, optional): If set, the network also runs on frames whose quantity of motion (0 to 1) since the last inferred frame exceeds this threshold. Defaults to None.
+        confidence_decay (float, optional): The factor applied to the confidence of interpolated keypoints for each frame of distance to the nearest inferred frame. Defaults to 0.9.
+
+    Returns:
+        np.array(float): An array of shape (frames, nPoints, 3) containing the x and y pixel coordinates and the confidence of each keypoint.
+        np.array(bool): An array of shape (frames,) which is True for the frames the network was run on, and False for the interpolated ones.
+    """
+    cmd = ['ffmpeg', '-y']
+    if start_frame > 0:
+        # seek half a frame early to make sure the first frame of the range is not skipped due to rounding
+        cmd += ['-ss', '{:.6f}'.format((start_frame - 0.5) / fps)]
+    cmd += ['-i', filename]
+    if num_frames is not None:
+        cmd += ['-frames:v', str(num_frames)]
+    total_time = num_frames / fps if num_frames is not None else 0
+
+    # Pipe video with FFmpeg for reading frame by frame
+    process = ffmpeg_cmd(cmd, total_time=total_time, pipe='read')
+
+    video_out = None
+    if target_name_video is not None:
+        cmd = ['ffmpeg', '-y', '-s', '{}x{}'.format(width, height),
+               '-r', str(fps), '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-vcodec', 'rawvideo',
+               '-i', '-', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', target_name_video]
+        video_out = ffmpeg_cmd(cmd, total_time=total_time, pipe='write')
+
+    # preallocate the keypoint array, grown if the video turns out to be longer than expected
+    expected_frames = num_frames if num_frames is not None else (length or 0)
+    keypoints = np.zeros((max(1, expected_frames), nPoints, 3))
+    inferred = np.zeros(max(1, expected_frames), dtype=bool)
+
+    keyframe_interval = max(1, int(keyframe_interval))
+    last_keyframe = None
+    keyframe_small = None
+    # frames waiting for the next inferred frame before they can be interpolated and written
+    pending = []
+
+    ii = 0
+
+    while True:
+        # Read frame-by-frame
+        with accumulate('pose.decode'):
+            out = process.stdout.read(width*height*3)
+
+        if out == b'':
+            break
+
+        # Transform the bytes read into a numpy array
+        frame = np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3]) # height, width, channels
+
+        if ii == len(keypoints):
+            keypoints = np.concatenate([keypoints, np.zeros_like(keypoints)], axis=0)
+            inferred = np.concatenate([inferred, np.zeros_like(inferred)])
+
+        is_keyframe = ii % keyframe_interval == 0
+        if motion_threshold is not None:
+            small = cv2.cvtColor(cv2.resize(frame, (inWidth, inHeight)), cv2.COLOR_BGR2GRAY)
+            if not is_keyframe:
+                is_keyframe = frame_motion(small, keyframe_small) > motion_threshold
+            if is_keyframe:
+                keyframe_small = small
+
+        pending.append((ii, frame.copy() if video_out is not None else None))
+
+        if is_keyframe:
+            with accumulate('pose.inference'):
+                estimate_pose(net, frame, width, height, inWidth, inHeight, nPoints, out=keypoints[ii])
+            inferred[ii] = True
+            if last_keyframe is not None:
+                interpolate_keypoints(keypoints, last_keyframe, ii, threshold, confidence_decay)
+            last_keyframe = ii
+            with accumulate('pose.encode'):
+                write_pose_frames(video_out, pending, keypoints, POSE_PAIRS, threshold)
+            pending = []
+
+        # Flush the buffer
+        process.stdout.flush()
+        if pb is not None:
+            pb.progress(start_frame + ii)
+        ii += 1
+
+    # the last frame of the range is always inferred so that the remaining frames can be interpolated
+    if len(pending) > 0:
+        last = pending[-1][0]
+        # `frame` still holds the last frame read
+        estimate_pose(net, frame, width, height, inWidth, inHeight, nPoints, out=keypoints[last])
+        inferred[last] = True
+        interpolate_keypoints(keypoints, last_keyframe, last, threshold, confidence_decay)
+        write_pose_frames(video_out, pending, keypoints, POSE_PAIRS, threshold)
+
+    # Terminate the processes
+    if video_out is not None:
+        video_out.stdin.close()
+        video_out.wait()
+    process.terminate()
+
+    if pb is not None:
+        pb.progress(pb.total)
+
+    return keypoints[:ii], inferred[:ii]
+
+
+def write_pose_frames(video_out, frames, keypoints, POSE_PAIRS, threshold):
+    """
+    Draws the skeletons on a list of frames and writes them to the overlay video.
+
+    Args:
+        video_out (subprocess.Popen): The ffmpeg process writing the overlay video, or None if no video is rendered.
+        frames (list): A list of (frame index, frame) tuples.
+        keypoints (np.array(float)): An array of shape (frames, nPoints, 3) with the x, y pixel coordinates and the confidence of each keypoint.
+        POSE_PAIRS (list): The pairs of keypoint indices to connect with lines.
+        threshold (float): The confidence threshold below which keypoints are not drawn.
+    """
+    if video_out is None:
+        return
+    for index, frame in frames:
+        draw_pose(frame, keypoints[index], POSE_PAIRS, threshold)
+        video_out.stdin.write(frame.astype(np.uint8))
+
+
+# the network loaded by each worker process of pose_mp
+_worker_net = None
+
+
+def _init_pose_worker(model, device):
+    """
+    Pool initializer for pose_mp. Loads the network once per worker process.
+    """
+    global _worker_net
+    # avoid oversubscribing the cores with OpenCV's own threads
+    cv2.setNumThreads(1)
+    _worker_net = get_model(model, device)
+
+
+def _pose_worker(args):
+    """
+    Pool task for pose_mp. Estimates the pose on one frame range using the network of the worker process.
+    """
+    return args[9], pose_frame_range(_worker_net, *args)
+
+
+def pose_mp(
+        filename,
+        width,
+        height,
+        fps,
+        length,
+        model,
+        device,
+        inWidth,
+        inHeight,
+        nPoints,
+        POSE_PAIRS,
+        threshold,
+        num_workers,
+        target_name_video=None,
+        keyframe_interval=1,
+        motion_threshold=None,
+        confidence_decay=0.9,
+        ranges=None,
+        checkpoint=None):
+    """
+    Estimates the pose on a video in parallel by splitting it into consecutive frame ranges, which are processed by a pool of worker processes.
+    The keypoints of the ranges are concatenated in order, and the overlay video segments (if any) are merged into `target_name_video`.
+    If a checkpoint is given, the results of each range are saved as soon as it completes, and ranges completed by a previous run are skipped.
+
+    Args:
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        length (int): The number of frames in the input video.
+        model (str): The OpenPose model to use ('body_25', 'mpi' or 'coco').
+        device (str): Sets the backend to use for the neural network ('cpu' or 'gpu').
+        inWidth (int): The width of the network input.
+        inHeight (int): The height of the network input.
+        nPoints (int): The number of keypoints the model outputs.
+        POSE_PAIRS (list): The pairs of keypoint indices to connect with lines in the overlay video.
+        threshold (float): The confidence threshold below which keypoints are not drawn.
+        num_workers (int): The number of worker processes. If 1, the ranges are processed one after the other in this process.
+        target_name_video (str, optional): Target output name for the overlay video. Defaults to None (which means no video is rendered).
+        keyframe_interval (int, optional): Runs the network on every n-th frame only. Defaults to 1 (every frame).
+        motion_threshold (float, optional): If set, the network also runs on frames whose quantity of motion (0 to 1) since the last inferred frame exceeds this threshold. Defaults to None.
+        confidence_decay (float, optional): The factor applied to the confidence of interpolated keypoints for each frame of distance to the nearest inferred frame. Defaults to 0.9.
+        ranges (list, optional): A list of [start frame, number of frames] pairs to split the video into. Defaults to None (which splits it into one range per worker).
+        checkpoint (MgCheckpoint, optional): Where to save the results and video segments of the completed ranges. Defaults to None.
+
+    Returns:
+        np.array(float): An array of shape (frames, nPoints, 3) containing the x and y pixel coordinates and the confidence of each keypoint.
+        np.array(bool): An array of shape (frames,) which is True for the frames the network was run on, and False for the interpolated ones.
+    """
+    if ranges is None:
+        ranges = frame_ranges(length, -(-length // num_workers))
+    fex = os.path.splitext(target_name_video)[1] if target_name_video is not None else None
+
+    temp_folder = tempfile.mkdtemp()
+    segments = []
+    feed_args = []
+    for start_frame, num_frames in ranges:
+        if target_name_video is None:
+            segment = None
+        elif checkpoint is not None:
+            segment = checkpoint.segment(start_frame, fex)
+        else:
+            segment = os.path.join(temp_folder, f'pose_{start_frame:09d}{fex}')
+        segments.append(segment)
+        if checkpoint is not None and checkpoint.done(start_frame):
+            continue
+        feed_args.append((filename, width, height, fps, inWidth, inHeight, nPoints, POSE_PAIRS,
+                          threshold, start_frame, num_frames, segment, None, length - start_frame,
+                          keyframe_interval, motion_threshold, confidence_decay))
+
+    pb = MgProgressbar(total=len(ranges), prefix='Rendering pose estimation video:')
+    completed = len(ranges) - len(feed_args)
+    pb.progress(completed)
+    results = {}
+
+    pool = None
+    if num_workers == 1:
+        net = get_model(model, device)
+        range_results = ((args[9], pose_frame_range(net, *args)) for args in feed_args)
+    elif len(feed_args) > 0:
+        pool = multiprocessing.Pool(min(num_workers, len(feed_args)), initializer=_init_pose_worker,
+                                    initargs=(model, device))
+        range_results = pool.imap_unordered(_pose_worker, feed_args)
+    else:
+        range_results = []
+
+    try:
+        for start_frame, (range_keypoints, range_inferred) in range_results:
+            if checkpoint is not None:
+                checkpoint.save(start_frame, keypoints=range_keypoints, inferred=range_inferred)
+            else:
+                results[start_frame] = range_keypoints, range_inferred
+            completed += 1
+            pb.progress(completed)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    keypoints, inferred = [], []
+    for start_frame, _ in ranges:
+        if checkpoint is not None:
+            saved = checkpoint.load(start_frame)
+            range_keypoints, range_inferred = saved['keypoints'], saved['inferred']
+        else:
+            range_keypoints, range_inferred = results[start_frame]
+        keypoints.append(range_keypoints)
+        inferred.append(range_inferred)
+
+    if target_name_video is not None:
+        if len(segments) == 1:
+            shutil.copyfile(segments[0], target_name_video)
+        else:
+            merge_videos(segments, target_name=target_name_video, overwrite=True)
+
+    shutil.rmtree(temp_folder)
+
+    return np.concatenate(keypoints, axis=0), np.concatenate(inferred)
+
+
 def download_model(modeltype):
     """
     Helper function to automatically download model (.caffemodel) files.
@@ -15,6 +15,7 @@ from musicalgestures._motionvideo import mg_motiongrams
 from musicalgestures._videograms import videograms_ffmpeg
 from musicalgestures._mglist import MgList
 from musicalgestures._utils import MgProgressbar, MgImage, MgFigure, has_audio, generate_outfilename, get_widthheight
+from musicalgestures._trace import traced
 
 def smooth_downsample_feature_sequence(X, sr, filt_len=41, down_sampling=10, w_type='boxcar'):
     """
@@ -45,6 +46,7 @@ def smooth_downsample_feature_sequence(X, sr, filt_len=41, down_sampling=10, w_t
     sr_feature = sr / down_sampling
     return X_smooth, sr_feature, formatter
 
+@traced('ssm.dot')
 def slow_dot(X, Y, length):
     """
     Low-memory implementation of dot product
@@ -64,6 +66,7 @@ def slow_dot(X, Y, length):
         pb.progress(length)
     return S
 
+@traced('ssm')
 def mg_ssm(
         self,
         features='motiongrams',
@@ -327,11 +330,12 @@ def mg_ssm(
             print('The video has no audio track.')
             return
 
-        sr = librosa.get_samplerate(self.filename)
-        x, sr = librosa.load(self.filename, sr=sr)
+        # the MgAudio memoizes the decoded signal and its spectrograms, shared with its figures
+        audio = self.audio if hasattr(self, 'audio') else self
+        sr = audio.sr
         frame_length = 512
         hop_length = 128
-        spectrogram = np.abs(librosa.stft(x, n_fft=frame_length, hop_length=hop_length))
+        spectrogram = audio.features(n_fft=frame_length, hop_length=hop_length)
 
         X, sr_X, formatter = smooth_downsample_feature_sequence(spectrogram, sr/hop_length)
         # Normalize columns of the feature sequence
@@ -381,11 +385,12 @@ def mg_ssm(
             print('The video has no audio track.')
             return
 
-        sr = librosa.get_samplerate(self.filename)
-        x, sr = librosa.load(self.filename, sr=sr)
+        # the MgAudio memoizes the decoded signal and its spectrograms, shared with its figures
+        audio = self.audio if hasattr(self, 'audio') else self
+        sr = audio.sr
         frame_length = 512
         hop_length = 128
-        spectrogram = np.abs(librosa.stft(x, n_fft=frame_length, hop_length=hop_length))
+        spectrogram = audio.features(n_fft=frame_length, hop_length=hop_length)
         chromagram = librosa.feature.chroma_stft(S=spectrogram, sr=sr, hop_length=hop_length, n_fft=frame_length)
 
         X, sr_X, formatter = smooth_downsample_feature_sequence(chromagram, sr/hop_length)
@@ -442,12 +447,13 @@ def mg_ssm(
             print('The video has no audio track.')
             return
 
-        sr = librosa.get_samplerate(self.filename)
-        x, sr = librosa.load(self.filename, sr=sr)
+        # the MgAudio memoizes the decoded signal and its spectrograms, shared with its figures
+        audio = self.audio if hasattr(self, 'audio') else self
+        sr = audio.sr
         frame_length = 1024
         hop_length = 512
 
-        oenv = librosa.onset.onset_strength(y=x, sr=sr, hop_length=hop_length)
+        oenv = audio.onset_strength(n_fft=2048, hop_length=hop_length)
         tempogram = librosa.feature.tempogram(onset_envelope=oenv, sr=sr, hop_length=hop_length, win_length=frame_length)
         # Estimate the global tempo for display purposes
         tempo = librosa.beat.tempo(onset_envelope=oenv, sr=sr, hop_length=hop_length)[0]
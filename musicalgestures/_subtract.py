@@ -1,9 +1,63 @@
 
 import os
+import cv2
+import numpy as np
+import multiprocessing.pool
 import matplotlib
 
 import musicalgestures
-from musicalgestures._utils import generate_outfilename, pass_if_container_is, get_length, ffmpeg_cmd
+from musicalgestures._utils import generate_outfilename, pass_if_container_is, get_length, ffmpeg_cmd, seek_frame
+from musicalgestures._blend import frame_stats
+
+# estimated backgrounds, keyed by (file, size, modification time, samples)
+_backgrounds = {}
+
+
+def median_background(filename, width, height, fps, length, samples=25, target_name=None, overwrite=False):
+    """
+    Estimates the background of a video as the per-pixel temporal median of frames sampled at evenly spaced times.
+    Only the sampled frames are decoded (seeking in parallel), and the result is cached for the file and number of samples.
+
+    Args:
+        filename (str): Path to the input video file.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        fps (float): The FPS of the input video.
+        length (int): The number of frames in the input video.
+        samples (int, optional): The number of frames to sample. Defaults to 25.
+        target_name (str, optional): Target output name for the background image. Defaults to None (which assumes filename + "_background_<samples>.png").
+        overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+
+    Returns:
+        str: Path to the background image (.png).
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime, int(samples))
+    if key in _backgrounds and os.path.isfile(_backgrounds[key]):
+        return _backgrounds[key]
+
+    duration = length / fps
+    samples = max(1, min(int(samples), length))
+    times = [(i + 0.5) * duration / samples for i in range(samples)]
+
+    with multiprocessing.pool.ThreadPool(min(samples, 8)) as pool:
+        frames = [frame for frame in pool.map(lambda time: seek_frame(filename, time, width, height), times)
+                  if frame is not None]
+    if len(frames) == 0:
+        # the frame count was overestimated, fall back to the first frame
+        frames = [seek_frame(filename, 0, width, height)]
+
+    background = np.median(np.stack(frames), axis=0).round().astype(np.uint8)
+
+    if target_name is None:
+        target_name = os.path.splitext(filename)[0] + f'_background_{key[3]}.png'
+    if not overwrite:
+        target_name = generate_outfilename(target_name)
+    cv2.imwrite(target_name, background)
+    _backgrounds[key] = target_name
+
+    return target_name
+
 
 def mg_subtract(
         self,
@@ -16,6 +70,8 @@ def mg_subtract(
         kernel_size=5,
         bg_img=None,
         bg_color='#000000',
+        bg_method='median',
+        bg_samples=25,
         target_name=None,
         overwrite=False):
     """
@@ -29,8 +85,10 @@ def mg_subtract(
         curves (int, optional): Apply curves and equalisation threshold filter to subtract the background. Ranges from 0 to 1. Defaults to 0.15.
         use_median (bool, optional): If True the algorithm applies a median filter on the thresholded frame-difference stream. Defaults to False.
         kernel_size (int, optional): Size of the median filter (if `use_median=True`) or the erosion filter (if `filtertype='blob'`). Defaults to 5.
-        bg_img (str, optional): Path to a background image (.png) that needs to be subtracted from the video. If set to None, it uses an average image of all frames in the video. Defaults to None.
+        bg_img (str, optional): Path to a background image (.png) that needs to be subtracted from the video. If set to None, the background is estimated from the video (see `bg_method`). Defaults to None.
         bg_color (str, optional): Set the background color in the video file in hex value. Defaults to '#000000' (black). 
+        bg_method (str, optional): How to estimate the background when `bg_img` is None. 'median' takes the per-pixel median of `bg_samples` frames sampled evenly across the video, which is fast and robust to people passing by. 'average' takes the mean of all frames. Defaults to 'median'.
+        bg_samples (int, optional): The number of frames sampled for the 'median' background. Defaults to 25.
         target_name (str, optional): Target output name for the motiongram. Defaults to None.
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
 
@@ -49,8 +107,17 @@ def mg_subtract(
     width, height = self.width, self.height
 
     if bg_img == None:
-        # Render an average image of the video file for background subtraction
-        bg_img = musicalgestures.MgVideo(self.filename).blend(component_mode='average').filename
+        if bg_method.lower() == 'average':
+            # Render an average image of the video file for background subtraction
+            stats = frame_stats(self.filename, width, height, self.fps, self.length, pb_prefix='Rendering average image:')
+            bg_img = of + '_average.png'
+            if not overwrite:
+                bg_img = generate_outfilename(bg_img)
+            cv2.imwrite(bg_img, np.round(stats['sum'] / max(1, stats['count'])).astype(np.uint8))
+        else:
+            # Estimate the background from a few frames sampled across the video
+            bg_img = median_background(self.filename, width, height, self.fps, self.length, samples=bg_samples,
+                                       target_name=f'{self.of}_background_{int(bg_samples)}.png', overwrite=overwrite)
     else:
         # Check if background image extension is .png or not
         pass_if_container_is(".png", bg_img)
@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import functools
+import subprocess
+
+# the active MgTrace, None when tracing is disabled
+_tracer = None
+# returned by `span` and `accumulate` when tracing is disabled, so that a disabled span costs one function call
+_disabled = contextlib.nullcontext()
+
+
+class MgTrace():
+    """
+    Records how long the stages of the processes take (see `span` and `accumulate`) and counts the subprocesses launched (e.g. ffmpeg and ffprobe) while it is active.
+    The results can be printed as a summary table or exported as a Chrome trace (JSON), which can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+    Use it as a context manager (or call `start` and `stop`), only one MgTrace can be active at a time:
+
+        with musicalgestures.trace() as t:
+            mv.motion()
+        print(t.summary())
+        t.to_chrome('motion_trace.json')
+    """
+
+    def __init__(self):
+        """
+        Initializes the MgTrace object.
+        """
+        self.events = []
+        self.totals = {}
+        self.launches = {}
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+        self._popen = None
+        self._system = None
+
+    def start(self):
+        """
+        Starts recording. Subprocess launches are counted until `stop` is called.
+
+        Raises:
+            RuntimeError: If another MgTrace is already active.
+        """
+        global _tracer
+        if _tracer is not None:
+            raise RuntimeError('Another MgTrace is already active.')
+
+        self._popen, self._system = subprocess.Popen, os.system
+        tracer = self
+
+        class CountingPopen(self._popen):
+            def __init__(self, args, *pargs, **kwargs):
+                tracer.count_launch(args)
+                super().__init__(args, *pargs, **kwargs)
+
+        def counting_system(command):
+            tracer.count_launch(command)
+            return tracer._system(command)
+
+        # subprocess.run and friends look Popen up in the subprocess module, so they are counted as well
+        subprocess.Popen, os.system = CountingPopen, counting_system
+        self.start_time = time.perf_counter()
+        _tracer = self
+        return self
+
+    def stop(self):
+        """
+        Stops recording.
+        """
+        global _tracer
+        if _tracer is self:
+            subprocess.Popen, os.system = self._popen, self._system
+            self.end_time = time.perf_counter()
+            _tracer = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count_launch(self, command):
+        """
+        Counts the launch of a subprocess by the name of its program.
+
+        Args:
+            command (list or str): The command of the subprocess.
+        """
+        if isinstance(command, (list, tuple)):
+            program = command[0] if len(command) > 0 else ''
+        else:
+            program = str(command).split(' ')[0]
+        program = os.path.splitext(os.path.basename(str(program)))[0]
+        with self._lock:
+            self.launches[program] = self.launches.get(program, 0) + 1
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """
+        Records the time spent in the block as one event.
+
+        Args:
+            name (str): The name of the stage, e.g. 'motion.plot'.
+            **args: Additional (JSON serializable) information shown with the event.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.events.append(dict(name=name, start=start, duration=end - start, thread=threading.get_ident(), args=args))
+
+    @contextlib.contextmanager
+    def accumulate(self, name):
+        """
+        Adds the time spent in the block to the total of a stage, for stages interleaved in loops (such as decoding, analysing and encoding each frame), which would produce one event per frame otherwise.
+
+        Args:
+            name (str): The name of the stage, e.g. 'motion.decode'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                total, count = self.totals.get(name, (0.0, 0))
+                self.totals[name] = (total + duration, count + 1)
+
+    def summary(self):
+        """
+        Summarizes the recorded stages and subprocess launches as a table.
+
+        Returns:
+            str: The summary table, one row per stage (with the number of calls, the total and mean time in seconds) and per launched program.
+        """
+        stages = {}
+        for event in self.events:
+            total, count = stages.get(event['name'], (0.0, 0))
+            stages[event['name']] = (total + event['duration'], count + 1)
+        stages.update(self.totals)
+
+        width = max([len(name) for name in list(stages) + list(self.launches)] + [5])
+        lines = [f"{'stage':<{width}}  {'calls':>8}  {'total (s)':>10}  {'mean (s)':>10}"]
+        for name, (total, count) in sorted(stages.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:<{width}}  {count:>8}  {total:>10.4f}  {total / count:>10.4f}")
+        for program, count in sorted(self.launches.items()):
+            lines.append(f"{program + ' launches':<{width}}  {count:>8}")
+        if self.start_time is not None:
+            end = self.end_time if self.end_time is not None else time.perf_counter()
+            lines.append(f"{'wall time':<{width}}  {'':>8}  {end - self.start_time:>10.4f}")
+        return '\n'.join(lines)
+
+    def to_chrome(self, target_name):
+        """
+        Exports the recorded spans as a Chrome trace (JSON), which can be opened in chrome://tracing or https://ui.perfetto.dev.
+        The accumulated stage totals and subprocess launch counts are stored in the 'otherData' field.
+
+        Args:
+            target_name (str): The name of the output JSON file.
+
+        Returns:
+            str: The name of the output file.
+        """
+        origin = self.start_time if self.start_time is not None else 0.0
+        trace_events = [dict(name=event['name'], ph='X', pid=os.getpid(), tid=event['thread'],
+                             ts=(event['start'] - origin) * 1e6, dur=event['duration'] * 1e6, args=event['args'])
+                        for event in self.events]
+        other_data = dict(accumulated={name: dict(total=total, calls=count) for name, (total, count) in self.totals.items()},
+                          launches=self.launches)
+        with open(target_name, 'w') as f:
+            json.dump(dict(traceEvents=trace_events, displayTimeUnit='ms', otherData=other_data), f)
+        return target_name
+
+    def __repr__(self):
+        return f"MgTrace({len(self.events)} events, {sum(self.launches.values())} subprocess launches)"
+
+
+def trace():
+    """
+    Creates an MgTrace to record a run with, see `MgTrace`.
+
+    Returns:
+        MgTrace: A new (inactive) MgTrace.
+    """
+    return MgTrace()
+
+
+def span(name, **args):
+    """
+    Records the time spent in a `with` block as one event of the active MgTrace. Does nothing if tracing is disabled.
+
+    Args:
+        name (str): The name of the stage, e.g. 'motion.plot'.
+        **args: Additional (JSON serializable) information shown with the event.
+    """
+    tracer = _tracer
+    return _disabled if tracer is None else tracer.span(name, **args)
+
+
+def accumulate(name):
+    """
+    Adds the time spent in a `with` block to the total of a stage of the active MgTrace. Does nothing if tracing is disabled.
+
+    Args:
+        name (str): The name of the stage, e.g. 'motion.decode'.
+    """
+    tracer = _tracer
+    return _disabled if tracer is None else tracer.accumulate(name)
+
+
+def traced(name):
+    """
+    Decorator recording each call of a function as a span (see `span`).
+
+    Args:
+        name (str): The name of the span.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return function(*args, **kwargs)
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,4 +1,6 @@
+import functools
 from typing import Union, Tuple
+from musicalgestures._lazy import lazy_method
 
 class MgProgressbar():
     """
@@ -190,7 +192,7 @@ class MgImage():
         import os
         self.of = os.path.splitext(self.filename)[0]
         self.fex = os.path.splitext(self.filename)[1]
-    from musicalgestures._show import mg_show as show
+    show = lazy_method('musicalgestures._show', 'mg_show')
 
     def __repr__(self):
         return f"MgImage('{self.filename}')"
@@ -626,6 +628,153 @@ def extract_frame(
     return target_name
 
 
+def group_frames(frames, max_gap, max_span):
+    """
+    Groups frame numbers into decode windows: the sorted (unique) frames are added to the current window while they are at most
+    `max_gap` frames after its last frame and less than `max_span` frames after its first frame, otherwise they start a new window.
+
+    Args:
+        frames (list): The frame numbers.
+        max_gap (float): The largest gap (in frames) between two frames of a window.
+        max_span (float): The largest span (in frames) of a window, from its first to its last frame.
+
+    Returns:
+        list: The windows as lists of sorted frame numbers.
+    """
+    groups = []
+    for frame in sorted(set(frames)):
+        if len(groups) > 0 and frame - groups[-1][-1] <= max_gap and frame - groups[-1][0] <= max_span:
+            groups[-1].append(frame)
+        else:
+            groups.append([frame])
+    return groups
+
+
+def extract_frames(
+    filename: str,
+    frames: list=None,
+    times: list=None,
+    target_name: str=None,
+    return_array: bool=False,
+    max_gap: float=1.0,
+    max_span: float=10.0,
+    num_workers: int=None,
+    overwrite: bool=False,
+    ):
+    """
+    Extracts a batch of frames from a video using ffmpeg. The requested frames are sorted and grouped, so that frames which are
+    close to each other are read in a single decode window (seeking to its start), while isolated frames are read with one accurate
+    seek each. The windows are streamed, keeping only the requested frames, and decoded concurrently.
+
+    Args:
+        filename (str): Path to the input video file.
+        frames (list, optional): The frame numbers to extract. Defaults to None.
+        times (list, optional): The times (s) where to extract the frames from. Defaults to None.
+        target_name (str, optional): The base name for the output files, which get the suffix "_frame_\<frame number\>.png". If None, the input name is used. Defaults to None.
+        return_array (bool, optional): Whether to return the frames as an array instead of writing them to image files. Defaults to False.
+        max_gap (float, optional): The largest gap (s) between two requested frames that are still read in the same decode window. Defaults to 1.0.
+        max_span (float, optional): The longest span (s) of a decode window, after which a new window is started with a seek. Defaults to 10.0.
+        num_workers (int, optional): The number of groups decoded in parallel. Defaults to None (the number of CPUs).
+        overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+
+    Returns:
+        np.array(uint8) or list: An array of shape (frames, height, width, 3) with the frames (BGR) in the requested order, or the list of paths to the extracted images. Frames past the end of the video are black.
+    """
+
+    import os
+    import cv2
+    import numpy as np
+    import multiprocessing.pool
+
+    if frames is not None and times is not None:
+        raise ValueError("frames and times cannot be both not None.")
+    if frames is None and times is None:
+        raise ValueError("frames and times cannot be both None.")
+
+    fps = get_fps(filename)
+    width, height = get_widthheight(filename)
+    if frames is None:
+        frames = [int(round(time * fps)) for time in times]
+    frames = [int(frame) for frame in frames]
+
+    # group the sorted targets into decode windows
+    groups = group_frames(frames, max_gap * fps, max(max_span, max_gap) * fps)
+
+    def read_group(group):
+        cmd = ['ffmpeg', '-y']
+        if group[0] > 0:
+            # seek half a frame early to make sure the first frame of the group is not skipped due to rounding
+            cmd += ['-ss', '{:.6f}'.format((group[0] - 0.5) / fps)]
+        cmd += ['-i', filename, '-frames:v', str(group[-1] - group[0] + 1)]
+        process = ffmpeg_cmd(cmd, total_time=0, pipe='read')
+        # stream the window, keeping only the requested frames
+        targets = set(group)
+        extracted = {}
+        for frame in range(group[0], group[-1] + 1):
+            out = process.stdout.read(width*height*3)
+            if len(out) < width*height*3:
+                # past the end of the video
+                break
+            if frame in targets:
+                extracted[frame] = np.frombuffer(out, dtype=np.uint8).reshape(height, width, 3)
+        process.terminate()
+        process.wait()
+        return extracted
+
+    if num_workers is None or num_workers < 1:
+        num_workers = os.cpu_count() or 1
+    extracted = {}
+    pb = MgProgressbar(total=len(groups), prefix='Extracting frames:')
+    with multiprocessing.pool.ThreadPool(max(1, min(num_workers, len(groups)))) as pool:
+        for i, window in enumerate(pool.imap_unordered(read_group, groups)):
+            extracted.update(window)
+            pb.progress(i + 1)
+
+    black = np.zeros((height, width, 3), dtype=np.uint8)
+    if return_array:
+        return np.stack([extracted.get(frame, black) for frame in frames])
+
+    name = os.path.splitext(target_name if target_name else filename)[0]
+    target_names = []
+    for frame in frames:
+        frame_name = f"{name}_frame_{frame}.png"
+        if not overwrite:
+            frame_name = generate_outfilename(frame_name)
+        cv2.imwrite(frame_name, extracted.get(frame, black))
+        target_names.append(frame_name)
+
+    return target_names
+
+
+def seek_frame(filename, time, width, height, scale=None):
+    """
+    Reads a single frame of a video into a numpy array using ffmpeg. Seeks in the input, so that only the frames from the nearest preceding keyframe are decoded, even far into long videos.
+
+    Args:
+        filename (str): Path to the input video file.
+        time (float): The time (s) of the frame.
+        width (int): The width of the input video.
+        height (int): The height of the input video.
+        scale (tuple, optional): The (width, height) to scale the frame to. Defaults to None (no scaling).
+
+    Returns:
+        np.array(uint8): The frame (BGR), or None if there is no frame at that time.
+    """
+
+    import numpy as np
+
+    cmd = ['ffmpeg', '-y', '-ss', '{:.6f}'.format(time), '-i', filename, '-frames:v', '1']
+    if scale is not None:
+        width, height = scale
+        cmd += ['-vf', f'scale={width}:{height}']
+    process = ffmpeg_cmd(cmd, total_time=0, pipe='load')
+
+    out = process.stdout[:width*height*3]
+    if len(out) < width*height*3:
+        return None
+    return np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3])
+
+
 def extract_subclip(filename, t1, t2, target_name=None, overwrite=False):
     """
     Extracts a section of the video using ffmpeg.
@@ -1240,6 +1389,101 @@ def get_fps(filename):
     return fps
 
 
+def get_samplerate(filename):
+    """
+    Gets the sampling rate of the (first) audio stream of a video/audio file using FFprobe.
+
+    Args:
+        filename (str): Path to the file to measure.
+
+    Returns:
+        int: The sampling rate of the audio stream in Hz.
+    """
+    import re
+    out = ffprobe(filename)
+    for line in out.splitlines():
+        if line.find("Audio:") != -1:
+            match = re.search(r"(\d+) Hz", line)
+            if match is not None:
+                return int(match.group(1))
+    raise NoStreamError("No audio stream found.")
+
+
+def audio_pipe(filename, sr, channel=None):
+    """
+    Starts an FFmpeg process decoding the (first) audio stream of a video/audio file to mono float32 samples (f32le) on its stdout.
+    Resampling is done by FFmpeg.
+
+    Args:
+        filename (str): Path to the video/audio file.
+        sr (int): The sampling rate of the output samples.
+        channel (int, optional): The index of the channel to output. Defaults to None (which mixes all channels down to mono).
+
+    Returns:
+        subprocess.Popen: The FFmpeg process.
+    """
+    import subprocess
+    command = ['ffmpeg', '-hide_banner', '-loglevel', 'quiet', '-i', filename, '-vn', '-map', '0:a:0']
+    if channel is None:
+        command += ['-ac', '1']
+    else:
+        command += ['-af', f'pan=mono|c0=c{channel}']
+    command += ['-ar', str(sr), '-f', 'f32le', '-acodec', 'pcm_f32le', '-']
+    return subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=-1)
+
+
+def read_audio(filename, sr=None, channel=None, memmap=False):
+    """
+    Decodes the audio of a video/audio file by piping mono float32 samples from FFmpeg straight into a numpy array,
+    without temporary audio files. With `memmap=True` the samples are streamed to a temporary raw file which is memory-mapped instead, for long files.
+
+    Args:
+        filename (str): Path to the video/audio file.
+        sr (int, optional): The sampling rate to resample to. Defaults to None (which keeps the original sampling rate).
+        channel (int, optional): The index of the channel to read. Defaults to None (which mixes all channels down to mono).
+        memmap (bool, optional): Whether to return a read-only disk-backed array instead of loading the samples in memory. Defaults to False.
+
+    Raises:
+        FFmpegError: If the audio could not be decoded.
+
+    Returns:
+        tuple: The samples (np.array(float32)) and the sampling rate.
+    """
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+
+    if sr is None:
+        sr = get_samplerate(filename)
+
+    process = audio_pipe(filename, sr, channel=channel)
+    if memmap:
+        with tempfile.NamedTemporaryFile(suffix='.f32', delete=False) as f:
+            shutil.copyfileobj(process.stdout, f, length=2**20)
+            raw_file = f.name
+    else:
+        out = process.stdout.read()
+    process.stdout.close()
+    if process.wait() != 0:
+        if memmap:
+            os.remove(raw_file)
+        raise FFmpegError(f"Could not decode the audio of {filename}.")
+
+    if not memmap:
+        return np.frombuffer(out, dtype=np.float32), sr
+
+    if os.path.getsize(raw_file) == 0:
+        os.remove(raw_file)
+        return np.zeros(0, dtype=np.float32), sr
+    samples = np.memmap(raw_file, dtype=np.float32, mode='r')
+    try:
+        # the mapping keeps the data available, the file is deleted as soon as it is closed (not possible on Windows)
+        os.remove(raw_file)
+    except OSError:
+        pass
+    return samples, sr
+
 def get_first_frame_as_image(filename, target_name=None, pict_format='.png', overwrite=False):
     """
     Extracts the first frame of a video and saves it as an image using ffmpeg.
@@ -1422,9 +1666,92 @@ class FFmpegError(Exception):
         self.message = message
 
 
-def ffmpeg_cmd(command, total_time, pb_prefix='Progress', print_cmd=False, stream=True, pipe=None):
+# callbacks subscribed to the progress of every ffmpeg_cmd job, see `ffmpeg_cmd`
+progress_callbacks = []
+
+
+def add_progress_callback(callback):
+    """
+    Subscribes a callback to the progress reports of every (non-pipe) FFmpeg job run by `ffmpeg_cmd`, for example to log the throughput of batch jobs.
+
+    Args:
+        callback (function): Called with a progress dictionary (see `parse_progress`) about twice per second and once when a job ends.
+    """
+    if callback not in progress_callbacks:
+        progress_callbacks.append(callback)
+
+
+def remove_progress_callback(callback):
+    """
+    Unsubscribes a callback added with `add_progress_callback`.
+
+    Args:
+        callback (function): The callback to remove.
+    """
+    if callback in progress_callbacks:
+        progress_callbacks.remove(callback)
+
+
+def parse_progress(values, elapsed=0.0):
+    """
+    Converts the key=value pairs of an FFmpeg `-progress` report into a progress dictionary. Values FFmpeg reports as 'N/A' become None.
+
+    Args:
+        values (dict): The raw key=value pairs of the report.
+        elapsed (float, optional): The wall-clock time (in seconds) since the job started. Defaults to 0.0.
+
+    Returns:
+        dict: The number of frames done ('frame'), the encoding FPS ('fps'), the speed multiplier relative to real time ('speed'), the output size in bytes ('size'),
+        the time reached in the output in seconds ('time'), the elapsed wall-clock time in seconds ('elapsed') and whether the job has ended ('done').
+    """
+    def number(key, convert=float, suffix=''):
+        value = values.get(key, 'N/A').strip()
+        if suffix and value.endswith(suffix):
+            value = value[:-len(suffix)]
+        try:
+            return convert(value)
+        except ValueError:
+            return None
+
+    # out_time_ms is in microseconds as well, for historical reasons
+    time = number('out_time_us', int)
+    if time is None:
+        time = number('out_time_ms', int)
+
+    return dict(
+        frame=number('frame', int),
+        fps=number('fps'),
+        speed=number('speed', suffix='x'),
+        size=number('total_size', int),
+        time=time / 1e6 if time is not None else None,
+        elapsed=elapsed,
+        done=values.get('progress') == 'end')
+
+
+@functools.lru_cache(maxsize=1)
+def ffmpeg_options():
+    """
+    Lists the command line options of the installed FFmpeg, so that options of newer versions can be left out with older ones.
+    FFmpeg is probed (with `ffmpeg -h full`) once per session.
+
+    Returns:
+        frozenset: The options, eg. '-stats_period'. Empty if FFmpeg could not be run.
+    """
+    import re
+    import subprocess
+    try:
+        process = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'full'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 universal_newlines=True, errors='replace')
+    except OSError:
+        return frozenset()
+    return frozenset(re.findall(r'^\s*(-[\w:]+)', process.stdout, flags=re.MULTILINE))
+
+
+def ffmpeg_cmd(command, total_time, pb_prefix='Progress', print_cmd=False, stream=True, pipe=None, callback=None):
     """
     Run an ffmpeg command in a subprocess and show progress using an MgProgressbar.
+    Progress is read from FFmpeg's machine-readable `-progress` reports (sent about every 0.5 seconds, set with `-stats_period` when FFmpeg supports it) and sent to subscribers:
+    the progress bar, the `callback` of the call and the callbacks added with `add_progress_callback`.
 
     Args:
         command (list): The ffmpeg command to execute as a list. Eg. ['ffmpeg', '-y', '-i', 'myVid.mp4', 'myVid.mov']
@@ -1433,17 +1760,24 @@ def ffmpeg_cmd(command, total_time, pb_prefix='Progress', print_cmd=False, strea
         print_cmd (bool, optional): Whether to print the full ffmpeg command to the console before executing it. Good for debugging. Defaults to False.
         stream (bool, optional): Whether to have a continuous output stream or just (the last) one. Defaults to True (continuous stream).
         pipe (str, optional): Whether to pipe video frames from FFmpeg to numpy array. Possible to read the video frame by frame with pipe='read', to load video in memory with pipe='load', or to write the frames of a numpy array to a video file with pipe='write'. Defaults to None.
+        callback (function, optional): Called with a progress dictionary (see `parse_progress`) at each progress report of the job. Defaults to None.
 
     Raises:
         KeyboardInterrupt: If the user stops the process.
         FFmpegError: If the ffmpeg process was unsuccessful.
     """
     import subprocess
+    import time
 
-    pb = MgProgressbar(total=total_time, prefix=pb_prefix)
-
-    # Hide banner and quiet report printing
-    command = ['ffmpeg', '-hide_banner', '-loglevel', 'quiet'] + command[1:]
+    if pipe in ['read', 'load', 'write']:
+        # Hide banner and quiet report printing
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'quiet'] + command[1:]
+    else:
+        # Report progress as key=value lines on stdout, and only errors otherwise
+        command = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostats', '-progress', 'pipe:1'] + command[1:]
+        # -stats_period was added in FFmpeg 4.4, the reports of older versions come at their default period (0.5 seconds)
+        if '-stats_period' in ffmpeg_options():
+            command[7:7] = ['-stats_period', '0.5']
 
     if print_cmd:
         if isinstance(command, list):
@@ -1469,9 +1803,34 @@ def ffmpeg_cmd(command, total_time, pb_prefix='Progress', print_cmd=False, strea
         return process
 
     else:
+        pb = MgProgressbar(total=total_time, prefix=pb_prefix)
+        # the progress bar is one of the subscribers
+        subscribers = [lambda report: pb.progress(report['time']) if report['time'] is not None else None]
+        if callback is not None:
+            subscribers.append(callback)
+        subscribers += progress_callbacks
+
+        start = time.time()
         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
         returncode = None
         all_out = ''
+        values = {}
+
+        def read_lines(out):
+            nonlocal all_out
+            for line in out.splitlines():
+                key, sep, value = line.partition('=')
+                if not sep or ' ' in key:
+                    # not a progress line, keep it for the error message
+                    all_out += line + '\n'
+                    continue
+                values[key.strip()] = value
+                # each report ends with a progress=continue or progress=end line
+                if key.strip() == 'progress':
+                    report = parse_progress(values, elapsed=time.time() - start)
+                    for subscriber in subscribers:
+                        subscriber(report)
+                    values.clear()
 
         try:
             while True:
@@ -1479,23 +1838,13 @@ def ffmpeg_cmd(command, total_time, pb_prefix='Progress', print_cmd=False, strea
                     out = process.stdout.readline()
                 else:
                     out = process.stdout.read()
-                all_out += out
 
                 if out == '':
                     process.wait()
                     returncode = process.returncode
                     break
 
-                elif out.startswith('frame='):
-                    try:
-                        out_list = out.split()
-                        time_ind = [elem.startswith('time=') for elem in out_list].index(True)
-                        time_str = out_list[time_ind][5:]
-                        time_sec = str2sec(time_str)
-                        pb.progress(time_sec)
-                    except ValueError:
-                        # New version of FFmpeg outputs N/A values
-                        pass
+                read_lines(out)
 
             if returncode in [None, 0]:
                 pb.progress(total_time)
@@ -6,6 +6,7 @@ from musicalgestures._input_test import mg_input_test
 from musicalgestures._videoreader import mg_videoreader
 from musicalgestures._flow import Flow
 from musicalgestures._audio import MgAudio
+from musicalgestures._lazy import lazy_method
 from musicalgestures._utils import (
     convert,
     convert_to_mp4,
@@ -13,6 +14,7 @@ from musicalgestures._utils import (
     ffmpeg_cmd,
     merge_videos,
     extract_frame,
+    extract_frames,
     MgImage
 )
 
@@ -127,37 +129,34 @@ class MgVideo(MgAudio):
         self.get_video()
         self.flow = Flow(self, self.filename, self.color, self.has_audio)
 
-    from musicalgestures._motionvideo import mg_motion as motion
-    from musicalgestures._motionvideo import mg_motiongrams as motiongrams
-    from musicalgestures._motionvideo import mg_motiondata as motiondata
-    from musicalgestures._motionvideo import mg_motionplots as motionplots
-    from musicalgestures._motionvideo import mg_motionvideo as motionvideo
-    from musicalgestures._motionvideo import mg_motionscore as motionscore
-    from musicalgestures._motionvideo_mp_run import mg_motion_mp as motion_mp
-    from musicalgestures._subtract import mg_subtract as subtract
-    from musicalgestures._ssm import mg_ssm as ssm
-    from musicalgestures._videograms import videograms_ffmpeg as videograms
-    from musicalgestures._directograms import mg_directograms as directograms
-    from musicalgestures._warp import (
-        mg_warp_audiovisual_beats as warp_audiovisual_beats,
-    )
-    from musicalgestures._blurfaces import mg_blurfaces as blur_faces
-    from musicalgestures._impacts import mg_impacts as impacts
-    from musicalgestures._grid import mg_grid as grid
-    from musicalgestures._motionvideo import save_analysis
+    # the methods are imported from their modules when first accessed, so that importing the class does not import all their dependencies
+    motion = lazy_method('musicalgestures._motionvideo', 'mg_motion')
+    motiongrams = lazy_method('musicalgestures._motionvideo', 'mg_motiongrams')
+    motiondata = lazy_method('musicalgestures._motionvideo', 'mg_motiondata')
+    motionplots = lazy_method('musicalgestures._motionvideo', 'mg_motionplots')
+    motionvideo = lazy_method('musicalgestures._motionvideo', 'mg_motionvideo')
+    motionscore = lazy_method('musicalgestures._motionvideo', 'mg_motionscore')
+    motion_mp = lazy_method('musicalgestures._motionvideo_mp_run', 'mg_motion_mp')
+    subtract = lazy_method('musicalgestures._subtract', 'mg_subtract')
+    ssm = lazy_method('musicalgestures._ssm', 'mg_ssm')
+    videograms = lazy_method('musicalgestures._videograms', 'videograms_ffmpeg')
+    directograms = lazy_method('musicalgestures._directograms', 'mg_directograms')
+    warp_audiovisual_beats = lazy_method('musicalgestures._warp', 'mg_warp_audiovisual_beats')
+    blur_faces = lazy_method('musicalgestures._blurfaces', 'mg_blurfaces')
+    impacts = lazy_method('musicalgestures._impacts', 'mg_impacts')
+    grid = lazy_method('musicalgestures._grid', 'mg_grid')
+    save_analysis = lazy_method('musicalgestures._motionvideo', 'save_analysis')
 
     # from musicalgestures._cropvideo import mg_cropvideo, find_motion_box, find_total_motion_box
-    from musicalgestures._show import mg_show as show
-    from musicalgestures._info import mg_info as info
-    from musicalgestures._history import history_ffmpeg as history
-    from musicalgestures._history import history_cv2
-    from musicalgestures._blend import mg_blend_image as blend
-    from musicalgestures._frameaverage import (
-        mg_pixelarray as pixelarray,
-        mg_pixelarray_cv2 as pixelarray_cv2,
-        mg_pixelarray_stats as pixelarray_stats
-    )
-    from musicalgestures._pose import pose
+    show = lazy_method('musicalgestures._show', 'mg_show')
+    info = lazy_method('musicalgestures._info', 'mg_info')
+    history = lazy_method('musicalgestures._history', 'history_ffmpeg')
+    history_cv2 = lazy_method('musicalgestures._history', 'history_cv2')
+    blend = lazy_method('musicalgestures._blend', 'mg_blend_image')
+    pixelarray = lazy_method('musicalgestures._frameaverage', 'mg_pixelarray')
+    pixelarray_cv2 = lazy_method('musicalgestures._frameaverage', 'mg_pixelarray_cv2')
+    pixelarray_stats = lazy_method('musicalgestures._frameaverage', 'mg_pixelarray_stats')
+    pose = lazy_method('musicalgestures._pose', 'pose')
 
     def average(self, **kwargs):
         """
@@ -342,3 +341,26 @@ class MgVideo(MgAudio):
             MgImage: An MgImage object referring to the extracted frame.
         """
         return MgImage(extract_frame(self.filename, **kwargs))
+
+    def extract_frames(self, **kwargs):
+        """
+        Extracts a batch of frames from the video at given frame numbers or times, grouping nearby frames into single decode windows.
+        see _utils.extract_frames for details.
+
+        Args:
+            frames (list, optional): The frame numbers to extract. Defaults to None.
+            times (list, optional): The times (s) where to extract the frames from. Defaults to None.
+            target_name (str, optional): The base name for the output files. Defaults to None.
+            return_array (bool, optional): Whether to return the frames as an array instead of writing them to image files. Defaults to False.
+            max_gap (float, optional): The largest gap (s) between two requested frames that are still read in the same decode window. Defaults to 1.0.
+            max_span (float, optional): The longest span (s) of a decode window, after which a new window is started with a seek. Defaults to 10.0.
+            num_workers (int, optional): The number of groups decoded in parallel. Defaults to None (the number of CPUs).
+            overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
+
+        Returns:
+            np.array(uint8) or list: An array with the frames (BGR) in the requested order if `return_array` is True, otherwise a list of MgImage objects referring to the extracted frames.
+        """
+        result = extract_frames(self.filename, **kwargs)
+        if kwargs.get('return_array', False):
+            return result
+        return [MgImage(target_name) for target_name in result]
@@ -1,5 +1,4 @@
 import numpy as np
-import cv2
 import os
 import musicalgestures
 from musicalgestures._utils import scale_num, scale_array, MgProgressbar, get_length, ffmpeg_cmd, has_audio, generate_outfilename, convert_to_mp4, convert_to_avi
@@ -111,6 +110,7 @@ def fixed_frames_ffmpeg(filename, frames=0, target_name=None, overwrite=False):
     Returns:
         str: Path to the output video.
     """
+    import cv2
     of, fex = os.path.splitext(filename)
 
     if fex != '.mp4':
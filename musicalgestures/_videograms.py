@@ -1,108 +1,113 @@
 import cv2
 import os
+import shutil
+import tempfile
 import numpy as np
-from musicalgestures._utils import MgProgressbar, MgImage, get_widthheight, get_framecount, get_length, ffmpeg_cmd, generate_outfilename
+from musicalgestures._utils import MgProgressbar, MgImage, ffmpeg_cmd, generate_outfilename, FFmpegError
 from musicalgestures._mglist import MgList
-from musicalgestures._videoadjust import skip_frames_ffmpeg
-import math
+
+
+def normalize_strips(strips, chunk_size=4096):
+    """
+    Stretches the range of each channel of each strip (the row or column means of a frame) to 0-255, like the FFmpeg normalize filter does per frame.
+    Works in chunks of frames, so that the strips can be a disk-backed array.
+
+    Args:
+        strips (np.array(float32)): The strips of shape (frames, pixels, channels).
+        chunk_size (int, optional): The number of strips normalized at once. Defaults to 4096.
+
+    Returns:
+        np.array(uint8): The normalized strips.
+    """
+    normalized = np.empty(strips.shape, dtype=np.uint8)
+    for start in range(0, len(strips), chunk_size):
+        chunk = np.asarray(strips[start:start+chunk_size], dtype=np.float32)
+        low = chunk.min(axis=1, keepdims=True)
+        span = chunk.max(axis=1, keepdims=True) - low
+        # flat strips are left unchanged
+        flat = span == 0
+        chunk = np.where(flat, chunk, (chunk - low) / np.where(flat, 1, span) * 255)
+        normalized[start:start+chunk_size] = chunk.round()
+    return normalized
 
 
 def videograms_ffmpeg(self, target_name_x=None, target_name_y=None, overwrite=False):
     """
-    Renders horizontal and vertical videograms of the source video using ffmpeg. Averages videoframes by axes, 
-    and creates two images of the horizontal-axis and vertical-axis stacks. In these stacks, a single row or 
-    column corresponds to a frame from the source video, and the index of the row or column corresponds to 
+    Renders horizontal and vertical videograms of the source video using ffmpeg. Averages videoframes by axes,
+    and creates two images of the horizontal-axis and vertical-axis stacks. In these stacks, a single row or
+    column corresponds to a frame from the source video, and the index of the row or column corresponds to
     the index of the source frame.
 
+    The video is decoded once, and the row and column means of each frame are written to disk-backed arrays which are
+    normalized afterwards, so that arbitrarily long videos can be processed without skipping frames.
+
     Args:
         target_name_x (str, optional): Target output name for the videogram on the X axis. Defaults to None (which assumes that the input filename with the suffix "_vgx" should be used).
         target_name_y (str, optional): Target output name for the videogram on the Y axis. Defaults to None (which assumes that the input filename with the suffix "_vgy" should be used).
         overwrite (bool, optional): Whether to allow overwriting existing files or to automatically increment target filenames to avoid overwriting. Defaults to False.
 
     Returns:
-        MgList: An MgList with the MgImage objects referring to the horizontal and vertical videograms respectively. 
+        MgList: An MgList with the MgImage objects referring to the horizontal and vertical videograms respectively.
+
+    Raises:
+        FFmpegError: If no frame could be decoded from the video.
     """
 
-    width, height = get_widthheight(self.filename)
-    framecount = get_framecount(self.filename)
-
-    def calc_skipfactor(width, height, framecount):
-        """
-        Helper function to calculate the necessary frame-skipping to avoid integer overflow. This makes sure that we can succesfully create videograms even on many-hours-long videos as well.
-
-        Args:
-            width (int): The width of the video.
-            height (int): The height of the video.
-            framecount (int): The number of frames in the video.
-
-        Returns:
-            list(int, int): The necessary dilation factors to apply on the video for the horizontal and vertical videograms, respectively.
-        """
-
-        intmax = 2147483647
-        skipfactor_x = int(
-            math.ceil(framecount*8 / (intmax / (height+128) - 1024)))
-        skipfactor_y = int(
-            math.ceil(framecount / (intmax / ((width*8)+1024) - 128)))
-        return skipfactor_x, skipfactor_y
-
-    testx, testy = calc_skipfactor(width, height, framecount)
-
-    if testx > 1 or testy > 1:
-        necessary_skipfactor = max([testx, testy])
-        print(f'{os.path.basename(self.filename)} is too large to process. Applying minimal skipping necessary...')
-
-        shortened_file = skip_frames_ffmpeg(self.filename, skip=necessary_skipfactor-1)
-        skip_of = os.path.splitext(shortened_file)[0]
-        framecount = get_framecount(shortened_file)
-        length = get_length(shortened_file)
-
-        if target_name_x == None:
-            target_name_x = skip_of+'_vgx.png'
-        if target_name_y == None:
-            target_name_y = skip_of+'_vgy.png'
-        if not overwrite:
-            target_name_x = generate_outfilename(target_name_x)
-            target_name_y = generate_outfilename(target_name_y)
-
-        cmd = ['ffmpeg', '-y', '-i', shortened_file, '-vf',
-               f'scale=1:{height}:sws_flags=area,normalize,tile={framecount}x1', '-aspect', f'{framecount}:{height}', '-frames', '1', target_name_y]
-        ffmpeg_cmd(cmd, length, stream=False, pb_prefix="Rendering horizontal videogram:")
-
-        cmd = ['ffmpeg', '-y', '-i', shortened_file, '-vf',
-               f'scale={width}:1:sws_flags=area,normalize,tile=1x{framecount}', '-aspect', f'{width}:{framecount}', '-frames', '1', target_name_x]
-        ffmpeg_cmd(cmd, length, stream=False, pb_prefix="Rendering vertical videogram:")
-
-        # save results as MgImages at self.video_gram_x and self.video_gram_y for parent MgObject
-        self.videogram_x = MgImage(target_name_x)
-        self.videogram_y = MgImage(target_name_y)
-
-        # return MgList([MgImage(target_name_x), MgImage(target_name_y)])
-        return MgList(self.videogram_x, self.videogram_y)
-
-
-    else:
-        length = get_length(self.filename)
-
-        if target_name_x == None:
-            target_name_x = self.of +'_vgx.png'
-        if target_name_y == None:
-            target_name_y = self.of+'_vgy.png'
-        if not overwrite:
-            target_name_x = generate_outfilename(target_name_x)
-            target_name_y = generate_outfilename(target_name_y)
-
-        cmd = ['ffmpeg', '-y', '-i', self.filename, '-frames', '1', '-vf',
-               f'scale=1:{height}:sws_flags=area,normalize,tile={framecount}x1', '-aspect', f'{framecount}:{height}', target_name_y]
-        ffmpeg_cmd(cmd, length, stream=False, pb_prefix="Rendering horizontal videogram:")
-
-        cmd = ['ffmpeg', '-y', '-i', self.filename, '-frames', '1', '-vf',
-               f'scale={width}:1:sws_flags=area,normalize,tile=1x{framecount}', '-aspect', f'{width}:{framecount}', target_name_x]
-        ffmpeg_cmd(cmd, length, stream=False, pb_prefix="Rendering vertical videogram:")
-
-        # save results as MgImages at self.videogram_x and self.videogram_y for parent MgObject
-        self.videogram_x = MgImage(target_name_x)
-        self.videogram_y = MgImage(target_name_y)
-
-        # return MgList([MgImage(target_name_x), MgImage(target_name_y)])
-        return MgList(self.videogram_x, self.videogram_y)
+    width, height = self.width, self.height
+
+    if target_name_x == None:
+        target_name_x = self.of + '_vgx.png'
+    if target_name_y == None:
+        target_name_y = self.of + '_vgy.png'
+    if not overwrite:
+        target_name_x = generate_outfilename(target_name_x)
+        target_name_y = generate_outfilename(target_name_y)
+
+    temp_folder = tempfile.mkdtemp()
+    means_x_file = os.path.join(temp_folder, 'means_x.raw')
+    means_y_file = os.path.join(temp_folder, 'means_y.raw')
+
+    pb = MgProgressbar(total=self.length, prefix='Rendering videograms:')
+
+    # Pipe video with FFmpeg for reading frame by frame
+    process = ffmpeg_cmd(['ffmpeg', '-y', '-i', self.filename], total_time=self.length, pipe='read')
+
+    framecount = 0
+    with open(means_x_file, 'wb') as means_x, open(means_y_file, 'wb') as means_y:
+        while True:
+            out = process.stdout.read(width*height*3)
+            if out == b'':
+                break
+
+            frame = np.frombuffer(out, dtype=np.uint8).reshape([height, width, 3])
+            # column means for the vertical videogram, row means for the horizontal one
+            means_x.write(frame.mean(axis=0, dtype=np.float32).tobytes())
+            means_y.write(frame.mean(axis=1, dtype=np.float32).tobytes())
+
+            framecount += 1
+            pb.progress(framecount)
+
+    process.terminate()
+    pb.progress(self.length)
+
+    if framecount == 0:
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        raise FFmpegError(f"Could not decode any frame of {self.filename}.")
+
+    # each row of the vertical videogram is a frame
+    means_x = np.memmap(means_x_file, dtype=np.float32, mode='r', shape=(framecount, width, 3))
+    cv2.imwrite(target_name_x, normalize_strips(means_x))
+    del means_x
+
+    # each column of the horizontal videogram is a frame
+    means_y = np.memmap(means_y_file, dtype=np.float32, mode='r', shape=(framecount, height, 3))
+    cv2.imwrite(target_name_y, normalize_strips(means_y).transpose(1, 0, 2))
+    del means_y
+
+    shutil.rmtree(temp_folder, ignore_errors=True)
+
+    # save results as MgImages at self.videogram_x and self.videogram_y for parent MgObject
+    self.videogram_x = MgImage(target_name_x)
+    self.videogram_y = MgImage(target_name_y)
+
+    return MgList(self.videogram_x, self.videogram_y)
@@ -1,4 +1,3 @@
-import cv2
 import os
 import numpy as np
 from musicalgestures._videoadjust import skip_frames_ffmpeg, fixed_frames_ffmpeg, contrast_brightness_ffmpeg
@@ -9,7 +9,7 @@ from numba import jit
 import musicalgestures
 from musicalgestures._directograms import mg_directograms
 from musicalgestures._impacts import impact_envelope
-from musicalgestures._utils import MgProgressbar, generate_outfilename, wrap_str
+from musicalgestures._utils import MgProgressbar, generate_outfilename, wrap_str, read_audio
 
 @jit(nopython=True)
 def beats_diff(beats, media):
@@ -55,11 +55,12 @@ def mg_warp_audiovisual_beats(self, audio_file, speed=(0.5,2), data=None, filter
 
     pb = MgProgressbar(total=130, prefix='Warping audiovisual beats:')
     pb.progress(0)
-    signal, sr = librosa.load(audio_file, mono=True)
+    # decode (and resample) the audio with FFmpeg, which also reads the audio track of video files
+    signal, sr = read_audio(audio_file, sr=22050)
     pb.progress(5)
 
     # Compute onset and impact envelopes
-    onset_envelopes = librosa.onset.onset_strength(signal, sr=sr)
+    onset_envelopes = librosa.onset.onset_strength(y=signal, sr=sr)
     pb.progress(10)
     impact_envelopes = impact_envelope(directograms)
     pb.progress(15)
@@ -147,7 +148,8 @@ def mg_warp_audiovisual_beats(self, audio_file, speed=(0.5,2), data=None, filter
 
     pb.progress(75)
     if not os.path.isfile(extended_file_name):
-        data, sample_rate = librosa.load(audio_file, mono=True)
+        # the signal decoded above is reused
+        data, sample_rate = signal, sr
         old_length = data.shape[0]
         tail = new_length - old_length * (new_length // old_length)
         extended_data = np.hstack(tuple([data] * (new_length // old_length) + [data[:tail]]))
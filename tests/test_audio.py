@@ -1,5 +1,7 @@
 import os
 import pytest
+import numpy as np
+import librosa
 import musicalgestures
 from musicalgestures._utils import MgFigure, get_length, extract_subclip
 
@@ -21,6 +23,126 @@ def testvideo_avi_silent(tmp_path_factory):
     return target_name_silent
 
 
+@pytest.fixture(scope="class")
+def testaudio(tmp_path_factory):
+    import soundfile
+    target_name = os.path.join(str(tmp_path_factory.mktemp("data")), "testaudio.wav")
+    sr = 22050
+    t = np.arange(sr * 2) / sr
+    y = (0.5 * np.sin(2 * np.pi * 440 * t) * (t % 0.5 < 0.1)).astype(np.float32)
+    soundfile.write(target_name, y, sr, subtype='FLOAT')
+    # skip __init__ and the decoding, which need ffmpeg
+    audio = musicalgestures.MgAudio.__new__(musicalgestures.MgAudio)
+    audio.filename, audio.sr, audio.n_fft, audio.hop_length, audio.length = target_name, sr, 2048, 512, 2.0
+    audio._y, audio._features = y, {}
+    return audio
+
+
+class Test_Audio_Features:
+    def test_signal_is_memoized(self, testaudio):
+        assert testaudio.signal() is testaudio.signal()
+
+    def test_audio_blocks(self, testaudio):
+        import io
+        y = testaudio.signal()
+        blocks = list(musicalgestures._audiostream.audio_blocks(io.BytesIO(y.tobytes()), 10, 2048, 512))
+        # consecutive blocks overlap by frame_length - hop_length samples
+        assert all(len(block) == 2048 + 9 * 512 for block in blocks[:-1])
+        assert np.array_equal(blocks[1][:1536], blocks[0][-1536:])
+        assert np.array_equal(np.concatenate([blocks[0]] + [block[1536:] for block in blocks[1:]]), y)
+
+    def test_melspectrogram(self, testaudio):
+        expected = librosa.feature.melspectrogram(y=testaudio.signal(), sr=testaudio.sr, n_fft=2048, hop_length=512, n_mels=64)
+        result = testaudio.features(n_mels=64, power=2)
+        assert np.allclose(result, expected)
+        assert testaudio.features(n_mels=64, power=2.0) is result
+
+    def test_onset_strength(self, testaudio):
+        expected = librosa.onset.onset_strength(y=testaudio.signal(), sr=testaudio.sr, hop_length=512)
+        assert np.allclose(testaudio.onset_strength(), expected)
+
+    def test_onset_strength_n_fft(self, testaudio):
+        # the envelope is centred on the frames of the given FFT size, not librosa's default of 2048
+        expected = librosa.onset.onset_strength(y=testaudio.signal(), sr=testaudio.sr, n_fft=4096, hop_length=256)
+        result = testaudio.onset_strength(n_fft=4096, hop_length=256)
+        assert result.shape == expected.shape
+        assert np.allclose(result, expected)
+
+
+class Test_spectral_descriptors:
+    def test_matches_librosa(self, testaudio):
+        y, sr = testaudio.signal(), testaudio.sr
+        result = musicalgestures._audio.spectral_descriptors(np.abs(librosa.stft(y, n_fft=2048, hop_length=512)), sr, 2048)
+        kwargs = dict(y=y, sr=sr, n_fft=2048, hop_length=512)
+        assert np.allclose(result['centroid'], librosa.feature.spectral_centroid(**kwargs)[0], rtol=1e-4)
+        assert np.allclose(result['bandwidth'], librosa.feature.spectral_bandwidth(**kwargs)[0], rtol=1e-4)
+        assert np.allclose(result['flatness'], librosa.feature.spectral_flatness(y=y, n_fft=2048, hop_length=512)[0], rtol=1e-4, atol=1e-6)
+        assert np.array_equal(result['rolloff'][0], librosa.feature.spectral_rolloff(**kwargs, roll_percent=0.99)[0])
+        assert np.array_equal(result['rolloff'][1], librosa.feature.spectral_rolloff(**kwargs, roll_percent=0.01)[0])
+
+    def test_save(self, tmp_path):
+        import pandas as pd
+        df = pd.DataFrame({'Time': [0.0, 0.5], 'RMS': [0.1, 0.2]})
+        outputs = musicalgestures._audio.save_descriptors(df, str(tmp_path / 'test'), data_format=['csv', 'npz'])
+        assert [os.path.basename(output) for output in outputs] == ['test_descriptors.csv', 'test_descriptors.npz']
+        assert np.array_equal(np.load(outputs[1])['RMS'], df['RMS'].values)
+        assert pd.read_csv(outputs[0]).equals(df)
+
+
+class Test_Audio_Stream:
+    @pytest.fixture
+    def stubbed(self, testaudio, tmp_path, monkeypatch):
+        import io
+        # has_audio probes the file with ffmpeg, the FFmpeg pipe is replaced by the raw samples
+        monkeypatch.setattr(musicalgestures._audiostream, 'has_audio', lambda filename: True)
+
+        class Pipe:
+            def __init__(self):
+                self.stdout = io.BytesIO(testaudio.signal().tobytes())
+            def terminate(self): pass
+            def wait(self): pass
+        monkeypatch.setattr(musicalgestures._audiostream, 'audio_pipe', lambda filename, sr: Pipe())
+        testaudio.of = str(tmp_path / 'testaudio')
+        return testaudio
+
+    def test_matches_whole_signal(self, stubbed, tmp_path):
+        testaudio = stubbed
+        result = testaudio.stream_features(block_length=10)
+        assert os.path.isfile(str(tmp_path / 'testaudio_stream' / 'features.json'))
+
+        y = testaudio.signal()
+        S = np.abs(librosa.stft(y, n_fft=2048, hop_length=512, center=False))
+        mel = librosa.feature.melspectrogram(S=S**2, sr=testaudio.sr, n_fft=2048)
+        assert result['mel'].shape == mel.shape
+        assert np.allclose(result['mel'], mel, rtol=1e-4, atol=1e-6)
+        assert np.allclose(result['rms'][0], librosa.feature.rms(y=y, frame_length=2048, hop_length=512, center=False)[0], atol=1e-6)
+        assert result['rolloff'].shape == (2, S.shape[1])
+        assert result['onset_env'][0, 0] == 0
+
+    def test_overwrite_output_folder(self, stubbed, tmp_path):
+        first = stubbed.stream_features(block_length=10)
+        frames = first['rms'].shape[1]
+        del first
+        notes = tmp_path / 'testaudio_stream' / 'notes.txt'
+        notes.write_text('mine')
+        result = stubbed.stream_features(block_length=10, overwrite=True)
+        assert result['rms'].shape[1] == frames
+        # the files of other tools are kept
+        assert notes.read_text() == 'mine'
+
+    def test_refuse_other_folder(self, stubbed, tmp_path):
+        folder = tmp_path / 'testaudio_stream'
+        folder.mkdir()
+        (folder / 'notes.txt').write_text('mine')
+        with pytest.raises(FileExistsError):
+            stubbed.stream_features(block_length=10, overwrite=True)
+        assert os.listdir(str(folder)) == ['notes.txt']
+        # an empty folder is used as it is
+        os.remove(str(folder / 'notes.txt'))
+        stubbed.stream_features(block_length=10, overwrite=True)
+        assert os.path.isfile(str(folder / 'features.json'))
+
+
 class Test_Audio:
     def test_init(self, testvideo_avi):
         my_audio = musicalgestures.MgAudio(testvideo_avi)
@@ -1,5 +1,6 @@
 import musicalgestures
 import os
+import numpy as np
 import pytest
 
 
@@ -52,3 +53,20 @@ class Test_Average:
         assert type(result) == musicalgestures._utils.MgImage
         assert os.path.isfile(result.filename) == True
         assert os.path.splitext(result.filename)[1] == ".png"
+
+
+class Test_frame_stats:
+    def test_merge(self):
+        from musicalgestures._blend import merge_frame_stats
+        rng = np.random.default_rng(0)
+        frames = rng.integers(0, 256, (10, 4, 5, 3), dtype=np.uint8)
+
+        def stats_of(frames):
+            return dict(count=len(frames), sum=frames.sum(axis=0, dtype=np.float64),
+                        min=frames.min(axis=0), max=frames.max(axis=0))
+
+        merged = merge_frame_stats(stats_of(frames[6:]), stats_of(frames[:6]))
+        expected = stats_of(frames)
+        assert merged['count'] == 10
+        for key in ['sum', 'min', 'max']:
+            assert np.array_equal(merged[key], expected[key])
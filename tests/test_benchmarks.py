@@ -0,0 +1,33 @@
+import os
+import importlib.util
+import pytest
+
+# the benchmark suite is a script outside of the package
+spec = importlib.util.spec_from_file_location(
+    'mgbench', os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'mgbench.py'))
+mgbench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mgbench)
+
+
+def results(**times):
+    return dict(results={key: dict(min=value, median=value, mean=value) for key, value in times.items()})
+
+
+class Test_compare:
+    def test_status(self):
+        baseline = results(a=1.0, b=1.0, c=1.0, d=0.01, gone=1.0)
+        current = results(a=1.05, b=1.5, c=0.5, d=0.02, added=1.0)
+        status = {row[0]: row[4] for row in mgbench.compare(baseline, current)}
+        assert status == dict(a='ok', b='regression', c='improvement', d='ok', gone='missing', added='new')
+
+    def test_threshold(self):
+        rows = mgbench.compare(results(a=1.0), results(a=1.05), threshold=0.01)
+        assert rows == [('a', 1.0, 1.05, pytest.approx(1.05), 'regression')]
+
+    def test_main(self, tmp_path):
+        import json
+        for name, value in [('baseline', 1.0), ('current', 2.0)]:
+            with open(tmp_path / f'{name}.json', 'w') as f:
+                json.dump(results(a=value), f)
+        assert mgbench.main(['compare', str(tmp_path / 'baseline.json'), str(tmp_path / 'current.json')]) == 1
+        assert mgbench.main(['compare', str(tmp_path / 'baseline.json'), str(tmp_path / 'baseline.json')]) == 0
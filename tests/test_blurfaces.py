@@ -0,0 +1,246 @@
+import io
+import os
+import cv2
+import numpy as np
+import pytest
+import musicalgestures._blurfaces
+from musicalgestures._blurfaces import centroid_mask, nearest_neighbours, histogram_heatmap, track_boxes, blurfaces_frame_range, mask_faces, read_mask, resized_mask
+
+
+def test_centroid_mask():
+    data = np.array([[0, 10, 20, 30, 40], [40, 0, 0, 2, 4]])
+    center_x, center_y = centroid_mask(data)
+    assert list(center_x) == [20, 1]
+    assert list(center_y) == [30, 2]
+
+
+class Test_heatmaps:
+    def test_nearest_neighbours(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.random(50) * 64, rng.random(50) * 48
+        image, extent = nearest_neighbours(x, y, 64, 48, 8, 4)
+        assert extent == [0, 64, 0, 48]
+        # brute force reference
+        hx, hy = x / 64 * 8, y / 48 * 8
+        for row in range(8):
+            for col in range(8):
+                d = np.sort(np.hypot(hx - col, hy - row))[:4]
+                assert np.isclose(image[row, col], 1 / d.sum())
+
+    def test_histogram(self):
+        x, y = np.array([8, 8, 56]), np.array([6, 6, 42])
+        image, _ = histogram_heatmap(x, y, 64, 48, 8, 0)
+        assert image[1, 1] == 2 and image[7, 7] == 1 and image.sum() == 3
+        smoothed, _ = histogram_heatmap(x, y, 64, 48, 8, 1.0)
+        assert np.isclose(smoothed.sum(), 3)
+
+
+WIDTH, HEIGHT, PATCH = 160, 120, 30
+
+
+def textured_frame(x, y, rng_seed=0):
+    """
+    A flat gray frame with a smooth random texture patch (the "face") whose top-left corner is at (x, y). Without position, the frame is flat.
+    """
+    frame = np.full((HEIGHT, WIDTH, 3), 128, dtype=np.uint8)
+    if x is not None:
+        patch = np.random.default_rng(rng_seed).integers(0, 256, (PATCH, PATCH), dtype=np.uint8)
+        patch = cv2.GaussianBlur(patch, (5, 5), 0)
+        frame[y:y+PATCH, x:x+PATCH] = patch[..., None]
+    return frame
+
+
+def per_call_mask(frame, dets, mask_image):
+    """
+    Masks faces with an image the way mask_faces did before caching, reading and resizing the image for every face.
+    """
+    for det in dets:
+        x1, y1, x2, y2 = det[:4].astype(int)
+        resized_mask_image = cv2.resize(cv2.imread(mask_image, cv2.IMREAD_UNCHANGED), (x2 - x1, y2 - y1))
+        if resized_mask_image.shape[2] == 3:
+            frame[y1:y2, x1:x2] = resized_mask_image
+        else:
+            frame[y1:y2, x1:x2] = frame[y1:y2, x1:x2] * (1 - resized_mask_image[:, :, 3:] / 255) + resized_mask_image[:, :, :3] * (resized_mask_image[:, :, 3:] / 255)
+    return frame
+
+
+class Test_mask_image:
+    @pytest.fixture(autouse=True)
+    def clear_caches(self):
+        read_mask.cache_clear()
+        resized_mask.cache_clear()
+        yield
+        read_mask.cache_clear()
+        resized_mask.cache_clear()
+
+    @pytest.mark.parametrize('channels', [3, 4])
+    def test_matches_per_call_resize(self, tmp_path, channels):
+        mask_image = str(tmp_path / f'mask_{channels}.png')
+        cv2.imwrite(mask_image, np.random.default_rng(1).integers(0, 256, (37, 23, channels), dtype=np.uint8))
+        frame = np.random.default_rng(2).integers(0, 256, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+        dets = np.array([[10, 20, 50, 70, 0.9], [60, 15, 91, 44, 0.8], [100, 50, 140, 100, 0.7]], dtype=np.float32)
+        for _ in range(2):  # the second frame is masked from the cache
+            expected = per_call_mask(frame.copy(), dets, mask_image)
+            result = frame.copy()
+            mask_faces(result, dets, mask='image', mask_image=mask_image)
+            assert np.array_equal(result, expected)
+
+    def test_cache_keys(self, tmp_path):
+        mask_image = str(tmp_path / 'mask.png')
+        other_image = str(tmp_path / 'other.png')
+        cv2.imwrite(mask_image, np.full((20, 20, 3), 255, dtype=np.uint8))
+        cv2.imwrite(other_image, np.zeros((20, 20, 3), dtype=np.uint8))
+        frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        # two faces of the same size share a resized image
+        dets = np.array([[10, 10, 40, 50, 0.9], [60, 10, 90, 50, 0.9]], dtype=np.float32)
+        mask_faces(frame, dets, mask='image', mask_image=mask_image)
+        assert resized_mask.cache_info().misses == 1 and resized_mask.cache_info().hits == 1
+        # a different size is resized again, but the image is only read once
+        mask_faces(frame, dets[:1] + [0, 0, 10, 0, 0], mask='image', mask_image=mask_image)
+        assert resized_mask.cache_info().misses == 2
+        assert read_mask.cache_info().misses == 1
+        # a different image at the same size is a different key
+        mask_faces(frame, dets[:1], mask='image', mask_image=other_image)
+        assert resized_mask.cache_info().misses == 3 and read_mask.cache_info().misses == 2
+        assert np.array_equal(frame[10:50, 10:40], np.zeros((40, 30, 3), dtype=np.uint8))
+
+    def test_rewritten_image(self, tmp_path):
+        mask_image = str(tmp_path / 'mask.png')
+        dets = np.array([[10, 10, 40, 50, 0.9]], dtype=np.float32)
+        cv2.imwrite(mask_image, np.full((20, 20, 3), 255, dtype=np.uint8))
+        frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        mask_faces(frame, dets, mask='image', mask_image=mask_image)
+        assert np.all(frame[10:50, 10:40] == 255)
+        # the user replaces the image in the same session
+        cv2.imwrite(mask_image, np.full((20, 20, 3), 100, dtype=np.uint8))
+        # make sure the modification time changes on file systems with a coarse resolution
+        stat = os.stat(mask_image)
+        os.utime(mask_image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+        mask_faces(frame, dets, mask='image', mask_image=mask_image)
+        assert np.all(frame[10:50, 10:40] == 100)
+        assert read_mask.cache_info().misses == 2
+
+    def test_missing_image(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            read_mask(str(tmp_path / 'missing.png'))
+        with pytest.raises(FileNotFoundError):
+            mask_faces(np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8), np.array([[10, 10, 40, 50, 0.9]]), mask='image', mask_image=str(tmp_path / 'missing.png'))
+
+    def test_read_only(self, tmp_path):
+        mask_image = str(tmp_path / 'mask.png')
+        cv2.imwrite(mask_image, np.zeros((20, 20, 4), dtype=np.uint8))
+        resized, alpha = resized_mask(mask_image, 10, 10)
+        assert not resized.flags.writeable and not alpha.flags.writeable
+        assert alpha.shape == (10, 10, 1)
+
+
+class Test_track_boxes:
+    def test_translation(self):
+        previous = cv2.cvtColor(textured_frame(40, 30), cv2.COLOR_BGR2GRAY)
+        current = cv2.cvtColor(textured_frame(44, 32), cv2.COLOR_BGR2GRAY)
+        dets = np.array([[40, 30, 70, 60, 0.9]], dtype=np.float32)
+        tracked, lost = track_boxes(dets, previous, current, 1, WIDTH, HEIGHT)
+        assert not lost
+        assert np.allclose(tracked[0, :4], [44, 32, 74, 62], atol=0.5)
+        assert tracked[0, 4] == pytest.approx(0.9)
+
+    def test_lost(self):
+        previous = cv2.cvtColor(textured_frame(40, 30), cv2.COLOR_BGR2GRAY)
+        current = cv2.cvtColor(textured_frame(None, None), cv2.COLOR_BGR2GRAY)
+        dets = np.array([[40, 30, 70, 60, 0.9]], dtype=np.float32)
+        tracked, lost = track_boxes(dets, previous, current, 1, WIDTH, HEIGHT)
+        assert lost
+        assert len(tracked) == 0
+
+    def test_no_faces(self):
+        frame = cv2.cvtColor(textured_frame(None, None), cv2.COLOR_BGR2GRAY)
+        tracked, lost = track_boxes(np.zeros((0, 5)), frame, frame, 1, WIDTH, HEIGHT)
+        assert len(tracked) == 0 and not lost
+
+
+class Test_blurfaces_frame_range:
+    @pytest.fixture
+    def stubbed(self, monkeypatch):
+        calls = []
+        self.commands = []
+
+        class FakeCenterFace:
+            "Finds the patch as the non-gray pixels, and records the x of the face found in each frame it is run on."
+            def __init__(self, input_size=None):
+                pass
+
+            def detect_batch(self, imgs, height, width, threshold=0.5):
+                results, found = [], []
+                for img in imgs:
+                    ys, xs = np.nonzero((img != 128).any(axis=2))
+                    if len(xs) == 0:
+                        results.append((np.zeros((0, 5), dtype=np.float32), None))
+                        found.append(None)
+                    else:
+                        x, y = xs.min(), ys.min()
+                        results.append((np.array([[x, y, x + PATCH, y + PATCH, 0.9]], dtype=np.float32), None))
+                        found.append(int(x))
+                calls.append(found)
+                return results
+
+        class Process:
+            def __init__(self, data=b''):
+                self.stdout, self.stdin = io.BytesIO(data), io.BytesIO()
+                self.stdin.close = lambda: None
+
+            def terminate(self):
+                pass
+
+            def wait(self):
+                pass
+
+        def ffmpeg_cmd(cmd, total_time, pipe=None):
+            self.commands.append((cmd, total_time, pipe))
+            return Process(b''.join(frame.tobytes() for frame in self.frames)) if pipe == 'read' else Process()
+
+        monkeypatch.setattr(musicalgestures._blurfaces, 'CenterFace', FakeCenterFace)
+        monkeypatch.setattr(musicalgestures._blurfaces, 'ffmpeg_cmd', ffmpeg_cmd)
+        return calls
+
+    def run(self, positions, **kwargs):
+        self.frames = [textured_frame(*position) for position in positions]
+        return blurfaces_frame_range('video.avi', WIDTH, HEIGHT, 25, 'video_blurred.avi', mask='none', **kwargs)
+
+    def test_detect_every(self, stubbed):
+        # the patch moves 3 pixels to the right every frame
+        data = self.run([(20 + 3 * i, 40) for i in range(7)], detect_every=3)
+        # the detector runs on frames 0, 3 and 6 (in one batch), the other frames are tracked
+        assert stubbed == [[20, 29, 38]]
+        assert len(data) == 7
+        assert np.allclose(data[:, 1], [20 + 3 * i for i in range(7)], atol=1)
+
+    def test_every_frame(self, stubbed):
+        self.run([(20 + 3 * i, 40) for i in range(4)])
+        assert stubbed == [[20, 23, 26, 29]]
+
+    def test_lost_track(self, stubbed):
+        # the face disappears on frame 4, which is detected again instead of waiting for frame 6
+        positions = [(20 + 3 * i, 40) for i in range(4)] + [(None, None)] * 3
+        data = self.run(positions, detect_every=3)
+        assert stubbed == [[20, 29, None], [None]]
+        assert len(data) == 4
+
+    def test_write_pipe(self, stubbed):
+        self.run([(20, 40)] * 5, start_frame=10, num_frames=5, audio=True)
+        (read_cmd, _, read_pipe), (write_cmd, total_time, write_pipe) = self.commands
+        assert read_pipe == 'read' and write_pipe == 'write'
+        # the range is read from half a frame early
+        assert read_cmd[read_cmd.index('-ss') + 1] == '0.380000'
+        assert read_cmd[read_cmd.index('-frames:v') + 1] == '5'
+        # the audio of the same range is muxed in, if there is any
+        audio_input = write_cmd.index('video.avi')
+        assert write_cmd[audio_input - 5:audio_input] == ['-ss', '0.400000', '-t', '0.200000', '-i']
+        assert write_cmd[audio_input + 1:audio_input + 6] == ['-map', '0:v:0', '-map', '1:a:0?', '-shortest']
+        assert write_cmd[-1] == 'video_blurred.avi'
+        assert total_time == pytest.approx(0.2)
+
+    def test_write_pipe_without_audio(self, stubbed):
+        self.run([(20, 40)] * 2)
+        write_cmd = self.commands[1][0]
+        assert 'video.avi' not in write_cmd and '-map' not in write_cmd
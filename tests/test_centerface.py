@@ -0,0 +1,23 @@
+import numpy as np
+from musicalgestures._centerface import CenterFace
+
+
+class Test_CenterFace:
+    def test_nms(self):
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30], [0, 0, 9, 9]], dtype=np.float32)
+        scores = np.array([0.9, 0.8, 0.7, 0.95], dtype=np.float32)
+        keep = CenterFace().nms(boxes, scores, 0.3)
+        assert list(keep) == [3, 2]
+
+    def test_decode(self):
+        heatmap = np.zeros((2, 1, 8, 8), dtype=np.float32)
+        heatmap[1, 0, 2, 3] = 0.9
+        scale = np.full((2, 2, 8, 8), np.log(2), dtype=np.float32)
+        offset = np.zeros((2, 2, 8, 8), dtype=np.float32)
+        landmark = np.zeros((2, 10, 8, 8), dtype=np.float32)
+        centerface = CenterFace()
+        boxes, lms = centerface.decode(heatmap, scale, offset, landmark, (32, 32), threshold=0.5, index=0)
+        assert len(boxes) == 0
+        boxes, lms = centerface.decode(heatmap, scale, offset, landmark, (32, 32), threshold=0.5, index=1)
+        assert np.allclose(boxes, [[10, 6, 18, 14, 0.9]])
+        assert np.allclose(lms, [[10, 6] * 5])
@@ -0,0 +1,35 @@
+import os
+import numpy as np
+from musicalgestures._checkpoint import MgCheckpoint, frame_ranges
+
+
+def test_frame_ranges():
+    assert frame_ranges(10, 4) == [[0, 4], [4, 4], [8, None]]
+    assert frame_ranges(8, 4) == [[0, 4], [4, None]]
+    assert frame_ranges(3, 10) == [[0, None]]
+
+
+class Test_MgCheckpoint:
+    def test_resume(self, tmp_path):
+        folder = str(tmp_path / 'video_checkpoint')
+        ckpt = MgCheckpoint(folder, {'model': 'mpi', 'length': 10})
+        assert not ckpt.done(0)
+        ckpt.save(0, keypoints=np.ones((4, 2)))
+        assert ckpt.done(0)
+
+        resumed = MgCheckpoint(folder, {'model': 'mpi', 'length': 10})
+        assert resumed.completed() == [0]
+        assert np.all(resumed.load(0)['keypoints'] == 1)
+
+    def test_params_changed(self, tmp_path):
+        folder = str(tmp_path / 'video_checkpoint')
+        MgCheckpoint(folder, {'model': 'mpi'}).save(0, keypoints=np.ones(2))
+        ckpt = MgCheckpoint(folder, {'model': 'coco'})
+        assert ckpt.completed() == []
+
+    def test_remove(self, tmp_path):
+        folder = str(tmp_path / 'video_checkpoint')
+        ckpt = MgCheckpoint(folder, {})
+        ckpt.save(0, data=np.zeros(1))
+        ckpt.remove()
+        assert not os.path.exists(folder)
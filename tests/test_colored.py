@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import musicalgestures._colored
+from musicalgestures._colored import MgAudioProcessor, MgWaveformImage
+
+
+@pytest.fixture
+def testaudio(monkeypatch):
+    sr = 22050
+    t = np.arange(sr) / sr
+    left = (0.5 * np.sin(2 * np.pi * 1000 * t)).astype(np.float32)
+    # decoding needs ffmpeg, the processor gets the samples of the left channel directly
+    monkeypatch.setattr(musicalgestures._colored, 'read_audio', lambda filename, channel=None: (left, sr))
+    return 'testaudio.wav'
+
+
+class Test_MgAudioProcessor:
+    def test_levels(self, testaudio):
+        processor = MgAudioProcessor(testaudio, 2048, 500)
+        assert processor.samplerate == 22050
+        assert processor.frames == 22050
+        assert processor.max_level == pytest.approx(0.5, abs=1e-3)
+        assert processor.min_level == pytest.approx(-0.5, abs=1e-3)
+
+    def test_peaks(self, testaudio):
+        processor = MgAudioProcessor(testaudio, 2048, 500)
+        peaks = processor.peaks(7)
+        seek_points = [int(x * 22050 / 7) for x in range(8)]
+        expected = [(processor.samples[a:b].min(), processor.samples[a:b].max()) for a, b in zip(seek_points[:-1], seek_points[1:])]
+        assert np.array_equal(peaks, expected)
+
+    def test_spectral_centroids(self, testaudio):
+        processor = MgAudioProcessor(testaudio, 2048, 500)
+        centroids = processor.spectral_centroids(10)
+        expected = (np.log10(1000) - np.log10(500)) / (np.log10(11025) - np.log10(500))
+        # the windows in the middle of the file only see the 1 kHz sine
+        assert np.allclose(centroids[2:8], expected, atol=0.02)
+
+
+class Test_MgWaveformImage:
+    def test_draw_peaks(self):
+        image = MgWaveformImage(image_width=3, image_height=10)
+        image.draw_peaks(np.array([[-0.5, 0.5], [0.0, 0.0], [-1.0, 1.0]]), np.zeros(3))
+        drawn = image.image.sum(axis=2) > 0
+        assert np.array_equal(np.flatnonzero(drawn[:, 0]), np.arange(2, 8))
+        assert np.array_equal(np.flatnonzero(drawn[:, 1]), [5])
+        assert np.array_equal(np.flatnonzero(drawn[:, 2]), np.arange(10))
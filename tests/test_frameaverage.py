@@ -0,0 +1,49 @@
+import os
+import types
+import numpy as np
+import pytest
+import musicalgestures
+from musicalgestures._frameaverage import pixelarray_image, render_pixelarray
+
+
+def test_pixelarray_image():
+    pixels = np.arange(21, dtype=np.uint8).reshape(7, 3)
+    image = pixelarray_image(pixels, 3)
+    assert image.shape == (3, 3, 3)
+    assert image[0, 1].tolist() == [3, 4, 5]
+    # the last row is padded with black
+    assert image[2, 0].tolist() == [18, 19, 20]
+    assert np.all(image[2, 1:] == 0)
+
+
+def test_pixelarray_image_no_frames():
+    with pytest.raises(ValueError):
+        pixelarray_image(np.zeros((0, 3), dtype=np.uint8), 3)
+
+
+class Test_render_pixelarray:
+    @pytest.fixture
+    def video(self, tmp_path, monkeypatch):
+        """
+        A stand-in MgVideo whose average frame colors are served by a stubbed frame_pixels.
+        """
+        def stub(pixels, color=True):
+            monkeypatch.setattr(musicalgestures._frameaverage, 'frame_pixels', lambda filename, fps, length, num_workers=1: pixels)
+            return types.SimpleNamespace(filename=str(tmp_path / 'video.avi'), of=str(tmp_path / 'video'), fps=25, length=len(pixels), color=color)
+        return stub
+
+    def test_grayscale_video(self, video):
+        import cv2
+        pixels = np.full((5, 3), 80, dtype=np.uint8)
+        image, result = render_pixelarray(video(pixels, color=False), width=2)
+        # the image keeps its three channels, like the pixel array FFmpeg tiled before
+        assert cv2.imread(image.filename, cv2.IMREAD_UNCHANGED).shape == (3, 2, 3)
+        assert np.array_equal(result, pixels)
+
+    def test_no_frames(self, video, tmp_path):
+        mg = video(np.zeros((0, 3), dtype=np.uint8))
+        with pytest.raises(musicalgestures._utils.FFmpegError):
+            render_pixelarray(mg, width=2)
+        # no image is written
+        assert not hasattr(mg, 'pixelarray')
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from musicalgestures._grid import compose_grid
+
+
+def test_compose_grid():
+    tiles = [np.full((2, 3, 3), i + 1, dtype=np.uint8) for i in range(5)] + [None]
+    grid = compose_grid(tiles, 2, 3, 3, 2, padding=1, margin=2)
+    assert grid.shape == (9, 15, 3)
+    assert np.all(grid[2:4, 2:5] == 1)
+    assert np.all(grid[5:7, 6:9] == 5)
+    # padding, margin and missing tiles are black
+    assert np.all(grid[4] == 0) and np.all(grid[:, :2] == 0)
+    assert np.all(grid[5:7, 10:13] == 0)
+
+
+def test_grid_seek_times(monkeypatch):
+    import types
+    import musicalgestures._grid
+    from musicalgestures._grid import mg_grid
+    times = []
+
+    def seek_frame(filename, time, width, height, scale=None):
+        times.append(time)
+        return np.zeros((scale[1], scale[0], 3), dtype=np.uint8)
+
+    monkeypatch.setattr(musicalgestures._grid, 'seek_frame', seek_frame)
+    video = types.SimpleNamespace(filename='video.avi', width=40, height=30, fps=25, length=20)
+    grid = mg_grid(video, height=3, rows=2, cols=2, return_array=True)
+    assert grid.shape == (6, 8, 3)
+    # every 5th frame, seeking half a frame early (but not before the start)
+    assert sorted(times) == pytest.approx([0, 0.18, 0.38, 0.58])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from musicalgestures._history import MgHistoryBuffer, ParameterError
+
+
+def reference_history(frames, history_length, weights_map):
+    """Direct weighted sum of the current frame and the previous ones."""
+    outputs = [frames[0].astype(np.float64)]
+    for i in range(1, len(frames)):
+        total = sum(weights_map[k] * frames[i - k].astype(np.float64) for k in range(min(i, history_length) + 1))
+        outputs.append(total / sum(weights_map))
+    return outputs
+
+
+class Test_MgHistoryBuffer:
+    frames = list(np.random.default_rng(0).integers(0, 256, (30, 6, 8, 3), dtype=np.uint8))
+
+    def test_uniform(self):
+        history = MgHistoryBuffer(history_length=5)
+        for out, expected in zip([history.push(f).copy() for f in self.frames],
+                                 reference_history(self.frames, 5, [1] * 6)):
+            assert np.allclose(out, expected, atol=1e-3)
+
+    def test_weights(self):
+        history = MgHistoryBuffer(history_length=4, weights=[3, 1.5, 0])
+        for out, expected in zip([history.push(f).copy() for f in self.frames],
+                                 reference_history(self.frames, 4, [3, 1.5, 0, 1, 1])):
+            assert np.allclose(out, expected, atol=1e-3)
+
+    def test_decay(self):
+        history = MgHistoryBuffer(decay=0.5)
+        history.push(np.full((2, 2), 100, dtype=np.uint8))
+        out = history.push(np.full((2, 2), 200, dtype=np.uint8))
+        assert np.allclose(out, 150)
+
+    def test_wrong_weights(self):
+        with pytest.raises(ParameterError):
+            MgHistoryBuffer(weights='1 2')
+        with pytest.raises(ParameterError):
+            MgHistoryBuffer(decay=1)
@@ -1,6 +1,63 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
 import musicalgestures
 
 
 def test_repr():
     mg = musicalgestures.MgVideo(musicalgestures.examples.dance)
     assert mg.__repr__() == f"MgVideo('{musicalgestures.examples.dance}')"
+
+
+# dependencies which are slow to import, they should only be imported by the processes using them
+HEAVY_MODULES = ['librosa', 'matplotlib', 'pandas', 'skimage', 'scipy', 'numba', 'cv2', 'IPython']
+
+# the import time budget (s) of the package and its classes, importing everything eagerly takes seconds
+IMPORT_TIME_BUDGET = 1.0
+
+
+def measure_import(statement):
+    """
+    Measures the time taken by `statement` in a new interpreter, and returns it with the heavy modules it imported.
+    """
+    code = f"""
+import sys, time, json
+start = time.perf_counter()
+{statement}
+duration = time.perf_counter() - start
+print(json.dumps(dict(duration=duration, heavy=[name for name in {HEAVY_MODULES!r} if name in sys.modules])))
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=root).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+class Test_lazy_imports:
+    def test_import_package(self):
+        result = measure_import('import musicalgestures')
+        assert result['heavy'] == []
+
+    def test_import_classes(self):
+        statement = 'import musicalgestures; musicalgestures.MgVideo, musicalgestures.MgAudio, musicalgestures.MgList, musicalgestures.MgImage'
+        # the best of a few runs, to be robust to a busy machine
+        results = [measure_import(statement) for _ in range(3)]
+        assert results[0]['heavy'] == []
+        assert min(result['duration'] for result in results) < IMPORT_TIME_BUDGET
+
+    def test_lazy_methods(self):
+        from musicalgestures._lazy import lazy_method
+        from musicalgestures._motionvideo import mg_motion
+        assert musicalgestures.MgVideo.motion is mg_motion
+        # the stub is replaced by the function on first access
+        assert not isinstance(vars(musicalgestures.MgVideo)['motion'], lazy_method)
+        for cls in [musicalgestures.MgVideo, musicalgestures.MgAudio, musicalgestures.MgImage, musicalgestures.MgList]:
+            for name, value in list(vars(cls).items()):
+                if isinstance(value, lazy_method):
+                    assert callable(getattr(cls, name))
+
+    def test_submodules(self):
+        assert musicalgestures._audiostream.__name__ == 'musicalgestures._audiostream'
+        with pytest.raises(AttributeError):
+            musicalgestures._not_a_module
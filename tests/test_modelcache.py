@@ -0,0 +1,54 @@
+import pytest
+import musicalgestures._modelcache
+from musicalgestures._modelcache import get_model, preload_model, evict_model, cached_models, model_key
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    loads = []
+
+    def load_model(model, device='cpu'):
+        loads.append((model, device))
+        return object()
+
+    # no weights are read, each load returns a new placeholder network
+    monkeypatch.setattr(musicalgestures._modelcache, 'load_model', load_model)
+    evict_model()
+    yield loads
+    evict_model()
+
+
+class Test_model_cache:
+    def test_key(self):
+        assert model_key('BODY_25', 'CPU') == ('body_25', 'cpu')
+        with pytest.raises(ValueError):
+            model_key('yolo')
+
+    def test_preload_hit(self, cache):
+        # the documented pool initializer warms the same entry that pose uses
+        preload_model('body_25', 'cpu')
+        net = get_model('body_25', 'cpu')
+        assert get_model('Body_25') is net
+        assert cache == [('body_25', 'cpu')]
+        assert cached_models() == [('body_25', 'cpu')]
+
+    def test_lru_eviction(self, cache, monkeypatch):
+        monkeypatch.setattr(musicalgestures._modelcache, 'MAX_CACHED_MODELS', 2)
+        get_model('mpi')
+        get_model('coco')
+        # using mpi again makes coco the least recently used network
+        get_model('mpi')
+        get_model('centerface')
+        assert cached_models() == [('mpi', 'cpu'), ('centerface', 'cpu')]
+        get_model('coco')
+        assert cache == [('mpi', 'cpu'), ('coco', 'cpu'), ('centerface', 'cpu'), ('coco', 'cpu')]
+
+    def test_evict(self, cache):
+        get_model('mpi', 'cpu')
+        get_model('mpi', 'gpu')
+        get_model('coco', 'cpu')
+        assert evict_model(device='gpu') == 1
+        assert evict_model('mpi') == 1
+        assert cached_models() == [('coco', 'cpu')]
+        assert evict_model() == 1
+        assert cached_models() == []
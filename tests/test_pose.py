@@ -0,0 +1,124 @@
+import cv2
+import numpy as np
+import pytest
+import musicalgestures._pose
+from musicalgestures._pose import decode_keypoints, keypoints_to_data, interpolate_keypoints, pose_mp
+
+
+class Test_decode_keypoints:
+    def test_matches_minmaxloc(self):
+        rng = np.random.default_rng(42)
+        output = rng.random((1, 26, 46, 82)).astype(np.float32)
+        result = decode_keypoints(output, 25, 656, 368)
+        assert result.shape == (25, 3)
+        for i in range(25):
+            _, prob, _, point = cv2.minMaxLoc(output[0, i])
+            assert result[i, 0] == (656 * point[0]) / 82
+            assert result[i, 1] == (368 * point[1]) / 46
+            assert np.isclose(result[i, 2], prob)
+
+    def test_out(self):
+        output = np.zeros((1, 15, 10, 20), dtype=np.float32)
+        output[0, :, 5, 10] = 1
+        out = np.zeros((2, 15, 3))
+        decode_keypoints(output, 15, 200, 100, out=out[1])
+        assert np.all(out[0] == 0)
+        assert np.all(out[1, :, 0] == 100)
+        assert np.all(out[1, :, 1] == 50)
+        assert np.all(out[1, :, 2] == 1)
+
+
+class Test_keypoints_to_data:
+    def test_threshold(self):
+        keypoints = np.array([[[10.7, 20.2, 0.9], [30, 40, 0.05]],
+                              [[50, 60, 0.5], [70, 80, 0.5]]])
+        data = keypoints_to_data(keypoints, 100, 200, 25, 0.1)
+        assert data.shape == (2, 5)
+        assert list(data[:, 0]) == [0, 40]
+        assert list(data[0, 1:]) == [0.1, 0.1, 0, 0]
+        assert list(data[1, 1:]) == [0.5, 0.3, 0.7, 0.4]
+
+    def test_inferred_column(self):
+        keypoints = np.zeros((3, 2, 3))
+        inferred = np.array([True, False, True])
+        data = keypoints_to_data(keypoints, 100, 200, 25, 0.1, inferred=inferred)
+        assert data.shape == (3, 6)
+        assert list(data[:, -1]) == [1, 0, 1]
+
+
+class Test_interpolate_keypoints:
+    def test_linear_with_decay(self):
+        keypoints = np.zeros((5, 2, 3))
+        keypoints[0] = [[0, 0, 1], [10, 10, 1]]
+        keypoints[4] = [[40, 80, 1], [10, 10, 0]]
+        interpolate_keypoints(keypoints, 0, 4, 0.1, confidence_decay=0.5)
+        # found in both inferred frames: linear interpolation
+        assert list(keypoints[1:4, 0, 0]) == [10, 20, 30]
+        assert list(keypoints[1:4, 0, 1]) == [20, 40, 60]
+        assert list(keypoints[1:4, 0, 2]) == [0.5, 0.25, 0.5]
+        # found only in the first inferred frame: held
+        assert list(keypoints[1:4, 1, 0]) == [10, 10, 10]
+        assert list(keypoints[1:4, 1, 2]) == [0.5, 0.25, 0.5]
+
+    def test_adjacent(self):
+        keypoints = np.ones((2, 2, 3))
+        interpolate_keypoints(keypoints, 0, 1, 0.1)
+        assert np.all(keypoints == 1)
+
+
+def stub_pose_frame_range(net, filename, width, height, fps, inWidth, inHeight, nPoints, POSE_PAIRS, threshold,
+                          start_frame=0, num_frames=None, target_name_video=None, pb=None, length=None, *args):
+    # the keypoints of each frame hold its frame index, so that the merge order can be checked
+    num_frames = length if num_frames is None else num_frames
+    frames = np.arange(start_frame, start_frame + num_frames)
+    if target_name_video is not None:
+        with open(target_name_video, 'w') as f:
+            f.write(str(start_frame))
+    return np.broadcast_to(frames[:, None, None], (num_frames, nPoints, 3)).astype(float), frames % 2 == 0
+
+
+class ReversedPool:
+    """
+    An in-process stand-in for multiprocessing.Pool which returns the results of the ranges in reverse order.
+    """
+    def __init__(self, processes, initializer=None, initargs=()):
+        initializer(*initargs)
+
+    def imap_unordered(self, function, iterable):
+        return reversed([function(args) for args in iterable])
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class Test_pose_mp:
+    @pytest.fixture
+    def stubbed(self, monkeypatch, tmp_path):
+        merged = []
+        monkeypatch.setattr(musicalgestures._pose, 'get_model', lambda *args: None)
+        monkeypatch.setattr(musicalgestures._pose, 'pose_frame_range', stub_pose_frame_range)
+        monkeypatch.setattr(musicalgestures._pose.cv2, 'setNumThreads', lambda n: None)
+        monkeypatch.setattr(musicalgestures._pose.multiprocessing, 'Pool', ReversedPool)
+        monkeypatch.setattr(musicalgestures._pose, 'merge_videos',
+                            lambda segments, target_name, overwrite: merged.append([open(segment).read() for segment in segments]))
+        return merged
+
+    def run(self, num_workers, target_name_video=None):
+        return pose_mp('video.avi', 64, 48, 25, 10, 'mpi', 'cpu', 32, 32, 15, [], 0.1, num_workers, target_name_video=target_name_video)
+
+    def test_matches_sequential(self, stubbed):
+        keypoints, inferred = self.run(1)
+        assert keypoints.shape == (10, 15, 3)
+        assert np.array_equal(keypoints[:, 0, 0], np.arange(10))
+        for num_workers in [2, 3, 4]:
+            parallel_keypoints, parallel_inferred = self.run(num_workers)
+            assert np.array_equal(parallel_keypoints, keypoints)
+            assert np.array_equal(parallel_inferred, inferred)
+
+    def test_segment_order(self, stubbed, tmp_path):
+        self.run(3, target_name_video=str(tmp_path / 'video_pose.avi'))
+        # ranges of ceil(10 / 3) = 4 frames, merged in frame order whatever order they complete in
+        assert stubbed == [['0', '4', '8']]
@@ -0,0 +1,81 @@
+import musicalgestures
+import os
+import cv2
+import numpy as np
+import pytest
+from musicalgestures._subtract import median_background
+
+WIDTH, HEIGHT, LENGTH, FPS = 8, 6, 100, 25
+
+
+@pytest.fixture
+def video(tmp_path, monkeypatch):
+    """
+    A stand-in video file whose frames are served by a stubbed seek_frame: a static background with an object passing by.
+    """
+    filename = str(tmp_path / 'video.avi')
+    with open(filename, 'wb') as f:
+        f.write(b'video')
+    background = np.arange(WIDTH * HEIGHT * 3, dtype=np.uint8).reshape(HEIGHT, WIDTH, 3)
+    seeks = []
+
+    def seek_frame(filename, time, width, height):
+        seeks.append(time)
+        frame = background.copy()
+        # the object moves by a column every 4 frames
+        frame[:, int(time * FPS) // 4 % WIDTH] = 255
+        return frame
+
+    monkeypatch.setattr(musicalgestures._subtract, 'seek_frame', seek_frame)
+    monkeypatch.setattr(musicalgestures._subtract, '_backgrounds', {})
+    return filename, background, seeks
+
+
+class Test_median_background:
+    def test_median(self, video):
+        filename, background, seeks = video
+        result = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=25)
+        # the frames are sampled at evenly spaced times
+        assert sorted(seeks) == pytest.approx([(i + 0.5) * 4 / 25 for i in range(25)])
+        # the passing object is removed
+        assert np.array_equal(cv2.imread(result), background)
+
+    def test_target_name(self, video):
+        filename, _, _ = video
+        result = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=10)
+        assert os.path.basename(result) == 'video_background_10.png'
+
+    def test_cache(self, video):
+        filename, _, seeks = video
+        first = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5)
+        assert median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5) == first
+        assert len(seeks) == 5
+        # a different number of samples is a different background, which does not overwrite the first one
+        second = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=7)
+        assert second != first and os.path.isfile(first) and os.path.isfile(second)
+        assert len(seeks) == 12
+        # a deleted background is estimated again
+        os.remove(first)
+        assert median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5) == first
+        assert len(seeks) == 17
+
+    def test_modified_file(self, video):
+        filename, _, seeks = video
+        first = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5)
+        with open(filename, 'ab') as f:
+            f.write(b'more video')
+        median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5)
+        assert len(seeks) == 10
+
+    def test_overwrite(self, video):
+        filename, _, _ = video
+        target_name = os.path.splitext(filename)[0] + '_bg.png'
+        with open(target_name, 'wb') as f:
+            f.write(b'user file')
+        result = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5, target_name=target_name)
+        assert result != target_name
+        with open(target_name, 'rb') as f:
+            assert f.read() == b'user file'
+        musicalgestures._subtract._backgrounds.clear()
+        result = median_background(filename, WIDTH, HEIGHT, FPS, LENGTH, samples=5, target_name=target_name, overwrite=True)
+        assert result == target_name and cv2.imread(result) is not None
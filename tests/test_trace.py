@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import musicalgestures
+import musicalgestures._trace
+from musicalgestures._trace import MgTrace, span, accumulate, traced
+
+
+@traced('test.double')
+def double(x):
+    return 2 * x
+
+
+class Test_MgTrace:
+    def test_disabled(self):
+        assert musicalgestures._trace._tracer is None
+        # spans are no-ops without an active trace
+        with span('test.span'), accumulate('test.accumulate'):
+            pass
+        assert double(2) == 4
+
+    def test_spans(self):
+        with musicalgestures.trace() as t:
+            assert double(2) == 4
+            with span('test.span', frames=3):
+                pass
+            for _ in range(5):
+                with accumulate('test.accumulate'):
+                    pass
+        assert musicalgestures._trace._tracer is None
+        assert [event['name'] for event in t.events] == ['test.double', 'test.span']
+        assert t.events[1]['args'] == dict(frames=3)
+        assert t.totals['test.accumulate'][1] == 5
+        summary = t.summary()
+        assert 'test.span' in summary and 'test.accumulate' in summary and 'wall time' in summary
+
+    def test_launches(self):
+        popen = subprocess.Popen
+        with MgTrace() as t:
+            subprocess.run([sys.executable, '-c', 'pass'], check=True)
+            subprocess.check_output([sys.executable, '-c', 'pass'])
+        # the original Popen is restored when the trace stops
+        assert subprocess.Popen is popen
+        program = os.path.splitext(os.path.basename(sys.executable))[0]
+        assert t.launches == {program: 2}
+        assert f'{program} launches' in t.summary()
+
+    def test_single_active(self):
+        with MgTrace():
+            with pytest.raises(RuntimeError):
+                MgTrace().start()
+
+    def test_to_chrome(self, tmp_path):
+        with MgTrace() as t:
+            with span('test.span'):
+                pass
+            with accumulate('test.accumulate'):
+                pass
+        target_name = t.to_chrome(str(tmp_path / 'trace.json'))
+        with open(target_name) as f:
+            data = json.load(f)
+        event = data['traceEvents'][0]
+        assert event['name'] == 'test.span' and event['ph'] == 'X' and event['pid'] == os.getpid()
+        assert event['dur'] >= 0
+        assert data['otherData']['accumulated']['test.accumulate']['calls'] == 1
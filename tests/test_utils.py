@@ -921,6 +921,165 @@ class Test_ffmpeg_cmd:
         with pytest.raises(FFmpegError):
             ffmpeg_cmd(cmd, get_length(testvideo_avi))
 
+    def test_callback(self, tmp_path, testvideo_avi):
+        target_name = str(tmp_path).replace("\\", "/") + "/test_result.mp4"
+        cmd = ['ffmpeg', '-y', '-i', testvideo_avi, target_name]
+        reports, subscribed = [], []
+        add_progress_callback(subscribed.append)
+        try:
+            ffmpeg_cmd(cmd, get_length(testvideo_avi), callback=reports.append)
+        finally:
+            remove_progress_callback(subscribed.append)
+        assert len(reports) > 0
+        assert reports == subscribed
+        assert reports[-1]['done'] == True
+        assert reports[-1]['frame'] > 0
+
+
+class Test_ffmpeg_options:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        ffmpeg_options.cache_clear()
+        yield
+        ffmpeg_options.cache_clear()
+
+    def test_probe(self, monkeypatch):
+        import subprocess
+        import types
+        calls = []
+        help_text = 'Advanced options:\n-map [-]input_file_id[:stream_specifier]  set input stream mapping\n-stats_period time  set the period at which ffmpeg updates stats and -progress output\n'
+
+        def run(command, **kwargs):
+            calls.append(command)
+            return types.SimpleNamespace(stdout=help_text)
+
+        monkeypatch.setattr(subprocess, 'run', run)
+        assert '-stats_period' in ffmpeg_options() and '-map' in ffmpeg_options()
+        # FFmpeg is probed once
+        assert len(calls) == 1
+
+    def test_no_ffmpeg(self, monkeypatch):
+        import subprocess
+
+        def run(command, **kwargs):
+            raise FileNotFoundError(command[0])
+
+        monkeypatch.setattr(subprocess, 'run', run)
+        assert ffmpeg_options() == frozenset()
+
+    @pytest.mark.parametrize('options', [frozenset(['-stats_period']), frozenset()])
+    def test_stats_period(self, monkeypatch, options):
+        import io
+        import subprocess
+        commands = []
+
+        class Process:
+            def __init__(self, command, **kwargs):
+                commands.append(command)
+                self.stdout = io.StringIO('out_time_us=1000000\nprogress=end\n')
+                self.returncode = None
+
+            def wait(self):
+                self.returncode = 0
+
+        monkeypatch.setattr(musicalgestures._utils, 'ffmpeg_options', lambda: options)
+        monkeypatch.setattr(subprocess, 'Popen', Process)
+        reports = []
+        ffmpeg_cmd(['ffmpeg', '-y', '-i', 'video.avi', 'video.mp4'], 1, callback=reports.append)
+        command = commands[0]
+        # older FFmpeg versions reject -stats_period, -progress works without it
+        assert ('-stats_period' in command) == bool(options)
+        assert command[command.index('-progress') + 1] == 'pipe:1'
+        assert command[-4:] == ['-y', '-i', 'video.avi', 'video.mp4']
+        assert reports[-1]['done'] == True and reports[-1]['time'] == 1.0
+
+
+class Test_parse_progress:
+    def test_report(self):
+        values = {'frame': '120', 'fps': '59.8', 'total_size': '1048576', 'out_time_us': '4000000', 'speed': '2.01x', 'progress': 'continue'}
+        report = parse_progress(values, elapsed=2.0)
+        assert report == dict(frame=120, fps=59.8, speed=2.01, size=1048576, time=4.0, elapsed=2.0, done=False)
+
+    def test_not_available(self):
+        report = parse_progress({'fps': '0.0', 'total_size': 'N/A', 'out_time_us': 'N/A', 'speed': 'N/A', 'progress': 'end'})
+        assert report['size'] is None and report['time'] is None and report['speed'] is None and report['frame'] is None
+        assert report['done'] == True
+
+
+class Test_group_frames:
+    def test_gap(self):
+        # a gap of exactly max_gap joins the window, a larger one starts a new window
+        assert group_frames([0, 5, 11, 12], max_gap=5, max_span=100) == [[0, 5], [11, 12]]
+
+    def test_span(self):
+        # close frames are split once the window spans max_span frames
+        assert group_frames(range(0, 30, 2), max_gap=5, max_span=10) == [[0, 2, 4, 6, 8, 10], [12, 14, 16, 18, 20, 22], [24, 26, 28]]
+
+    def test_duplicates(self):
+        assert group_frames([7, 3, 3, 7, 50], max_gap=5, max_span=100) == [[3, 7], [50]]
+
+    def test_empty(self):
+        assert group_frames([], max_gap=5, max_span=100) == []
+
+
+class Test_extract_frames:
+    @pytest.fixture
+    def video(self, monkeypatch):
+        """
+        A stand-in video of 20 frames of 4x2 pixels at 10 fps, each frame filled with its frame number, served by a stubbed FFmpeg read pipe.
+        """
+        import io
+        import math
+        commands = []
+
+        class Process:
+            def __init__(self, data):
+                self.stdout = io.BytesIO(data)
+
+            def terminate(self):
+                pass
+
+            def wait(self):
+                pass
+
+        def ffmpeg_cmd(cmd, total_time, pipe=None):
+            assert pipe == 'read'
+            commands.append(cmd)
+            start = math.ceil(float(cmd[cmd.index('-ss') + 1]) * 10) if '-ss' in cmd else 0
+            count = int(cmd[cmd.index('-frames:v') + 1])
+            return Process(b''.join(bytes([frame]) * 24 for frame in range(start, min(start + count, 20))))
+
+        monkeypatch.setattr(musicalgestures._utils, 'ffmpeg_cmd', ffmpeg_cmd)
+        monkeypatch.setattr(musicalgestures._utils, 'get_fps', lambda filename: 10)
+        monkeypatch.setattr(musicalgestures._utils, 'get_widthheight', lambda filename: (4, 2))
+        return commands
+
+    def test_frames(self, video):
+        frames = [12, 3, 5, 3, 25, 19]
+        result = extract_frames('video.avi', frames=frames, return_array=True, max_gap=0.5, num_workers=1)
+        assert result.shape == (6, 2, 4, 3)
+        # in the requested order, and frames past the end of the video are black
+        assert [int(frame[0, 0, 0]) for frame in result] == [12, 3, 5, 3, 0, 19]
+        # the windows are [3, 5] and [12], [19], [25]
+        assert sorted(cmd[cmd.index('-frames:v') + 1] for cmd in video) == ['1', '1', '1', '3']
+
+    def test_span(self, video):
+        result = extract_frames('video.avi', frames=list(range(0, 20, 2)), return_array=True, max_gap=0.5, max_span=0.6, num_workers=2)
+        assert [int(frame[0, 0, 0]) for frame in result] == list(range(0, 20, 2))
+        # windows spanning at most 6 frames, each starting with a seek half a frame early
+        starts = sorted(float(cmd[cmd.index('-ss') + 1]) if '-ss' in cmd else 0 for cmd in video)
+        assert starts == pytest.approx([0, 0.75, 1.55])
+
+    def test_times(self, video):
+        result = extract_frames('video.avi', times=[0.4, 1.0], return_array=True)
+        assert [int(frame[0, 0, 0]) for frame in result] == [4, 10]
+
+    def test_files(self, video, tmp_path):
+        import cv2
+        result = extract_frames('video.avi', frames=[2, 30], target_name=str(tmp_path / 'out.png'))
+        assert [os.path.basename(name) for name in result] == ['out_frame_2.png', 'out_frame_30.png']
+        assert cv2.imread(result[0])[0, 0, 0] == 2 and cv2.imread(result[1])[0, 0, 0] == 0
+
 
 class Test_str2sec:
     def test_str2sec(self):
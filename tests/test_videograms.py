@@ -1,5 +1,6 @@
 import musicalgestures
 import os
+import numpy as np
 import pytest
 
 
@@ -31,3 +32,53 @@ class Test_videograms:
         for videogram in result:
             assert type(videogram) == musicalgestures.MgImage
             assert os.path.isfile(videogram.filename) == True
+
+
+def test_normalize_strips():
+    from musicalgestures._videograms import normalize_strips
+    strips = np.array([[[10, 5, 7], [20, 5, 9]], [[0, 0, 0], [255, 0, 100]]], dtype=np.float32)
+    normalized = normalize_strips(strips, chunk_size=1)
+    assert normalized.dtype == np.uint8
+    assert normalized[:, :, 0].tolist() == [[0, 255], [0, 255]]
+    # flat channels are left unchanged
+    assert normalized[:, :, 1].tolist() == [[5, 5], [0, 0]]
+    assert normalized[:, :, 2].tolist() == [[0, 255], [0, 255]]
+
+
+class Test_videograms_pipe:
+    @pytest.fixture
+    def video(self, tmp_path, monkeypatch):
+        """
+        A stand-in MgVideo whose frames are served by a stubbed FFmpeg read pipe.
+        """
+        import io
+        import types
+
+        def stub(frames):
+            class Process:
+                stdout = io.BytesIO(b''.join(frame.tobytes() for frame in frames))
+
+                def terminate(self):
+                    pass
+            monkeypatch.setattr(musicalgestures._videograms, 'ffmpeg_cmd', lambda cmd, total_time, pipe=None: Process())
+            return types.SimpleNamespace(filename=str(tmp_path / 'video.avi'), of=str(tmp_path / 'video'),
+                                         width=4, height=3, length=len(frames))
+        return stub
+
+    def test_frames(self, video):
+        from musicalgestures._videograms import videograms_ffmpeg
+        frames = [np.full((3, 4, 3), i, dtype=np.uint8) for i in range(5)]
+        frames[2][:, 1] = 200
+        result = videograms_ffmpeg(video(frames))
+        assert [os.path.basename(videogram.filename) for videogram in result] == ['video_vgx.png', 'video_vgy.png']
+        for videogram in result:
+            assert os.path.isfile(videogram.filename)
+
+    def test_no_frames(self, video, tmp_path):
+        from musicalgestures._videograms import videograms_ffmpeg
+        mg = video([])
+        with pytest.raises(musicalgestures._utils.FFmpegError):
+            videograms_ffmpeg(mg)
+        # no videograms are returned or left behind
+        assert not hasattr(mg, 'videogram_x')
+        assert os.listdir(tmp_path) == []